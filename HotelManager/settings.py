@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,6 +47,13 @@ INSTALLED_APPS = [
 # Custom user model
 AUTH_USER_MODEL = "hotels.User"
 
+# Loads the session user along with their city in one query. ModelBackend
+# stays listed so that the sessions logged in before through it remain valid.
+AUTHENTICATION_BACKENDS = [
+    "hotels.auth.CityUserBackend",
+    "django.contrib.auth.backends.ModelBackend",
+]
+
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -78,6 +88,12 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "HotelManager.wsgi.application"
 
+# Route the public read views to their async versions when set to "1".
+# They are off by default, also under ASGI, since the benchmark_views command
+# measured them slower than the sync views; turn them on only where measuring
+# your deployment shows a gain
+HOTELS_ASYNC_VIEWS = os.environ.get("HOTELS_ASYNC_VIEWS") == "1"
+
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
@@ -90,6 +106,57 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# A file based cache is shared by the web server and the import commands, so
+# that cached responses invalidated by an import are dropped by every process.
+# It only holds the versions of the cached data: a few global ones, one key
+# with the versions of the changed cities, and one per changed user. Every
+# write to a file cache lists its directory to cull it, so the versions of the
+# cities share one key, and a culled version is replaced by a new one.
+# The caches hold pickles, so they live in a directory only the project's
+# users may write to, never in the shared system temporary directory. Set
+# HOTELS_CACHE_DIR to move them, e.g. to a private directory under /var.
+
+HOTELS_CACHE_DIR = Path(os.environ.get("HOTELS_CACHE_DIR", BASE_DIR / "cache"))
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": HOTELS_CACHE_DIR / "default",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # Kept apart from the default cache, so that culling the cached responses
+    # does not drop sessions
+    "sessions": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": HOTELS_CACHE_DIR / "sessions",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+
+# Sessions
+# https://docs.djangoproject.com/en/5.1/topics/http/sessions/
+# By default sessions are read from the "sessions" cache and written through
+# to the database, so authenticated requests do not query django_session.
+# Set HOTELS_SESSION_ENGINE to "db" to keep them in the database only, or to
+# "signed_cookies" to keep them in the browser, which cannot be revoked
+# before they expire. Run clear_expired_sessions daily for the db engines.
+
+SESSION_ENGINES = ("cached_db", "db", "signed_cookies")
+
+HOTELS_SESSION_ENGINE = os.environ.get("HOTELS_SESSION_ENGINE", "cached_db")
+if HOTELS_SESSION_ENGINE not in SESSION_ENGINES:
+    raise ImproperlyConfigured(
+        f"HOTELS_SESSION_ENGINE must be one of {', '.join(SESSION_ENGINES)}."
+    )
+
+SESSION_ENGINE = f"django.contrib.sessions.backends.{HOTELS_SESSION_ENGINE}"
+
+SESSION_CACHE_ALIAS = "sessions"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
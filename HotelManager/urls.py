@@ -15,13 +15,22 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+from django.conf import settings
 from django.contrib import admin
 from django.urls import include, path
 
-from hotels import views
+from hotels import async_views, views
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("hotels/", include("hotels.urls")),
-    path("", views.city_hotels_view, name="home"),
+    path(
+        "",
+        (
+            async_views.acity_hotels_view
+            if settings.HOTELS_ASYNC_VIEWS
+            else views.city_hotels_view
+        ),
+        name="home",
+    ),
 ]
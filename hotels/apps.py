@@ -13,3 +13,7 @@ class HotelsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
 
     name = "hotels"
+
+    def ready(self) -> None:
+        # Connect the signal receivers
+        from hotels import signals  # noqa: F401
@@ -0,0 +1,187 @@
+# hotels/async_views.py
+# Async versions of the public read views, routed instead of the sync ones
+# when the project is served over ASGI (see HOTELS_ASYNC_VIEWS). They use the
+# async ORM and cache APIs, so a request waiting on the database or the cache
+# does not hold a thread, and they answer exactly like their sync versions.
+
+import pickle
+from functools import wraps
+
+from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from django.views.decorators.cache import cache_control
+
+from .caching import (
+    acities_version,
+    acity_index_version,
+    acity_response_key,
+    home_pages,
+    hotel_responses,
+)
+from .models import City, Hotel
+from .pagination import KeysetPage, apaginate_by_name
+from .search import city_index
+from .serialization import encode_rows, json_response
+from .views import (
+    HOTEL_FIELDS,
+    HotelListFragment,
+    encode_hotel_page,
+    home_context,
+    hotel_list_params,
+    render_hotel_list,
+    version_etag,
+)
+
+
+def async_condition(etag_func):
+    """
+    Decorator like django.views.decorators.http.condition for async views,
+    awaiting `etag_func` instead of calling it in the event loop.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            etag = await etag_func(request, *args, **kwargs)
+            etag = quote_etag(etag) if etag is not None else None
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if etag and request.method in ("GET", "HEAD"):
+                response.headers.setdefault("ETag", etag)
+            return response
+
+        return inner
+
+    return decorator
+
+
+async def ahotel_page(request: HttpRequest, hotels) -> KeysetPage:
+    """
+    Async version of views.hotel_page.
+    """
+
+    try:
+        return await apaginate_by_name(hotels, request.GET.get("cursor"))
+    except ValueError:
+        return await apaginate_by_name(hotels)
+
+
+async def ahome_cities() -> list[City]:
+    """
+    Async version of views.home_cities.
+    """
+
+    key = ("cities", await acities_version())
+    body = home_pages.get(key)
+    if body is not None:
+        return pickle.loads(body)
+    cities = [city async for city in City.objects.all()]
+    home_pages.put(key, pickle.dumps(cities))
+    return cities
+
+
+async def ahotel_list_fragment(
+    request: HttpRequest, city_code: str
+) -> HotelListFragment:
+    """
+    Async version of views.hotel_list_fragment.
+    """
+
+    key = (
+        "hotels",
+        *await acity_response_key(city_code),
+        request.GET.get("cursor"),
+    )
+    body = home_pages.get(key)
+    if body is not None:
+        return pickle.loads(body)
+
+    selected_city = await City.objects.filter(code=city_code).afirst()
+    hotels = None
+    next_cursor = None
+    if selected_city:
+        hotels, next_cursor = await ahotel_page(
+            request, Hotel.objects.filter(city=selected_city)
+        )
+    fragment = render_hotel_list(selected_city, hotels, next_cursor)
+    home_pages.put(key, pickle.dumps(fragment))
+    return fragment
+
+
+async def acity_hotels_view(request: HttpRequest) -> HttpResponse:
+    """
+    Async version of views.city_hotels_view.
+    """
+
+    # Loaded eagerly, a lazy list would query the database from the event loop
+    cities = await ahome_cities()
+    fragment = None
+    if "city" in request.GET:
+        fragment = await ahotel_list_fragment(request, request.GET["city"])
+    context = home_context(cities, fragment)
+    # Loaded here, the template cannot query the session and user
+    context["user"] = await request.auser()
+    return render(request, "home_page.html", context)
+
+
+async def aautocomplete_etag(request: HttpRequest) -> str:
+    return version_etag(
+        await acity_index_version(),
+        request.GET.get("q", ""),
+        request.GET.get("mode"),
+    )
+
+
+@cache_control(public=True, no_cache=True)
+@async_condition(aautocomplete_etag)
+async def acity_autocomplete(request: HttpRequest) -> HttpResponse:
+    """
+    Async version of views.city_autocomplete.
+    """
+
+    query = request.GET.get("q", "")
+    if request.GET.get("mode") == "fuzzy":
+        cities = await city_index.afuzzy_search(query)
+    else:
+        cities = await city_index.asearch(query)
+    return json_response(encode_rows(cities, ("id", "name", "hotels")))
+
+
+async def ahotels_by_city_etag(request: HttpRequest, city_code: str) -> str:
+    return version_etag(
+        *await acity_response_key(city_code),
+        request.GET.get("cursor"),
+        request.GET.get("limit"),
+    )
+
+
+@cache_control(public=True, no_cache=True)
+@async_condition(ahotels_by_city_etag)
+async def aget_hotels_by_city(request: HttpRequest, city_code) -> HttpResponse:
+    """
+    Async version of views.get_hotels_by_city.
+    """
+
+    try:
+        cursor, size = hotel_list_params(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    key = (*await acity_response_key(city_code), cursor, size)
+    body = hotel_responses.get(key)
+    if body is None:
+        try:
+            city = await City.objects.aget(code=city_code)
+        except City.DoesNotExist:
+            return JsonResponse({"error": "City not found"}, status=404)
+
+        page = await apaginate_by_name(
+            Hotel.objects.filter(city=city), cursor, size, fields=HOTEL_FIELDS
+        )
+        body = encode_hotel_page(page)
+        hotel_responses.put(key, body)
+
+    return json_response(body)
@@ -0,0 +1,77 @@
+# hotels/auth.py
+# Identity resolution of the managers.
+# The session user is loaded along with their city in one query, instead of a
+# query for the user and a lazy one for the city. The role and city code of
+# the user are also remembered in the session at login, so that requests
+# only needing those, like the rejection of non-managers by manager_required,
+# do not load the user at all. The remembered values carry the version of the
+# user, which every save bumps, so they are dropped as soon as they change.
+
+from __future__ import annotations
+
+from typing import NamedTuple, Optional
+
+from django.contrib.auth import SESSION_KEY, get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.http import HttpRequest
+
+from hotels.caching import user_version
+
+SESSION_IDENTITY_KEY = "hotels_identity"
+
+
+class CityUserBackend(ModelBackend):
+    """
+    Authentication backend loading the session user with their city.
+    """
+
+    def get_user(self, user_id):
+        UserModel = get_user_model()
+        try:
+            user = UserModel._default_manager.select_related("city").get(
+                pk=user_id
+            )
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class SessionIdentity(NamedTuple):
+    role: str
+    city_code: Optional[str]
+    is_superuser: bool
+
+    @property
+    def is_manager(self) -> bool:
+        return self.role == "manager" and not self.is_superuser
+
+
+def remember_identity(request: HttpRequest, user) -> None:
+    """
+    Remember the role and city of the logged in `user` in the session.
+    """
+
+    request.session[SESSION_IDENTITY_KEY] = {
+        "user": str(user.pk),
+        "version": user_version(user.pk),
+        "role": user.role,
+        "city": user.city_id,
+        "superuser": user.is_superuser,
+    }
+
+
+def session_identity(request: HttpRequest) -> Optional[SessionIdentity]:
+    """
+    Return the identity remembered for the session user, or None when there
+    is none or the user changed since.
+    """
+
+    identity = request.session.get(SESSION_IDENTITY_KEY)
+    user_id = request.session.get(SESSION_KEY)
+    if identity is None or user_id is None or identity["user"] != user_id:
+        return None
+    if identity["version"] != user_version(user_id):
+        return None
+    return SessionIdentity(
+        identity["role"], identity["city"], identity["superuser"]
+    )
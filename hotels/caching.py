@@ -0,0 +1,274 @@
+# hotels/caching.py
+# Versions of the cached data, and response cache of the per-city hotel lists.
+# The serialized JSON of every city is kept in a process-local LRU cache,
+# keyed by the city code along with a version of the city and a version of the
+# whole catalog. The versions live in Django's default cache, shared between
+# processes when it is configured to be, so that a bump by a view, the admin or
+# an import makes every process miss and rebuild the response. The catalog
+# version and the versions of the cities changed since are kept in a single
+# key, so that bumping the cities of an import batch is one cache write
+# however many cities it touches. The async views read the versions with the
+# async cache API. The home page caches its city list and rendered hotel lists
+# the same way, and the sessions the role and city of their user.
+
+from __future__ import annotations
+
+import fcntl
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Hashable, Iterator, Optional
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+from hotels.utils import (
+    CITY_RESPONSE_CACHE_BYTES,
+    CITY_VERSIONS_LIMIT,
+    HOME_PAGE_CACHE_BYTES,
+)
+
+# The version of a city whose version key was never written, so that reading
+# the version of a code sent by a client writes nothing to the cache
+BASE_CITY_VERSION = 0
+
+# The (catalog version, {city code: city version}) of the cached responses
+CITY_VERSIONS_KEY = "hotels:city-versions"
+CITIES_VERSION_KEY = "hotels:cities-version"
+HOTEL_COUNTS_VERSION_KEY = "hotels:hotel-counts-version"
+
+# Serializes the updates of the city versions made by the threads of this
+# process, versions_lock also those made by other processes
+city_versions_lock = threading.Lock()
+
+
+def new_version() -> int:
+    # Versions are never reused, even when a version key was evicted
+    return time.time_ns()
+
+
+@contextmanager
+def versions_lock() -> Iterator[None]:
+    """
+    Hold the lock of the city versions, so that concurrent bumps do not
+    overwrite each other. A file cache is shared by the processes of the host,
+    which lock a file next to it.
+    """
+
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    with city_versions_lock:
+        if not isinstance(backend, FileBasedCache):
+            yield
+            return
+        directory = backend._dir
+        os.makedirs(directory, 0o700, exist_ok=True)
+        with open(os.path.join(directory, "versions.lock"), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def get_version(key: str) -> int:
+    """
+    Return the current version stored under `key`, starting a new one if the
+    key is missing.
+    """
+
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, new_version(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(key: str) -> int:
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, new_version(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_city_versions(*city_codes: str) -> None:
+    """
+    Invalidate the cached responses of the given cities, with one cache write.
+    Once more than CITY_VERSIONS_LIMIT cities were bumped, the catalog version
+    is bumped instead, which keeps the versions cheap to read.
+    """
+
+    if not city_codes:
+        return
+    version = new_version()
+    with versions_lock():
+        # A missing key was evicted, the new catalog version drops everything
+        catalog, cities = cache.get(CITY_VERSIONS_KEY) or (version, {})
+        cities = {**cities, **dict.fromkeys(city_codes, version)}
+        if len(cities) > CITY_VERSIONS_LIMIT:
+            catalog, cities = version, {}
+        cache.set(CITY_VERSIONS_KEY, (catalog, cities), timeout=None)
+
+
+def bump_catalog_version() -> None:
+    """
+    Invalidate the cached responses of every city, after bulk changes.
+    """
+
+    with versions_lock():
+        cache.set(CITY_VERSIONS_KEY, (new_version(), {}), timeout=None)
+
+
+def cities_version() -> int:
+    """
+    Return the version of the list of cities.
+    """
+
+    return get_version(CITIES_VERSION_KEY)
+
+
+async def acities_version() -> int:
+    return await aget_version(CITIES_VERSION_KEY)
+
+
+def bump_cities_version() -> None:
+    """
+    Invalidate everything derived from the list of cities, like the city index.
+    """
+
+    cache.set(CITIES_VERSION_KEY, new_version(), timeout=None)
+
+
+def hotel_counts_version() -> int:
+    """
+    Return the version of the hotel counts of the cities.
+    """
+
+    return get_version(HOTEL_COUNTS_VERSION_KEY)
+
+
+async def ahotel_counts_version() -> int:
+    return await aget_version(HOTEL_COUNTS_VERSION_KEY)
+
+
+def bump_hotel_counts_version() -> None:
+    """
+    Invalidate the hotel counts shown by the city index, only needed when a
+    count actually changed.
+    """
+
+    cache.set(HOTEL_COUNTS_VERSION_KEY, new_version(), timeout=None)
+
+
+def city_index_version() -> tuple[int, int]:
+    """
+    Return the version of the city index, which lists the cities along with
+    their hotel counts.
+    """
+
+    return cities_version(), hotel_counts_version()
+
+
+async def acity_index_version() -> tuple[int, int]:
+    return await acities_version(), await ahotel_counts_version()
+
+
+def user_version_key(user_id) -> str:
+    return f"hotels:user-version:{user_id}"
+
+
+def user_version(user_id) -> int:
+    """
+    Return the version of a user, which changes whenever the user is saved.
+    """
+
+    return get_version(user_version_key(user_id))
+
+
+def bump_user_version(user_id) -> None:
+    cache.set(user_version_key(user_id), new_version(), timeout=None)
+
+
+def city_response_key(city_code: str) -> tuple[str, int, int]:
+    """
+    Return the cache key of the current response of a city.
+    """
+
+    return city_response_keys([city_code])[0]
+
+
+def city_response_keys(city_codes: list[str]) -> list[tuple[str, int, int]]:
+    """
+    Return the cache keys of the current responses of several cities, reading
+    all their versions at once.
+    """
+
+    versions = cache.get(CITY_VERSIONS_KEY)
+    if versions is None:
+        cache.add(CITY_VERSIONS_KEY, (new_version(), {}), timeout=None)
+        versions = cache.get(CITY_VERSIONS_KEY)
+    catalog, cities = versions
+    return [
+        (code, catalog, cities.get(code, BASE_CITY_VERSION))
+        for code in city_codes
+    ]
+
+
+async def acity_response_key(city_code: str) -> tuple[str, int, int]:
+    versions = await cache.aget(CITY_VERSIONS_KEY)
+    if versions is None:
+        await cache.aadd(CITY_VERSIONS_KEY, (new_version(), {}), timeout=None)
+        versions = await cache.aget(CITY_VERSIONS_KEY)
+    catalog, cities = versions
+    return city_code, catalog, cities.get(city_code, BASE_CITY_VERSION)
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of response bodies, bounded by their total size.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: OrderedDict[Hashable, bytes] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self.lock:
+            body = self.entries.get(key)
+            if body is not None:
+                self.entries.move_to_end(key)
+            return body
+
+    def put(self, key: Hashable, body: bytes) -> None:
+        """
+        Store a body, evicting the least recently used ones to make room.
+        Bodies larger than the whole cache are not stored.
+        """
+
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+# The JSON bodies returned by get_hotels_by_city.
+hotel_responses = ResponseCache(CITY_RESPONSE_CACHE_BYTES)
+
+# The pickled city list and hotel list fragments of the home page.
+home_pages = ResponseCache(HOME_PAGE_CACHE_BYTES)
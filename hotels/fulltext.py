@@ -0,0 +1,153 @@
+# hotels/fulltext.py
+# Full-text search of the hotels by hotel and city name.
+# On SQLite the search runs against the hotels_hotel_fts FTS5 table, which
+# triggers keep in sync with every write to the hotel and city tables,
+# including bulk imports. Other databases fall back to LIKE lookups.
+
+from __future__ import annotations
+
+import re
+from typing import NamedTuple
+
+from django.db import connection, transaction
+from django.db.models import Q, QuerySet
+from django.db.models.expressions import RawSQL
+
+from hotels.models import Hotel
+from hotels.utils import SEARCH_PAGE_SIZE
+
+FTS_TABLE = "hotels_hotel_fts"
+
+# Hotel name matches weigh more than city name matches in the ranking
+SEARCH_SQL = f"""
+    SELECT hotels_hotel.code, hotels_hotel.name, hotels_city.code, hotels_city.name
+    FROM {FTS_TABLE}
+    INNER JOIN hotels_hotel ON hotels_hotel.id = {FTS_TABLE}.rowid
+    INNER JOIN hotels_city ON hotels_city.code = hotels_hotel.city_id
+    WHERE {FTS_TABLE} MATCH %s
+    ORDER BY bm25({FTS_TABLE}, 10.0, 1.0), hotels_hotel.name, hotels_hotel.id
+    LIMIT %s OFFSET %s
+"""
+
+
+class HotelMatch(NamedTuple):
+    code: str
+    name: str
+    city_code: str
+    city_name: str
+
+
+def has_fts() -> bool:
+    """
+    Tell whether the database has the FTS5 hotel index.
+    """
+
+    return connection.vendor == "sqlite"
+
+
+def match_expression(query: str) -> str:
+    """
+    Turn user input into an FTS5 query matching every word as a prefix.
+    Words are quoted, so FTS5 operators in the input are taken literally.
+    """
+
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search_hotels(
+    query: str, page: int = 1, page_size: int = SEARCH_PAGE_SIZE
+) -> tuple[list[HotelMatch], bool]:
+    """
+    Return one page of the hotels matching every word of `query` in their
+    name or city name, best matches first, and whether there is a next page.
+    """
+
+    page = max(page, 1)
+    if has_fts():
+        expression = match_expression(query)
+        if not expression:
+            return [], False
+        with connection.cursor() as cursor:
+            # One extra row tells whether there is a next page, without a count
+            cursor.execute(
+                SEARCH_SQL,
+                [expression, page_size + 1, (page - 1) * page_size],
+            )
+            rows = [HotelMatch(*row) for row in cursor.fetchall()]
+    else:
+        words = re.findall(r"\w+", query)
+        if not words:
+            return [], False
+        hotels = like_search(Hotel.objects.all(), words).order_by("name", "id")
+        rows = [
+            HotelMatch(*row)
+            for row in hotels.values_list(
+                "code", "name", "city__code", "city__name"
+            )[(page - 1) * page_size : page * page_size + 1]
+        ]
+    return rows[:page_size], len(rows) > page_size
+
+
+def like_search(hotels: QuerySet, words: list[str]) -> QuerySet:
+    """
+    Filter hotels to those whose name or city name contains every word.
+    """
+
+    for word in words:
+        hotels = hotels.filter(
+            Q(name__icontains=word) | Q(city__name__icontains=word)
+        )
+    return hotels
+
+
+def filter_hotels(hotels: QuerySet, query: str) -> QuerySet:
+    """
+    Filter a Hotel queryset to the hotels matching `query`, using the
+    full-text index when available. The ordering of `hotels` is kept.
+    """
+
+    if not has_fts():
+        return like_search(hotels, re.findall(r"\w+", query))
+    expression = match_expression(query)
+    if not expression:
+        return hotels
+    return hotels.filter(
+        id__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [expression],
+        )
+    )
+
+
+def optimize_index() -> None:
+    """
+    Merge the index segments written row by row during an import.
+    """
+
+    if has_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"
+            )
+
+
+def rebuild_index() -> int:
+    """
+    Rebuild the full-text index from the hotel table in bulk, returning the
+    number of indexed hotels.
+    """
+
+    if not has_fts():
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, name, city_name) "
+            "SELECT hotels_hotel.id, hotels_hotel.name, hotels_city.name "
+            "FROM hotels_hotel "
+            "INNER JOIN hotels_city ON hotels_city.code = hotels_hotel.city_id"
+        )
+        indexed = cursor.rowcount
+    optimize_index()
+    return indexed
@@ -0,0 +1,30 @@
+# hotels/importers
+# Shared machinery used by the `import_cities` and `import_hotels` management commands.
+
+from hotels.importers.engine import (
+    ADDED,
+    DEFAULT_BATCH_SIZE,
+    MALFORMED,
+    MISSING_CITY,
+    UNCHANGED,
+    UPDATED,
+    BatchStats,
+    HotelBatchImporter,
+    HotelRow,
+    ImportReport,
+    QueryCounter,
+)
+
+__all__ = [
+    "ADDED",
+    "DEFAULT_BATCH_SIZE",
+    "MALFORMED",
+    "MISSING_CITY",
+    "UNCHANGED",
+    "UPDATED",
+    "BatchStats",
+    "HotelBatchImporter",
+    "HotelRow",
+    "ImportReport",
+    "QueryCounter",
+]
@@ -0,0 +1,57 @@
+# hotels/importers/cities.py
+# Helpers for importing the city feed.
+
+from __future__ import annotations
+
+from typing import Callable, Iterable, Iterator, Optional
+
+from hotels.caching import bump_cities_version
+from hotels.importers.engine import DEFAULT_BATCH_SIZE
+from hotels.models import City
+
+
+def parse_city_rows(
+    rows: Iterable[list],
+    on_malformed: Optional[Callable[[list, int], None]] = None,
+) -> Iterator[tuple[str, str]]:
+    """
+    Yield the cleaned (code, name) pairs of the well-formed city feed rows.
+    `on_malformed` is called with every other row and its line number.
+    """
+
+    for line, row in enumerate(rows, start=1):
+        # Ensure the row contains exactly two elements
+        if len(row) != 2:
+            if on_malformed is not None:
+                on_malformed(row, line)
+            continue
+
+        # Extract and clean city code and name
+        yield row[0].strip(), row[1].strip()
+
+
+def insert_missing_cities(
+    cities: Iterable[tuple[str, str]], batch_size: int = DEFAULT_BATCH_SIZE
+) -> tuple[int, int]:
+    """
+    Bulk insert the cities that do not exist yet, leaving existing ones untouched.
+    Returns the number of added and already existing cities.
+    """
+
+    existing = set(City.objects.values_list("code", flat=True))
+    missing = {}
+    found = 0
+    for code, name in cities:
+        if code in existing:
+            found += 1
+        else:
+            missing.setdefault(code, name)
+
+    City.objects.bulk_create(
+        [City(code=code, name=name) for code, name in missing.items()],
+        batch_size=batch_size,
+    )
+    if missing:
+        # bulk_create sends no signals
+        bump_cities_version()
+    return len(missing), found
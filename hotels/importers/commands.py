@@ -0,0 +1,175 @@
+# hotels/importers/commands.py
+# Behaviour shared by the feed import management commands.
+
+from __future__ import annotations
+
+from typing import Mapping, Optional
+
+import requests
+from requests.auth import HTTPBasicAuth
+
+from hotels.importers.fetch import conditional_headers, is_unchanged
+from hotels.importers.rejects import RejectWriter
+from hotels.importers.sources import (
+    Feed,
+    http_feed,
+    local_feed,
+    peak_memory_mib,
+)
+from hotels.models import FeedState
+from hotels.utils import PASSWORD, USERNAME
+
+
+class FeedCommandMixin:
+    """
+    Mixin for management commands importing a single CSV feed.
+
+    Subclasses set `feed_label` to the singular noun used in their messages
+    (e.g. 'hotel').
+    """
+
+    feed_label = ""
+    # Whether only the final stats block is printed, not one line per row
+    summary = False
+    # Where rejected rows are quarantined, if anywhere
+    rejects: Optional[RejectWriter] = None
+
+    def add_feed_arguments(self, parser) -> None:
+        """
+        Add the options selecting where and how the feed is read.
+        """
+
+        parser.add_argument(
+            "--source",
+            help=(
+                "Read the feed from a local file, optionally gzip, bz2 or xz "
+                "compressed, or '-' for stdin, instead of downloading it."
+            ),
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help="Read and parse the feed incrementally in bounded memory.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Import the feed even if it did not change since the last import.",
+        )
+
+    def add_output_arguments(self, parser) -> None:
+        """
+        Add the options controlling what the import reports and where.
+        """
+
+        parser.add_argument(
+            "--summary",
+            action="store_true",
+            help="Only count row outcomes and print a final stats block.",
+        )
+        parser.add_argument(
+            "--rejects",
+            help=(
+                "Write rejected rows with their reason code to this JSON lines "
+                "file, or CSV file when it ends with '.csv'."
+            ),
+        )
+
+    def open_rejects(self, path: Optional[str]) -> bool:
+        """
+        Open the reject file, if requested. Returns False when it cannot be created.
+        """
+
+        self.rejects = None
+        if path:
+            try:
+                self.rejects = RejectWriter(path)
+            except OSError as e:
+                self.stderr.write(f"Error opening reject file: {e}")
+                return False
+        return True
+
+    def close_rejects(self) -> None:
+        if self.rejects is not None:
+            self.rejects.close()
+
+    def write_reject(self, reason: str, row: list, line: int) -> None:
+        """
+        Quarantine a rejected row, if a reject file is open.
+        """
+
+        if self.rejects is not None:
+            self.rejects.write(reason, row, line)
+
+    def write_stats(self, counts: Mapping[str, int], *lines: str) -> None:
+        """
+        Print the final stats block of a summary mode import.
+        """
+
+        self.stdout.write(f"{self.feed_label.capitalize()} import summary:")
+        for outcome, count in counts.items():
+            self.stdout.write(f"  {outcome.replace('_', ' '):<13} {count}")
+        for line in lines:
+            self.stdout.write(f"  {line}")
+        peak = peak_memory_mib()
+        if peak is not None:
+            self.stdout.write(f"  {'peak memory':<13} {peak:.1f} MiB")
+        if self.rejects is not None:
+            self.stdout.write(
+                f"  {'rejects':<13} {self.rejects.count} written to {self.rejects.path}"
+            )
+
+    def open_feed(
+        self,
+        url: str,
+        state: Optional[FeedState],
+        source: Optional[str] = None,
+        stream: bool = False,
+    ) -> Optional[Feed]:
+        """
+        Open the feed from `source` or `url`, returning None when there is
+        nothing to import: the feed could not be read or did not change.
+        """
+
+        label = self.feed_label
+        if source:
+            try:
+                feed = local_feed(source)
+            except OSError as e:
+                self.stderr.write(f"Error reading {label} data: {e}")
+                return None
+        else:
+            try:
+                # the HTTP request with authentication, revalidating the last import
+                response = requests.get(
+                    url,
+                    auth=HTTPBasicAuth(USERNAME, PASSWORD),
+                    headers=conditional_headers(state),
+                    timeout=10,  # Set timeout to prevent hanging
+                    stream=stream,
+                )
+
+                if response.status_code == 304:
+                    self.stdout.write(
+                        f"{label.capitalize()} data not modified since the last import. Skipping."
+                    )
+                    return None
+
+                if response.status_code != 200:
+                    self.stderr.write(
+                        f"Failed to fetch {label} data. HTTP Status Code: {response.status_code}"
+                    )
+                    return None
+
+            except requests.RequestException as e:
+                self.stderr.write(f"Error fetching {label} data: {e}")
+                return None
+
+            feed = http_feed(response, stream)
+
+        if feed.digest is not None and is_unchanged(state, feed.digest):
+            self.stdout.write(
+                f"{label.capitalize()} data unchanged since the last import. Skipping."
+            )
+            return None
+        return feed
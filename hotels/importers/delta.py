@@ -0,0 +1,129 @@
+# hotels/importers/delta.py
+# Incremental (delta) imports.
+# The incoming feed is compared against a compact snapshot of the current table
+# (code -> fingerprint of the other columns) and only the resulting change set of
+# inserts, updates and deletes is written.
+
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from django.db import models, transaction
+
+from hotels.importers.engine import DEFAULT_BATCH_SIZE, batched
+
+
+def fingerprint(*values: str) -> bytes:
+    """
+    Return a compact, stable fingerprint of the given column values.
+    """
+
+    return hashlib.blake2b(
+        "\x1f".join(values).encode("utf-8"), digest_size=8
+    ).digest()
+
+
+def take_snapshot(queryset: models.QuerySet) -> dict[str, bytes]:
+    """
+    Map the first column of a `values_list` queryset to a fingerprint of the rest.
+    """
+
+    return {
+        code: fingerprint(*values)
+        for code, *values in queryset.iterator(chunk_size=DEFAULT_BATCH_SIZE)
+    }
+
+
+@dataclass
+class ChangeSet:
+    """
+    The inserts, updates and deletes turning the current table into the feed.
+    """
+
+    inserts: dict[str, tuple[str, ...]] = field(default_factory=dict)
+    updates: dict[str, tuple[str, ...]] = field(default_factory=dict)
+    deletes: list[str] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.inserts or self.updates or self.deletes)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.inserts)} to insert, {len(self.updates)} to update, "
+            f"{len(self.deletes)} to delete, {self.unchanged} unchanged"
+        )
+
+
+def compute_changes(
+    snapshot: dict[str, bytes],
+    rows: Iterable[tuple[str, tuple[str, ...]]],
+    keep: Iterable[str] = (),
+) -> ChangeSet:
+    """
+    Compare `(code, values)` feed rows against a snapshot of the table.
+
+    Codes listed in `keep` are present in the feed but could not be imported,
+    so they are never deleted. A feed without any row never deletes anything,
+    so that a truncated download cannot wipe the catalog.
+    """
+
+    changes = ChangeSet()
+    seen = set()
+    for code, values in rows:
+        seen.add(code)
+        current = snapshot.get(code)
+        if current is None:
+            changes.inserts[code] = values
+        elif current != fingerprint(*values):
+            changes.updates[code] = values
+        else:
+            changes.unchanged += 1
+
+    # `keep` may be filled while the rows are consumed, so read it last
+    seen.update(keep)
+    if seen:
+        changes.deletes = sorted(code for code in snapshot if code not in seen)
+    return changes
+
+
+def apply_changes(
+    model: type[models.Model],
+    changes: ChangeSet,
+    fields: tuple[str, ...],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    raw_delete: bool = False,
+) -> None:
+    """
+    Write a change set to the table of `model` in a single transaction.
+
+    `fields` names the attributes holding the values of every change, in order.
+    Rows are matched on their `code` field. With `raw_delete`, rows are deleted
+    with one DELETE per batch, without loading them, sending their signals or
+    cascading, for models whose receivers the caller makes up for.
+    """
+
+    update_fields = [model._meta.get_field(name).name for name in fields]
+    objects = [
+        model(code=code, **dict(zip(fields, values)))
+        for code, values in {**changes.inserts, **changes.updates}.items()
+    ]
+
+    with transaction.atomic():
+        if objects:
+            model.objects.bulk_create(
+                objects,
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["code"],
+                update_fields=update_fields,
+            )
+        for codes in batched(changes.deletes, batch_size):
+            deleted = model.objects.filter(code__in=codes)
+            if raw_delete:
+                deleted._raw_delete(deleted.db)
+            else:
+                deleted.delete()
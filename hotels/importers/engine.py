@@ -0,0 +1,319 @@
+# hotels/importers/engine.py
+# Batched import engine for the hotel feed.
+# City codes are loaded once, rows are grouped into batches and every batch is
+# written with a single bulk upsert keyed on ``Hotel.code`` inside one transaction.
+
+from __future__ import annotations
+
+import time
+from collections import Counter
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import (
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+)
+
+from django.db import connection, transaction
+
+from hotels.caching import (
+    bump_city_versions,
+    bump_hotel_counts_version,
+)
+from hotels.models import City, Hotel
+
+# Number of valid rows written per transaction unless configured otherwise.
+DEFAULT_BATCH_SIZE = 1000
+
+# Row outcomes reported by the engine.
+ADDED = "added"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+MALFORMED = "malformed"
+MISSING_CITY = "missing_city"
+
+
+class HotelRow(NamedTuple):
+    """
+    A validated row of the hotel feed.
+    """
+
+    city_code: str
+    code: str
+    name: str
+
+
+@dataclass
+class BatchStats:
+    """
+    Timing and query statistics for a single committed batch.
+    """
+
+    number: int
+    rows: int
+    queries: int
+    seconds: float
+    # Number of feed rows consumed once the batch was committed
+    offset: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else float(self.rows)
+
+
+@dataclass
+class ImportReport:
+    """
+    Aggregated outcome counts and batch statistics of an import run.
+    """
+
+    added: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    malformed: int = 0
+    missing_city: int = 0
+    seconds: float = 0.0
+    batches: list[BatchStats] = field(default_factory=list)
+
+    @property
+    def rows(self) -> int:
+        return (
+            self.added
+            + self.updated
+            + self.unchanged
+            + self.malformed
+            + self.missing_city
+        )
+
+    @property
+    def queries(self) -> int:
+        return sum(batch.queries for batch in self.batches)
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else float(self.rows)
+
+    def summary(self) -> str:
+        return (
+            f"Processed {self.rows} rows in {self.seconds:.3f}s "
+            f"({self.rows_per_second:.0f} rows/s, {self.queries} queries in "
+            f"{len(self.batches)} batches): {self.added} added, "
+            f"{self.updated} updated, {self.unchanged} unchanged, "
+            f"{self.malformed} malformed, {self.missing_city} missing city"
+        )
+
+    def count(self, outcome: str) -> None:
+        setattr(self, outcome, getattr(self, outcome) + 1)
+
+    @classmethod
+    def merge(cls, reports: Iterable[ImportReport]) -> ImportReport:
+        """
+        Combine the reports of several partial imports into one.
+        The caller is expected to set the wall-clock duration.
+        """
+
+        merged = cls()
+        for report in reports:
+            for outcome in (ADDED, UPDATED, UNCHANGED, MALFORMED, MISSING_CITY):
+                setattr(
+                    merged,
+                    outcome,
+                    getattr(merged, outcome) + getattr(report, outcome),
+                )
+            merged.batches.extend(report.batches)
+        return merged
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting the queries run while it is installed.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Yield successive lists of at most `size` items from `iterable`.
+    """
+
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class HotelBatchImporter:
+    """
+    Imports hotel rows in batches of bulk upserts.
+
+    `on_row` is called with the outcome, the raw row and the city name (when
+    known) for every processed row; `on_batch` is called with the statistics of
+    every committed batch. Every batch transaction runs while holding
+    `write_lock`, which lets concurrent importers serialize their writes.
+    `checkpoint` is called inside every batch transaction with the number of
+    feed rows consumed so far, so a checkpoint is committed with its batch.
+    `on_reject` is called with the outcome, the raw row and its line number for
+    every row rejected by validation.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        on_row: Optional[Callable[[str, list, Optional[str]], None]] = None,
+        on_batch: Optional[Callable[[BatchStats], None]] = None,
+        write_lock: Optional[ContextManager] = None,
+        checkpoint: Optional[Callable[[int], None]] = None,
+        offset: int = 0,
+        on_reject: Optional[Callable[[str, list, int], None]] = None,
+    ) -> None:
+        if batch_size < 1:
+            raise ValueError("batch_size must be a positive integer.")
+        self.batch_size = batch_size
+        self.on_row = on_row or (lambda outcome, row, city_name: None)
+        self.on_batch = on_batch or (lambda stats: None)
+        self.write_lock = write_lock or nullcontext()
+        self.checkpoint = checkpoint
+        self.on_reject = on_reject or (lambda outcome, row, line: None)
+        # Number of feed rows consumed, including rows skipped when resuming
+        self.offset = offset
+        self.cities: dict[str, str] = {}
+        self.report = ImportReport()
+
+    def run(self, rows: Iterable[list]) -> ImportReport:
+        """
+        Validate and write all `rows`, returning the aggregated report.
+        """
+
+        started = time.perf_counter()
+        self.report = ImportReport()
+        self.load_cities()
+        self.write_rows(self.validate(rows))
+        self.report.seconds = time.perf_counter() - started
+        return self.report
+
+    def load_cities(self) -> None:
+        """
+        Load every city code once instead of one lookup per row.
+        """
+
+        self.cities = dict(City.objects.values_list("code", "name"))
+
+    def validate(self, rows: Iterable[list]) -> Iterator[HotelRow]:
+        """
+        Yield the well-formed rows referencing a known city, reporting the rest.
+        """
+
+        for row in rows:
+            self.offset += 1
+            if len(row) != 3:  # Ensure the row has the expected 3 fields
+                self._reject(MALFORMED, row)
+                continue
+
+            city_code, hotel_code, hotel_name = map(str.strip, row)
+            if city_code not in self.cities:
+                self._reject(MISSING_CITY, row)
+                continue
+
+            yield HotelRow(city_code, hotel_code, hotel_name)
+
+    def write_rows(self, rows: Iterable[HotelRow]) -> None:
+        """
+        Write validated rows in batches of the configured size.
+        """
+
+        for number, batch in enumerate(
+            batched(rows, self.batch_size), start=len(self.report.batches) + 1
+        ):
+            self.write_batch(number, batch)
+
+    def write_batch(self, number: int, batch: list[HotelRow]) -> BatchStats:
+        """
+        Upsert a batch of rows in one transaction and report its statistics.
+        """
+
+        # Later rows win when the same hotel code appears twice in a batch
+        by_code = {row.code: row for row in batch}
+        outcomes = []
+        counter = QueryCounter()
+        started = time.perf_counter()
+
+        with self.write_lock, connection.execute_wrapper(
+            counter
+        ), transaction.atomic():
+            existing = {
+                code: (name, city_id)
+                for code, name, city_id in Hotel.objects.filter(
+                    code__in=by_code
+                ).values_list("code", "name", "city_id")
+            }
+            changed = []
+            # Cities whose hotel list changes, including those hotels move from
+            cities = set()
+            # Changes in the hotel counts of those cities
+            counts = Counter()
+            for row in by_code.values():
+                current = existing.get(row.code)
+                if current is None:
+                    outcomes.append((ADDED, row))
+                    counts[row.city_code] += 1
+                elif current != (row.name, row.city_code):
+                    outcomes.append((UPDATED, row))
+                    cities.add(current[1])
+                    counts[current[1]] -= 1
+                    counts[row.city_code] += 1
+                else:
+                    outcomes.append((UNCHANGED, row))
+                    continue
+                cities.add(row.city_code)
+                changed.append(
+                    Hotel(code=row.code, name=row.name, city_id=row.city_code)
+                )
+
+            if changed:
+                Hotel.objects.bulk_create(
+                    changed,
+                    update_conflicts=True,
+                    unique_fields=["code"],
+                    update_fields=["name", "city"],
+                )
+                City.objects.adjust_hotel_counts(counts)
+
+            if self.checkpoint is not None:
+                self.checkpoint(self.offset)
+
+        # The upserts send no signals, drop the cached responses here
+        bump_city_versions(*cities)
+        if any(counts.values()):
+            bump_hotel_counts_version()
+        stats = BatchStats(
+            number=number,
+            rows=len(batch),
+            queries=counter.count,
+            seconds=time.perf_counter() - started,
+            offset=self.offset,
+        )
+        # Only report the rows once the batch has been committed
+        for outcome, row in outcomes:
+            self._record(outcome, list(row))
+        self.report.batches.append(stats)
+        self.on_batch(stats)
+        return stats
+
+    def _reject(self, outcome: str, row: list) -> None:
+        self.on_reject(outcome, row, self.offset)
+        self._record(outcome, row)
+
+    def _record(self, outcome: str, row: list) -> None:
+        self.report.count(outcome)
+        city_name = self.cities.get(row[0].strip()) if row else None
+        self.on_row(outcome, row, city_name)
@@ -0,0 +1,123 @@
+# hotels/importers/fetch.py
+# Conditional fetching and checkpointing of the CSV feeds.
+# The validators and content digest of the last successful import of every feed
+# are stored in `FeedState`, so that unchanged feeds are skipped before any
+# parsing or database work happens. Unfinished imports leave a checkpoint there
+# so that they can be resumed.
+
+from __future__ import annotations
+
+import hashlib
+from typing import Mapping, Optional
+
+from hotels.models import FeedState
+
+
+def load_feed_state(name: str) -> Optional[FeedState]:
+    """
+    Return the remembered state of the feed, if it was imported before.
+    """
+
+    return FeedState.objects.filter(name=name).first()
+
+
+def conditional_headers(state: Optional[FeedState]) -> dict[str, str]:
+    """
+    Build the request headers revalidating the last imported version of a feed.
+    """
+
+    headers = {}
+    if state is not None:
+        if state.etag:
+            headers["If-None-Match"] = state.etag
+        if state.last_modified:
+            headers["If-Modified-Since"] = state.last_modified
+    return headers
+
+
+def new_digest():
+    """
+    Return the hash object used to fingerprint feed content.
+    """
+
+    return hashlib.sha256()
+
+
+def is_unchanged(state: Optional[FeedState], digest: str) -> bool:
+    """
+    Tell whether the feed content matches the last successful import.
+    """
+
+    return state is not None and state.digest == digest
+
+
+def save_feed_state(
+    name: str, headers: Mapping[str, str], digest: str
+) -> FeedState:
+    """
+    Remember the validators (from the response `headers`) and digest of a
+    successfully imported feed.
+    """
+
+    state, _ = FeedState.objects.update_or_create(
+        name=name,
+        defaults={
+            "etag": headers.get("ETag", ""),
+            "last_modified": headers.get("Last-Modified", ""),
+            "digest": digest,
+            # The import finished, there is nothing left to resume
+            "checkpoint_version": "",
+            "checkpoint_row": 0,
+        },
+    )
+    return state
+
+
+def forget_feed_state(name: str) -> None:
+    """
+    Drop the remembered state of a feed so that its next import is not skipped.
+    """
+
+    FeedState.objects.filter(name=name).delete()
+
+
+def feed_version(
+    headers: Mapping[str, str], digest: Optional[str] = None
+) -> str:
+    """
+    Identify the version of a feed being imported, for checkpointing.
+
+    The content digest is used when it is known before parsing; streamed feeds
+    fall back to a strong ETag. Returns an empty string when neither is known.
+    """
+
+    if digest:
+        return digest
+    etag = headers.get("ETag", "")
+    if etag and not etag.startswith("W/"):
+        return f"etag:{etag}"
+    return ""
+
+
+def save_checkpoint(name: str, version: str, row: int) -> None:
+    """
+    Record that the first `row` rows of the given feed version are committed.
+    """
+
+    updated = FeedState.objects.filter(name=name).update(
+        checkpoint_version=version, checkpoint_row=row
+    )
+    if not updated:
+        FeedState.objects.create(
+            name=name, checkpoint_version=version, checkpoint_row=row
+        )
+
+
+def checkpoint_row(state: Optional[FeedState], version: str) -> int:
+    """
+    Return the row to resume the given feed version from, or 0 to start over.
+    """
+
+    if state is None or not version or state.checkpoint_version != version:
+        return 0
+    return state.checkpoint_row
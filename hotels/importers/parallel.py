@@ -0,0 +1,114 @@
+# hotels/importers/parallel.py
+# Parallel hotel imports across a process pool.
+# Parsed rows are partitioned by city code and every partition is validated and
+# upserted by its own worker process, with its own database connection and
+# transactions. On SQLite, which allows a single writer, the batch
+# transactions of all workers are serialized by a shared lock.
+
+from __future__ import annotations
+
+import heapq
+import multiprocessing
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import repeat
+from typing import ContextManager, Iterable
+
+import django
+from django.db import connection, connections
+
+from hotels.importers.engine import (
+    DEFAULT_BATCH_SIZE,
+    HotelBatchImporter,
+    ImportReport,
+)
+
+# Lock held around every batch transaction of the current worker process.
+_write_lock: ContextManager = nullcontext()
+
+
+def partition_rows(rows: Iterable[list], count: int) -> list[list[list]]:
+    """
+    Split feed rows into at most `count` partitions of similar size.
+
+    All rows of a city end up in the same partition; the largest cities are
+    placed first, each into the partition holding the fewest rows so far.
+    """
+
+    by_city = defaultdict(list)
+    for row in rows:
+        by_city[row[0].strip() if row else ""].append(row)
+
+    partitions = [[] for _ in range(count)]
+    sizes = [(0, index) for index in range(count)]
+    for city_rows in sorted(by_city.values(), key=len, reverse=True):
+        size, index = heapq.heappop(sizes)
+        partitions[index].extend(city_rows)
+        heapq.heappush(sizes, (size + len(city_rows), index))
+    return [partition for partition in partitions if partition]
+
+
+def _init_worker(lock) -> None:
+    """
+    Prepare a worker process: set Django up and install the shared write lock.
+    """
+
+    global _write_lock
+    django.setup()
+    if lock is not None:
+        _write_lock = lock
+
+
+def import_partition(rows: list[list], batch_size: int) -> ImportReport:
+    """
+    Validate and upsert one partition in the current worker process.
+    """
+
+    try:
+        importer = HotelBatchImporter(
+            batch_size=batch_size, write_lock=_write_lock
+        )
+        return importer.run(rows)
+    finally:
+        connections.close_all()
+
+
+def import_parallel(
+    rows: Iterable[list],
+    workers: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> tuple[ImportReport, list[ImportReport]]:
+    """
+    Import feed rows using up to `workers` processes.
+
+    Returns the merged report, timed on the wall clock, along with the report
+    of every partition.
+    """
+
+    started = time.perf_counter()
+    partitions = partition_rows(rows, workers)
+
+    if len(partitions) <= 1:
+        # Nothing to parallelize, import in the current process
+        reports = [
+            HotelBatchImporter(batch_size=batch_size).run(partition)
+            for partition in partitions
+        ]
+    else:
+        lock = multiprocessing.Lock() if connection.vendor == "sqlite" else None
+        # Forked workers must not share the connections of this process
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=len(partitions),
+            initializer=_init_worker,
+            initargs=(lock,),
+        ) as pool:
+            reports = list(
+                pool.map(import_partition, partitions, repeat(batch_size))
+            )
+
+    merged = ImportReport.merge(reports)
+    merged.seconds = time.perf_counter() - started
+    return merged, reports
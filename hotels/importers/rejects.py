@@ -0,0 +1,51 @@
+# hotels/importers/rejects.py
+# Quarantine file for feed rows rejected by an import.
+# Every rejected row is written with its feed line number and a reason code,
+# as JSON lines, or as CSV when the file name ends with '.csv'.
+
+from __future__ import annotations
+
+import csv
+import json
+from typing import Optional
+
+
+class RejectWriter:
+    """
+    Writes rejected feed rows with their reason code to a JSONL or CSV file.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.count = 0
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.csv_writer: Optional[csv.writer] = None
+        if path.lower().endswith(".csv"):
+            self.csv_writer = csv.writer(self.file, delimiter=";")
+            self.csv_writer.writerow(["line", "reason", "row"])
+
+    def write(self, reason: str, row: list, line: int) -> None:
+        """
+        Record a rejected row of the feed.
+        """
+
+        self.count += 1
+        if self.csv_writer is not None:
+            self.csv_writer.writerow([line, reason, *row])
+        else:
+            self.file.write(
+                json.dumps(
+                    {"line": line, "reason": reason, "row": row},
+                    ensure_ascii=False,
+                )
+                + "\n"
+            )
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self) -> RejectWriter:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,230 @@
+# hotels/importers/sources.py
+# Helpers turning a feed into CSV rows.
+# The streaming helpers decode the HTTP body incrementally so that rows flow
+# through a generator pipeline and memory stays bounded regardless of feed size.
+# Feeds can also be read from local files, optionally compressed, or stdin;
+# uncompressed files are parsed from a memory-mapped buffer.
+
+from __future__ import annotations
+
+import bz2
+import codecs
+import csv
+import gzip
+import io
+import lzma
+import mmap
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator, Mapping, Optional
+
+import requests
+
+from hotels.importers.fetch import new_digest
+
+# Size of the chunks read from the HTTP body in streaming mode.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Leading bytes identifying compressed local feeds, with the matching opener.
+COMPRESSION_MAGIC = (
+    (b"\x1f\x8b", gzip.open),
+    (b"BZh", bz2.open),
+    (b"\xfd7zXZ\x00", lzma.open),
+)
+
+# Name of the local source reading the feed from the standard input.
+STDIN = "-"
+
+
+@dataclass
+class Feed:
+    """
+    The lines of a feed along with what identifies its version.
+
+    `digest` is set when the content digest is known before parsing; otherwise
+    `running_digest` is fed while the lines are read.
+    """
+
+    lines: Iterable[str]
+    headers: Mapping[str, str] = field(default_factory=dict)
+    digest: Optional[str] = None
+    running_digest: Any = None
+
+    def final_digest(self) -> str:
+        """
+        Return the content digest, once all lines have been read.
+        """
+
+        return self.digest or self.running_digest.hexdigest()
+
+
+def csv_rows(lines: Iterable[str]) -> Iterator[list[str]]:
+    """
+    Parse semicolon-separated feed lines into rows.
+    """
+
+    return csv.reader(lines, delimiter=";", quotechar='"')
+
+
+def response_lines(response: requests.Response) -> list[str]:
+    """
+    Split a fully downloaded feed into lines.
+    """
+
+    return response.text.strip().split("\n")
+
+
+def stream_response_lines(
+    response: requests.Response,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    digest=None,
+) -> Iterator[str]:
+    """
+    Yield the lines of a streamed response body, decoding it on the fly.
+
+    Only the current chunk and the trailing partial line are held in memory.
+    Line terminators are kept so that quoted fields spanning lines still parse.
+    When a hash object is given as `digest`, it is fed the decoded content.
+    """
+
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(
+        errors="replace"
+    )
+    pending = ""
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            text = decoder.decode(chunk)
+            if digest is not None:
+                digest.update(text.encode("utf-8"))
+            pending += text
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                yield line + "\n"
+        text = decoder.decode(b"", final=True)
+        if digest is not None:
+            digest.update(text.encode("utf-8"))
+        pending += text
+        if pending:
+            yield pending
+    finally:
+        response.close()
+
+
+def http_feed(response: requests.Response, stream: bool) -> Feed:
+    """
+    Wrap a successful HTTP response, either fully downloaded or streamed.
+    """
+
+    if stream:
+        # A streamed feed can only be fingerprinted once it has been read
+        running = new_digest()
+        return Feed(
+            lines=stream_response_lines(response, digest=running),
+            headers=response.headers,
+            running_digest=running,
+        )
+
+    digest = new_digest()
+    digest.update(response.text.encode("utf-8"))
+    return Feed(
+        lines=response_lines(response),
+        headers=response.headers,
+        digest=digest.hexdigest(),
+    )
+
+
+def local_feed(path: str) -> Feed:
+    """
+    Open a feed stored in a local file, or read from stdin when `path` is "-".
+
+    gzip, bz2 and xz compressed input is detected from its leading bytes.
+    Uncompressed files are memory-mapped, which also lets their digest be
+    computed before parsing. Raises OSError when the file cannot be read.
+    """
+
+    if path == STDIN:
+        stream = sys.stdin.buffer
+        if not hasattr(stream, "peek"):
+            stream = io.BufferedReader(stream)
+        return _decompressed_feed(stream, stream.peek(6)[:6], owned=False)
+
+    with open(path, "rb") as file:
+        head = file.read(6)
+        size = os.fstat(file.fileno()).st_size
+    if any(head.startswith(magic) for magic, _ in COMPRESSION_MAGIC):
+        return _decompressed_feed(open(path, "rb"), head, owned=True)
+
+    if size == 0:
+        return Feed(lines=[], digest=new_digest().hexdigest())
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    digest = new_digest()
+    digest.update(buffer)
+    return Feed(lines=mmap_lines(buffer), digest=digest.hexdigest())
+
+
+def mmap_lines(buffer: mmap.mmap) -> Iterator[str]:
+    """
+    Yield the decoded lines of a memory-mapped feed, closing it when done.
+    """
+
+    try:
+        for line in iter(buffer.readline, b""):
+            yield line.decode("utf-8", errors="replace")
+    finally:
+        buffer.close()
+
+
+def _decompressed_feed(file, head: bytes, owned: bool) -> Feed:
+    """
+    Wrap a binary file, decompressing it when `head` shows it is compressed.
+    Owned files are closed once all lines have been read.
+    """
+
+    stream = file
+    for magic, opener in COMPRESSION_MAGIC:
+        if head.startswith(magic):
+            stream = opener(file)
+            break
+
+    running = new_digest()
+    return Feed(
+        lines=_text_lines(stream, file if owned else None, running),
+        running_digest=running,
+    )
+
+
+def _text_lines(stream, owned_file, digest) -> Iterator[str]:
+    """
+    Yield the decoded lines of a binary stream, feeding them to `digest`.
+    """
+
+    text = io.TextIOWrapper(
+        stream, encoding="utf-8", errors="replace", newline=""
+    )
+    try:
+        for line in text:
+            digest.update(line.encode("utf-8"))
+            yield line
+    finally:
+        # Leave stdin open, only close what this module opened
+        text.detach()
+        if owned_file is not None:
+            stream.close()
+            owned_file.close()
+
+
+def peak_memory_mib() -> Optional[float]:
+    """
+    Return the peak resident set size of the process in MiB, when available.
+    """
+
+    try:
+        import resource
+    except ImportError:  # Not available on Windows
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
@@ -0,0 +1,200 @@
+# hotels/importers/staging.py
+# Staging imports of the hotel feed.
+# The feed is bulk loaded into the HotelStaging table and validated there, in
+# short batch transactions that never touch the Hotel table. The staged catalog
+# is then swapped into the Hotel table with a few set-based statements in one
+# transaction, so readers see either the old or the new catalog, and the Hotel
+# table is only locked for the duration of that swap.
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Optional
+
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Subquery
+
+from hotels.caching import (
+    bump_catalog_version,
+    bump_hotel_counts_version,
+)
+from hotels.importers.engine import (
+    DEFAULT_BATCH_SIZE,
+    MALFORMED,
+    MISSING_CITY,
+    batched,
+)
+from hotels.models import City, Hotel, HotelStaging
+
+
+@dataclass
+class StagingReport:
+    """
+    Outcome of a staging import: the staged rows and the effect of the swap.
+    """
+
+    staged: int = 0
+    malformed: int = 0
+    missing_city: int = 0
+    added: int = 0
+    updated: int = 0
+    deleted: int = 0
+    unchanged: int = 0
+    # Time spent loading and validating, and time the Hotel table was written
+    load_seconds: float = 0.0
+    swap_seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.staged} rows staged in {self.load_seconds:.3f}s "
+            f"({self.malformed} malformed, {self.missing_city} missing city), "
+            f"swapped in {self.swap_seconds:.3f}s: {self.added} added, "
+            f"{self.updated} updated, {self.deleted} deleted, "
+            f"{self.unchanged} unchanged"
+        )
+
+
+def stage_rows(
+    rows: Iterable[list],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_reject: Optional[Callable[[str, list, int], None]] = None,
+    report: Optional[StagingReport] = None,
+) -> StagingReport:
+    """
+    Replace the content of the staging table with the well-formed feed rows.
+    `on_reject` is called with the reason, the row and its line number for
+    every malformed row.
+    """
+
+    report = report or StagingReport()
+    started = time.perf_counter()
+
+    def staged_rows():
+        for line, row in enumerate(rows, start=1):
+            if len(row) != 3:  # Ensure the row has the expected 3 fields
+                report.malformed += 1
+                if on_reject is not None:
+                    on_reject(MALFORMED, row, line)
+                continue
+            city_code, hotel_code, hotel_name = map(str.strip, row)
+            yield HotelStaging(
+                line=line, code=hotel_code, name=hotel_name, city_code=city_code
+            )
+
+    HotelStaging.objects.all().delete()
+    for batch in batched(staged_rows(), batch_size):
+        # Later rows win when the same hotel code appears twice in the feed
+        by_code = {staged.code: staged for staged in batch}
+        with transaction.atomic():
+            HotelStaging.objects.bulk_create(
+                by_code.values(),
+                update_conflicts=True,
+                unique_fields=["code"],
+                update_fields=["line", "name", "city_code"],
+            )
+
+    report.staged = HotelStaging.objects.count()
+    report.load_seconds += time.perf_counter() - started
+    return report
+
+
+def validate_staging(
+    on_reject: Optional[Callable[[str, list, int], None]] = None,
+    report: Optional[StagingReport] = None,
+) -> StagingReport:
+    """
+    Flag the staged rows referencing an unknown city, reporting each of them.
+    """
+
+    report = report or StagingReport()
+    started = time.perf_counter()
+    missing = HotelStaging.objects.exclude(
+        city_code__in=City.objects.values("code")
+    )
+    report.missing_city = missing.update(missing_city=True)
+    if on_reject is not None and report.missing_city:
+        for line, city_code, code, name in (
+            HotelStaging.objects.filter(missing_city=True)
+            .order_by("line")
+            .values_list("line", "city_code", "code", "name")
+        ):
+            on_reject(MISSING_CITY, [city_code, code, name], line)
+    report.load_seconds += time.perf_counter() - started
+    return report
+
+
+def swap_staging(report: Optional[StagingReport] = None) -> StagingReport:
+    """
+    Make the Hotel table match the staged catalog in one transaction.
+
+    Hotels missing from the feed are deleted, unless nothing was staged, while
+    hotels whose staged row references an unknown city are left untouched.
+    """
+
+    report = report or StagingReport()
+    staged = HotelStaging.objects.filter(code=OuterRef("code"))
+    valid = HotelStaging.objects.filter(missing_city=False)
+    hotel_table = connection.ops.quote_name(Hotel._meta.db_table)
+    staging_table = connection.ops.quote_name(HotelStaging._meta.db_table)
+
+    started = time.perf_counter()
+    with transaction.atomic():
+        if HotelStaging.objects.exists():
+            # A single DELETE, unlike QuerySet.delete() which collects the
+            # rows first to send their signals
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {hotel_table} WHERE code NOT IN "
+                    f"(SELECT code FROM {staging_table})"
+                )
+                report.deleted = cursor.rowcount
+        report.updated = Hotel.objects.filter(
+            Exists(
+                valid.filter(code=OuterRef("code")).exclude(
+                    name=OuterRef("name"), city_code=OuterRef("city_id")
+                )
+            )
+        ).update(
+            name=Subquery(staged.values("name")[:1]),
+            city_id=Subquery(staged.values("city_code")[:1]),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {hotel_table} (code, name, city_id) "
+                f"SELECT s.code, s.name, s.city_code FROM {staging_table} s "
+                f"WHERE s.missing_city = %s AND NOT EXISTS "
+                f"(SELECT 1 FROM {hotel_table} h WHERE h.code = s.code)",
+                [False],
+            )
+            report.added = cursor.rowcount
+        # Recounted as a whole, like the catalog was swapped in
+        City.objects.recount_hotels()
+    report.swap_seconds = time.perf_counter() - started
+    # The set-based statements send no signals
+    bump_catalog_version()
+    bump_hotel_counts_version()
+
+    report.unchanged = (
+        report.staged - report.missing_city - report.added - report.updated
+    )
+    return report
+
+
+def import_staged(
+    rows: Iterable[list],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_reject: Optional[Callable[[str, list, int], None]] = None,
+    swap: bool = True,
+) -> StagingReport:
+    """
+    Stage, validate and, unless `swap` is False, swap in the feed rows.
+    The staging table is emptied once the catalog has been swapped in.
+    """
+
+    report = stage_rows(rows, batch_size, on_reject)
+    validate_staging(on_reject, report)
+    if swap:
+        swap_staging(report)
+        HotelStaging.objects.all().delete()
+    return report
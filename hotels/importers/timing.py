@@ -0,0 +1,51 @@
+# hotels/importers/timing.py
+# Per-phase timing of import runs.
+
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator
+
+# Phases of an import, in the order they are reported.
+PHASES = ("download", "parse", "validate", "write")
+
+
+class PhaseTimer:
+    """
+    Accumulates the time spent in every phase of an import, per feed.
+    Distinct feeds may be measured from different threads.
+    """
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, dict[str, float]] = defaultdict(dict)
+
+    @contextmanager
+    def measure(self, phase: str, feed: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.seconds[phase][feed] = (
+                self.seconds[phase].get(feed, 0.0) + elapsed
+            )
+
+    def lines(self) -> list[str]:
+        """
+        Format one line per measured phase with its per-feed breakdown.
+        """
+
+        lines = []
+        for phase in PHASES:
+            feeds = self.seconds.get(phase)
+            if not feeds:
+                continue
+            breakdown = ", ".join(
+                f"{feed} {seconds:.3f}s" for feed, seconds in feeds.items()
+            )
+            lines.append(
+                f"{phase:<9} {sum(feeds.values()):.3f}s ({breakdown})"
+            )
+        return lines
@@ -0,0 +1,117 @@
+import json
+import time
+from typing import Callable
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.http import JsonResponse
+
+from hotels import serialization
+from hotels.models import City, Hotel
+
+BENCHMARK_CITY = "ZZBENCH"
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command measuring the per-row cost of reading
+    and encoding the hotels of a city, with model instances and JsonResponse
+    as the views used to, and with value tuples and each available encoder.
+    The benchmark hotels are written in a transaction that is rolled back.
+    """
+
+    help = "Benchmarks the JSON serialization of hotel lists"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=10000,
+            help="Number of hotels read and encoded per run.",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of runs of every approach, the fastest is reported.",
+        )
+
+    def handle(self, *args, **kwargs) -> None:
+        rows, repeat = kwargs["rows"], kwargs["repeat"]
+        with transaction.atomic():
+            city = City.objects.create(code=BENCHMARK_CITY, name="Benchmark")
+            Hotel.objects.bulk_create(
+                (
+                    Hotel(
+                        code=f"{BENCHMARK_CITY}{number}",
+                        name=f"Hôtel {number}",
+                        city=city,
+                    )
+                    for number in range(rows)
+                ),
+                batch_size=1000,
+            )
+            # Every run evaluates a fresh queryset, so every run hits the database
+            hotels = Hotel.objects.filter(city=city).order_by("name", "id")
+
+            approaches = {
+                "model instances + JsonResponse": lambda: JsonResponse(
+                    {
+                        "hotels": [
+                            {"name": hotel.name, "code": hotel.code}
+                            for hotel in hotels.all()
+                        ]
+                    }
+                ).content,
+                "values_list + json.dumps": lambda: json.dumps(
+                    {
+                        "hotels": [
+                            {"name": name, "code": code}
+                            for name, code in hotels.values_list("name", "code")
+                        ]
+                    }
+                ).encode("utf-8"),
+                "values_list + fast path": self.with_encoder(
+                    serialization.stdlib_dumps, hotels
+                ),
+            }
+            if serialization.orjson is not None:
+                approaches["values_list + orjson"] = self.with_encoder(
+                    serialization.orjson.dumps, hotels
+                )
+
+            self.stdout.write(f"Serializing {rows} hotels, best of {repeat}:")
+            baseline = None
+            for label, run in approaches.items():
+                seconds = min(self.time(run) for _ in range(repeat))
+                baseline = baseline or seconds
+                self.stdout.write(
+                    f"{label:<32} {seconds * 1e6 / rows:7.2f} µs/row "
+                    f"({baseline / seconds:.1f}x)"
+                )
+            transaction.set_rollback(True)
+
+    def with_encoder(self, encoder, hotels) -> Callable[[], bytes]:
+        """
+        Return a run of the serialization layer with the given encoder.
+        """
+
+        def run() -> bytes:
+            previous = serialization.set_encoder(encoder)
+            try:
+                return serialization.encode_object(
+                    {
+                        "hotels": serialization.encode_rows(
+                            hotels.values_list("name", "code"), ("name", "code")
+                        )
+                    }
+                )
+            finally:
+                serialization.set_encoder(previous)
+
+        return run
+
+    def time(self, run: Callable[[], bytes]) -> float:
+        started = time.perf_counter()
+        run()
+        return time.perf_counter() - started
@@ -0,0 +1,226 @@
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from hotels.models import City
+
+# The (handler, HOTELS_ASYNC_VIEWS) configurations compared, each measured
+# in its own process since the URLconf picks the views once
+CONFIGURATIONS = (("wsgi", "0"), ("asgi", "0"), ("asgi", "1"))
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command measuring the throughput of the public
+    read views under concurrent requests, served by the WSGI handler from a
+    thread pool like a threaded server, and by the ASGI handler from an event
+    loop, with the sync views and with their async versions.
+
+    Requests are sent to the handlers in-process, so the numbers leave out the
+    server and the network, and compare how each stack serves the views.
+    """
+
+    help = "Benchmarks the public read views under WSGI and ASGI"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=1000,
+            help="Number of requests sent to every endpoint.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=50,
+            help="Number of requests in flight at once.",
+        )
+        parser.add_argument(
+            "--city",
+            help="Code of the city requested, by default the one with the most hotels.",
+        )
+        parser.add_argument(
+            "--handler",
+            choices=("wsgi", "asgi"),
+            help="Measure a single handler, with the views of HOTELS_ASYNC_VIEWS.",
+        )
+
+    def handle(self, *args, **kwargs) -> None:
+        if kwargs["handler"] is None:
+            self.compare(kwargs)
+            return
+
+        city = self.benchmark_city(kwargs["city"])
+        endpoints = {
+            "home": ("/", {"city": city.code}),
+            "autocomplete": (
+                "/hotels/autocomplete/",
+                {"q": city.name[:3]},
+            ),
+            "get_hotels_by_city": (f"/hotels/{city.code}/", {}),
+        }
+        views = "async" if settings.HOTELS_ASYNC_VIEWS else "sync"
+        label = f"{kwargs['handler'].upper()} ({views} views)"
+        for endpoint, (path, params) in endpoints.items():
+            if kwargs["handler"] == "wsgi":
+                seconds, errors = self.run_wsgi(
+                    path, params, kwargs["requests"], kwargs["concurrency"]
+                )
+            else:
+                seconds, errors = asyncio.run(
+                    self.run_asgi(
+                        path, params, kwargs["requests"], kwargs["concurrency"]
+                    )
+                )
+            self.stdout.write(
+                f"{label:<20} {endpoint:<20} "
+                f"{kwargs['requests'] / seconds:8.0f} requests/s"
+                + (f" ({errors} errors)" if errors else "")
+            )
+
+    def compare(self, kwargs: dict) -> None:
+        """
+        Measure every configuration in a child process.
+        """
+
+        self.stdout.write(
+            f"{kwargs['requests']} requests per endpoint, "
+            f"{kwargs['concurrency']} concurrent:"
+        )
+        for handler, async_views in CONFIGURATIONS:
+            command = [
+                sys.executable,
+                "-m",
+                "django",
+                "benchmark_views",
+                "--handler",
+                handler,
+                "--requests",
+                str(kwargs["requests"]),
+                "--concurrency",
+                str(kwargs["concurrency"]),
+            ]
+            if kwargs["city"]:
+                command += ["--city", kwargs["city"]]
+            environment = {**os.environ, "HOTELS_ASYNC_VIEWS": async_views}
+            result = subprocess.run(
+                command,
+                cwd=settings.BASE_DIR,
+                env=environment,
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode:
+                raise CommandError(result.stderr)
+            self.stdout.write(result.stdout.rstrip())
+
+    def benchmark_city(self, code) -> City:
+        cities = City.objects.annotate(hotel_total=Count("hotels"))
+        city = (
+            cities.filter(code=code).first()
+            if code
+            else cities.order_by("-hotel_total").first()
+        )
+        if city is None:
+            raise CommandError("No city to benchmark, import the feeds first.")
+        return city
+
+    def run_wsgi(
+        self, path: str, params: dict, requests: int, concurrency: int
+    ) -> tuple[float, int]:
+        """
+        Send the requests to the WSGI handler from `concurrency` threads.
+        Returns the elapsed seconds and the number of failed requests.
+        """
+
+        handler = WSGIHandler()
+        query = urlencode(params)
+
+        def request(_) -> bool:
+            environ = {
+                "REQUEST_METHOD": "GET",
+                "PATH_INFO": path,
+                "QUERY_STRING": query,
+                "SERVER_NAME": "localhost",
+                "SERVER_PORT": "80",
+                "HTTP_HOST": "localhost",
+                "wsgi.input": io.BytesIO(),
+                "wsgi.url_scheme": "http",
+            }
+            statuses = []
+            response = handler(
+                environ, lambda status, headers: statuses.append(status)
+            )
+            for _ in response:
+                pass
+            response.close()
+            return statuses[0].startswith("200")
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            started = time.perf_counter()
+            results = list(executor.map(request, range(requests)))
+            seconds = time.perf_counter() - started
+        return seconds, results.count(False)
+
+    async def run_asgi(
+        self, path: str, params: dict, requests: int, concurrency: int
+    ) -> tuple[float, int]:
+        """
+        Send the requests to the ASGI handler, `concurrency` at a time.
+        Returns the elapsed seconds and the number of failed requests.
+        """
+
+        handler = ASGIHandler()
+        query = urlencode(params).encode("ascii")
+        slots = asyncio.Semaphore(concurrency)
+
+        async def request() -> bool:
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "query_string": query,
+                "headers": [(b"host", b"localhost")],
+                "server": ("localhost", 80),
+                "client": ("127.0.0.1", 0),
+            }
+            done = asyncio.Event()
+            received = []
+            statuses = []
+
+            async def receive() -> dict:
+                if not received:
+                    received.append(True)
+                    return {"type": "http.request", "body": b""}
+                # The handler listens for a disconnect until it has responded
+                await done.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message: dict) -> None:
+                if message["type"] == "http.response.start":
+                    statuses.append(message["status"])
+                elif not message.get("more_body"):
+                    done.set()
+
+            async with slots:
+                await handler(scope, receive, send)
+            return statuses[0] == 200
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(request() for _ in range(requests)))
+        seconds = time.perf_counter() - started
+        return seconds, results.count(False)
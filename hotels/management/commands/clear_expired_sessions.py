@@ -0,0 +1,48 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from hotels.utils import SESSION_CLEANUP_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command deleting the expired sessions from the
+    database in batches, each in its own short transaction, so that the
+    session table is never locked for long. Unlike clearsessions, which
+    deletes them all in one statement.
+    """
+
+    help = "Deletes the expired sessions from the database in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=SESSION_CLEANUP_BATCH_SIZE,
+            help="Number of sessions deleted per statement.",
+        )
+
+    def handle(self, *args, **kwargs) -> None:
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        if not issubclass(store, DBStore):
+            self.stdout.write(
+                "Sessions are not stored in the database, there is nothing to clear."
+            )
+            return
+
+        session_model = store.get_model_class()
+        expired = session_model.objects.filter(expire_date__lt=timezone.now())
+        deleted = 0
+        while True:
+            keys = list(
+                expired.values_list("pk", flat=True)[: kwargs["batch_size"]]
+            )
+            if not keys:
+                break
+            deleted += session_model.objects.filter(pk__in=keys).delete()[0]
+        # Cached copies of the sessions expire along with them
+        self.stdout.write(f"Deleted {deleted} expired sessions.")
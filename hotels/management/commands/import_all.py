@@ -0,0 +1,218 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Optional
+
+import requests
+from django.core.management.base import BaseCommand
+from requests.auth import HTTPBasicAuth
+
+from hotels.fulltext import optimize_index
+from hotels.importers import DEFAULT_BATCH_SIZE, HotelBatchImporter
+from hotels.importers.cities import insert_missing_cities, parse_city_rows
+from hotels.importers.fetch import (
+    conditional_headers,
+    is_unchanged,
+    load_feed_state,
+    new_digest,
+    save_feed_state,
+)
+from hotels.importers.sources import csv_rows, response_lines
+from hotels.importers.timing import PhaseTimer
+from hotels.models import FeedState
+from hotels.utils import (
+    CITY_CSV_URL,
+    CITY_FEED,
+    HOTEL_CSV_URL,
+    HOTEL_FEED,
+    PASSWORD,
+    USERNAME,
+)
+
+
+@dataclass
+class FeedRows:
+    """
+    The downloaded and parsed rows of a feed, or the reason it was skipped.
+    """
+
+    feed: str
+    response: Optional[requests.Response] = None
+    digest: str = ""
+    rows: list = field(default_factory=list)
+    # Set when the feed is skipped; `error` tells whether it failed to download
+    message: str = ""
+    error: bool = False
+
+    @property
+    def skipped(self) -> bool:
+        return self.response is None
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command importing both the city and the hotel feed
+    in a single run. Both feeds are downloaded and parsed concurrently; hotels
+    are validated and written once the cities they depend on are committed.
+    """
+
+    help = "Imports city and hotel data from their CSV files in one run"
+
+    def add_arguments(self, parser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of rows written per bulk transaction.",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Import the feeds even if they did not change since the last import.",
+        )
+
+    def handle(self, *args, **kwargs) -> None:
+        """
+        Entry point for the command. Downloads both feeds at the same time,
+        imports the cities, then the hotels, and prints a timing report.
+        """
+
+        started = time.perf_counter()
+        timer = PhaseTimer()
+        # Feed states are read here, the download threads do not touch the database
+        city_state = None if kwargs["force"] else load_feed_state(CITY_FEED)
+        hotel_state = None if kwargs["force"] else load_feed_state(HOTEL_FEED)
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            city_task = pool.submit(
+                self.fetch_rows, timer, CITY_FEED, CITY_CSV_URL, city_state
+            )
+            # The hotels keep downloading and parsing while the cities are written
+            hotel_task = pool.submit(
+                self.fetch_rows, timer, HOTEL_FEED, HOTEL_CSV_URL, hotel_state
+            )
+
+            cities = city_task.result()
+            added_cities = self.import_cities(timer, cities, kwargs["batch_size"])
+            hotels = hotel_task.result()
+
+        if hotels.skipped and not hotels.error and added_cities:
+            # Hotels skipped earlier for a missing city may now be importable
+            hotels = self.fetch_rows(timer, HOTEL_FEED, HOTEL_CSV_URL, None)
+        self.import_hotels(timer, hotels, kwargs["batch_size"])
+
+        self.stdout.write("Timing report:")
+        for line in timer.lines():
+            self.stdout.write(f"  {line}")
+        self.stdout.write(
+            f"  {'total':<9} {time.perf_counter() - started:.3f}s (wall clock)"
+        )
+
+    def fetch_rows(
+        self,
+        timer: PhaseTimer,
+        feed: str,
+        url: str,
+        state: Optional[FeedState],
+    ) -> FeedRows:
+        """
+        Download and parse a feed. Runs in a worker thread without database access.
+        """
+
+        result = FeedRows(feed=feed)
+        with timer.measure("download", feed):
+            try:
+                response = requests.get(
+                    url,
+                    auth=HTTPBasicAuth(USERNAME, PASSWORD),
+                    headers=conditional_headers(state),
+                    timeout=10,
+                )
+            except requests.RequestException as e:
+                result.message = f"Error fetching {feed} data: {e}"
+                result.error = True
+                return result
+
+            if response.status_code == 304:
+                result.message = f"{feed.capitalize()} data not modified since the last import. Skipping."
+                return result
+            if response.status_code != 200:
+                result.message = f"Failed to fetch {feed} data. HTTP Status Code: {response.status_code}"
+                result.error = True
+                return result
+            text = response.text
+
+        with timer.measure("parse", feed):
+            digest = new_digest()
+            digest.update(text.encode("utf-8"))
+            if is_unchanged(state, digest.hexdigest()):
+                result.message = f"{feed.capitalize()} data unchanged since the last import. Skipping."
+                return result
+            result.rows = list(csv_rows(response_lines(response)))
+
+        result.response = response
+        result.digest = digest.hexdigest()
+        return result
+
+    def import_cities(
+        self, timer: PhaseTimer, cities: FeedRows, batch_size: int
+    ) -> int:
+        """
+        Validate and write the city rows, returning how many cities were added.
+        """
+
+        if cities.skipped:
+            self.write_skipped(cities)
+            return 0
+
+        malformed = []
+        with timer.measure("validate", CITY_FEED):
+            pairs = list(
+                parse_city_rows(cities.rows, lambda row, line: malformed.append(row))
+            )
+        with timer.measure("write", CITY_FEED):
+            added, existing = insert_missing_cities(pairs, batch_size)
+        save_feed_state(CITY_FEED, cities.response.headers, cities.digest)
+
+        self.stdout.write(
+            f"Cities: {added} added, {existing} already existing, "
+            f"{len(malformed)} malformed"
+        )
+        return added
+
+    def import_hotels(
+        self, timer: PhaseTimer, hotels: FeedRows, batch_size: int
+    ) -> None:
+        """
+        Validate the hotel rows against the committed cities and write them.
+        """
+
+        if hotels.skipped:
+            self.write_skipped(hotels)
+            return
+
+        importer = HotelBatchImporter(batch_size=batch_size)
+        with timer.measure("validate", HOTEL_FEED):
+            importer.load_cities()
+            rows = list(importer.validate(hotels.rows))
+        with timer.measure("write", HOTEL_FEED):
+            importer.write_rows(rows)
+        save_feed_state(HOTEL_FEED, hotels.response.headers, hotels.digest)
+        optimize_index()
+
+        report = importer.report
+        report.seconds = (
+            timer.seconds["validate"][HOTEL_FEED]
+            + timer.seconds["write"][HOTEL_FEED]
+        )
+        self.stdout.write(f"Hotels: {report.summary()}")
+
+    def write_skipped(self, feed: FeedRows) -> None:
+        """
+        Report why a feed was not imported.
+        """
+
+        if feed.error:
+            self.stderr.write(feed.message)
+        else:
+            self.stdout.write(feed.message)
@@ -1,69 +1,231 @@
-import csv
-from typing import Optional
+from typing import Iterator, Optional
 
-import requests
 from django.core.management.base import BaseCommand
-from requests.auth import HTTPBasicAuth
+from django.db.models import Count
 
-from hotels.models import City
-from hotels.utils import CITY_CSV_URL, PASSWORD, USERNAME
+from hotels.caching import bump_cities_version
+from hotels.importers.cities import parse_city_rows
+from hotels.importers.commands import FeedCommandMixin
+from hotels.importers.delta import (
+    ChangeSet,
+    apply_changes,
+    compute_changes,
+    take_snapshot,
+)
+from hotels.importers.engine import DEFAULT_BATCH_SIZE, batched
+from hotels.importers.fetch import (
+    forget_feed_state,
+    load_feed_state,
+    save_feed_state,
+)
+from hotels.importers.sources import csv_rows, peak_memory_mib
+from hotels.models import City, Hotel, User
+from hotels.utils import CITY_CSV_URL, CITY_FEED, HOTEL_FEED
 
 
-class Command(BaseCommand):
+class Command(FeedCommandMixin, BaseCommand):
     """
     Custom Django management command to import city data from a remote CSV file
     and populate the database with city records.
     """
 
     help = "Imports city data from a CSV file"
+    feed_label = "city"
+
+    def add_arguments(self, parser) -> None:
+        self.add_feed_arguments(parser)
+        self.add_output_arguments(parser)
+        parser.add_argument(
+            "--delta",
+            action="store_true",
+            help="Insert, update and delete cities to match the feed exactly.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the delta change set without applying it (implies --delta).",
+        )
+        parser.add_argument(
+            "--delete-cities-with-hotels",
+            action="store_true",
+            help=(
+                "Let the delta delete cities missing from the feed that still "
+                "have hotels, deleting their hotels too."
+            ),
+        )
 
     def handle(self, *args: tuple, **kwargs: dict) -> Optional[str]:
         """
         Entry point for the command. Fetches city data from a remote CSV file,
         processes it, and updates the database.
         """
+        self.verbosity = kwargs["verbosity"]
+        self.summary = kwargs["summary"]
+        if not self.open_rejects(kwargs["rejects"]):
+            return
         try:
-            # the HTTP request with authentication
-            response = requests.get(
-                CITY_CSV_URL,
-                auth=HTTPBasicAuth(USERNAME, PASSWORD),
-                timeout=10,  # Set timeout to prevent hanging
-            )
-
-            if response.status_code != 200:
-                self.stderr.write(
-                    f"Failed to fetch city data. HTTP Status Code: {response.status_code}"
-                )
-                return
+            self.import_feed(kwargs)
+        finally:
+            self.close_rejects()
 
-        except requests.RequestException as e:
+    def import_feed(self, kwargs: dict) -> None:
+        """
+        Read the feed and import it in the requested mode.
+        """
 
-            self.stderr.write(f"Error fetching city data: {e}")
+        # Outcome counts for the summary mode stats block
+        self.counts = dict.fromkeys(
+            ("added", "updated", "deleted", "unchanged", "malformed"), 0
+        )
+        state = None if kwargs["force"] else load_feed_state(CITY_FEED)
+        feed = self.open_feed(
+            CITY_CSV_URL, state, kwargs["source"], kwargs["stream"]
+        )
+        if feed is None:
             return
 
         # Process the CSV data
-        lines = response.text.strip().split("\n")
-        reader = csv.reader(lines, delimiter=";", quotechar='"')
+        reader = csv_rows(feed.lines)
+
+        if kwargs["delta"] or kwargs["dry_run"]:
+            changes = self.import_delta(
+                reader, kwargs["dry_run"], kwargs["delete_cities_with_hotels"]
+            )
+            if changes is None:
+                return
+            added = len(changes.inserts)
+        else:
+            added = self.import_rows(reader)
 
-        for row in reader:
-            # Ensure the row contains exactly two elements
-            if len(row) != 2:
-                self.stderr.write(f"Skipping malformed row: {row}")
-                continue
+        save_feed_state(CITY_FEED, feed.headers, feed.final_digest())
+        if added:
+            # Hotels skipped for a missing city may now be importable
+            forget_feed_state(HOTEL_FEED)
 
-            # Extract and clean city code and name
-            city_code: str = row[0].strip()
-            city_name: str = row[1].strip()
+        if self.summary:
+            self.write_stats(self.counts)
+        else:
+            peak = peak_memory_mib()
+            if peak is not None:
+                self.stdout.write(f"Peak memory: {peak:.1f} MiB")
+        self.stdout.write("Cities imported successfully!")
+
+    def parse_rows(self, reader) -> Iterator[tuple[str, str]]:
+        """
+        Yield the cleaned (code, name) pairs of the well-formed feed rows.
+        """
+
+        return parse_city_rows(reader, on_malformed=self.write_malformed)
 
+    def write_malformed(self, row: list, line: int) -> None:
+        """
+        Count and quarantine a malformed feed row, reporting it unless in summary mode.
+        """
+
+        self.counts["malformed"] += 1
+        self.write_reject("malformed", row, line)
+        if not self.summary:
+            self.stderr.write(f"Skipping malformed row: {row}")
+
+    def import_rows(self, reader) -> int:
+        """
+        Add the cities of the feed that do not exist yet, returning how many were added.
+        """
+
+        added = 0
+        for city_code, city_name in self.parse_rows(reader):
             city, created = City.objects.get_or_create(
                 code=city_code, defaults={"name": city_name}
             )
 
             if created:
-                self.stdout.write(f"Added city: {city_code} - {city_name}")
+                added += 1
+                self.counts["added"] += 1
+                if not self.summary:
+                    self.stdout.write(f"Added city: {city_code} - {city_name}")
             else:
-                self.stdout.write(
-                    f"City already exists: {city_code} - {city_name}"
-                )
+                self.counts["unchanged"] += 1
+                if not self.summary:
+                    self.stdout.write(
+                        f"City already exists: {city_code} - {city_name}"
+                    )
+        return added
 
-        self.stdout.write("Cities imported successfully!")
+    def import_delta(
+        self, reader, dry_run: bool, delete_cities_with_hotels: bool = False
+    ) -> Optional[ChangeSet]:
+        """
+        Apply only the inserts, updates and deletes needed to match the feed.
+        Cities that still have hotels are kept, unless
+        `delete_cities_with_hotels` is set. Returns None for a dry run, where
+        nothing is written.
+        """
+
+        snapshot = take_snapshot(City.objects.values_list("code", "name"))
+        changes = compute_changes(
+            snapshot,
+            ((code, (name,)) for code, name in self.parse_rows(reader)),
+        )
+        self.check_deletes(changes, delete_cities_with_hotels)
+
+        self.counts.update(
+            added=len(changes.inserts),
+            updated=len(changes.updates),
+            deleted=len(changes.deletes),
+            unchanged=changes.unchanged,
+        )
+        if self.verbosity >= 2 and not self.summary:
+            for code, (name,) in changes.inserts.items():
+                self.stdout.write(f"+ {code} - {name}")
+            for code, (name,) in changes.updates.items():
+                self.stdout.write(f"~ {code} - {name}")
+            for code in changes.deletes:
+                self.stdout.write(f"- {code}")
+        self.stdout.write(f"City delta: {changes.summary()}")
+
+        if dry_run:
+            self.stdout.write("Dry run: no changes were applied.")
+            return None
+
+        apply_changes(City, changes, ("name",))
+        # The bulk writes send no signals
+        bump_cities_version()
+        return changes
+
+    def check_deletes(
+        self, changes: ChangeSet, delete_cities_with_hotels: bool
+    ) -> None:
+        """
+        Report what deleting the cities of `changes` deletes in cascade, and
+        drop the cities that still have hotels from them unless allowed.
+        """
+
+        hotels = {}
+        managers = 0
+        for codes in batched(changes.deletes, DEFAULT_BATCH_SIZE):
+            hotels.update(
+                Hotel.objects.filter(city__in=codes)
+                .order_by()
+                .values("city")
+                .annotate(total=Count("id"))
+                .values_list("city", "total")
+            )
+            managers += User.objects.filter(city__in=codes).count()
+
+        if hotels and not delete_cities_with_hotels:
+            self.stderr.write(
+                f"Keeping {len(hotels)} cities missing from the feed that "
+                f"still have {sum(hotels.values())} hotels, pass "
+                "--delete-cities-with-hotels to delete them with their hotels."
+            )
+            changes.deletes = [
+                code for code in changes.deletes if code not in hotels
+            ]
+            return
+
+        if hotels or managers:
+            self.stdout.write(
+                f"Deleting {len(changes.deletes)} cities also deletes "
+                f"{sum(hotels.values())} hotels and unsets the city of "
+                f"{managers} users."
+            )
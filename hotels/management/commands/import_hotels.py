@@ -1,73 +1,367 @@
-import csv
+from functools import partial
+from itertools import islice
+from typing import Optional
 
-import requests
 from django.core.management.base import BaseCommand
-from requests.auth import HTTPBasicAuth
+from django.db import transaction
 
+from hotels.importers import (
+    ADDED,
+    DEFAULT_BATCH_SIZE,
+    MALFORMED,
+    MISSING_CITY,
+    UNCHANGED,
+    UPDATED,
+    BatchStats,
+    HotelBatchImporter,
+    ImportReport,
+)
+from hotels.importers.commands import FeedCommandMixin
+from hotels.importers.delta import (
+    ChangeSet,
+    apply_changes,
+    compute_changes,
+    take_snapshot,
+)
+from hotels.importers.fetch import (
+    checkpoint_row,
+    feed_version,
+    load_feed_state,
+    save_checkpoint,
+    save_feed_state,
+)
+from hotels.importers.parallel import import_parallel
+from hotels.importers.sources import Feed, csv_rows, peak_memory_mib
+from hotels.importers.staging import StagingReport, import_staged
+from hotels.caching import (
+    bump_catalog_version,
+    bump_hotel_counts_version,
+)
+from hotels.fulltext import optimize_index
 from hotels.models import City, Hotel
-from hotels.utils import HOTEL_CSV_URL, PASSWORD, USERNAME
+from hotels.utils import HOTEL_CSV_URL, HOTEL_FEED
 
 
-class Command(BaseCommand):
+class Command(FeedCommandMixin, BaseCommand):
     help = "Imports hotel data from a CSV file"
+    feed_label = "hotel"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Number of rows written per bulk upsert transaction.",
+        )
+        self.add_feed_arguments(parser)
+        self.add_output_arguments(parser)
+        parser.add_argument(
+            "--delta",
+            action="store_true",
+            help="Insert, update and delete hotels to match the feed exactly.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Print the delta change set without applying it (implies --delta).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes importing city partitions in parallel.",
+        )
+        parser.add_argument(
+            "--staging",
+            action="store_true",
+            help=(
+                "Load and validate the feed in a staging table, then swap it "
+                "into the hotel table in one short transaction."
+            ),
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Continue an interrupted import of the same feed from its last checkpoint.",
+        )
 
     def handle(self, *args, **kwargs):
         """
         Entry point for the custom Django command. This method fetches hotel data
         from a CSV file, validates it, and updates or creates records in the database.
         """
-        try:
-            response = requests.get(
-                HOTEL_CSV_URL,
-                auth=HTTPBasicAuth(USERNAME, PASSWORD),
-                timeout=10,
+        self.verbosity = kwargs["verbosity"]
+        if kwargs["resume"] and (
+            kwargs["workers"] > 1
+            or kwargs["delta"]
+            or kwargs["dry_run"]
+            or kwargs["staging"]
+        ):
+            self.stderr.write(
+                "--resume cannot be combined with --workers, --delta, --dry-run "
+                "or --staging."
+            )
+            return
+        if kwargs["staging"] and (
+            kwargs["workers"] > 1 or kwargs["delta"] or kwargs["dry_run"]
+        ):
+            self.stderr.write(
+                "--staging cannot be combined with --workers, --delta or --dry-run."
             )
+            return
+        if kwargs["rejects"] and kwargs["workers"] > 1:
+            self.stderr.write("--rejects cannot be combined with --workers.")
+            return
+
+        self.summary = kwargs["summary"]
+        if not self.open_rejects(kwargs["rejects"]):
+            return
+        try:
+            self.import_feed(kwargs)
+        finally:
+            self.close_rejects()
+
+    def import_feed(self, kwargs: dict) -> None:
+        """
+        Read the feed and import it in the requested mode.
+        """
 
-            if response.status_code != 200:
-                self.stderr.write(
-                    f"Failed to fetch hotel data. HTTP Status Code: {response.status_code}"
-                )
-                return
+        state = None if kwargs["force"] else load_feed_state(HOTEL_FEED)
+        feed = self.open_feed(
+            HOTEL_CSV_URL, state, kwargs["source"], kwargs["stream"]
+        )
+        if feed is None:
+            return
+        reader = csv_rows(feed.lines)
+
+        if kwargs["delta"] or kwargs["dry_run"]:
+            changes = self.import_delta(
+                reader, kwargs["dry_run"], kwargs["batch_size"]
+            )
+            if changes is not None:
+                self.finish_import(feed)
+            return
 
-        except requests.RequestException as e:
-            self.stderr.write(f"Error fetching hotel data: {e}")
+        if kwargs["staging"]:
+            self.import_staging(reader, kwargs["batch_size"])
+            self.finish_import(feed)
             return
 
-        # Parse the CSV content
-        lines = response.text.strip().split("\n")
-        reader = csv.reader(
-            lines, delimiter=";", quotechar='"'
-        )  # Parse semicolon-separated values
-
-        for row in reader:
-            if len(row) != 3:  # Ensure the row has the expected 3 fields
-                self.stderr.write(f"Skipping malformed row: {row}")
-                continue
-
-            # Extract and clean data from the row
-            city_code, hotel_code, hotel_name = map(str.strip, row)
-
-            # Retrieve the related city
-            try:
-                city = City.objects.get(code=city_code)
-            except City.DoesNotExist:
-                self.stderr.write(
-                    f"City with code {city_code} not found. Skipping hotel: {hotel_code} - {hotel_name}"
-                )
-                continue
-
-            # Create or get the hotel record
-            hotel, created = Hotel.objects.get_or_create(
-                code=hotel_code, city=city, defaults={"name": hotel_name}
+        if kwargs["workers"] > 1:
+            # Per-row output is not available from the worker processes
+            report, partitions = import_parallel(
+                reader, kwargs["workers"], kwargs["batch_size"]
+            )
+            if not self.summary:
+                for number, partition in enumerate(partitions, start=1):
+                    self.write_report(f"Partition {number}: ", partition)
+        else:
+            # Every committed batch records how far into this feed version it got
+            version = feed_version(feed.headers, feed.digest)
+            start = 0
+            if kwargs["resume"]:
+                start = checkpoint_row(load_feed_state(HOTEL_FEED), version)
+                if start:
+                    self.stdout.write(f"Resuming from row {start}.")
+                    reader = islice(reader, start, None)
+                else:
+                    self.stdout.write(
+                        "No checkpoint for this feed version. Starting from the first row."
+                    )
+
+            importer = HotelBatchImporter(
+                batch_size=kwargs["batch_size"],
+                on_row=self.write_row,
+                on_batch=self.write_batch,
+                on_reject=self.write_reject,
+                checkpoint=(
+                    partial(save_checkpoint, HOTEL_FEED, version)
+                    if version
+                    else None
+                ),
+                offset=start,
+            )
+            report = importer.run(reader)
+        self.finish_import(feed)
+
+        if self.summary:
+            self.write_stats(
+                {
+                    outcome: getattr(report, outcome)
+                    for outcome in (
+                        ADDED,
+                        UPDATED,
+                        UNCHANGED,
+                        MALFORMED,
+                        MISSING_CITY,
+                    )
+                },
+                f"{'rows':<13} {report.rows} in {report.seconds:.3f}s "
+                f"({report.rows_per_second:.0f} rows/s, {report.queries} queries "
+                f"in {len(report.batches)} batches)",
+            )
+        else:
+            self.write_report("", report)
+            peak = peak_memory_mib()
+            if peak is not None:
+                self.stdout.write(f"Peak memory: {peak:.1f} MiB")
+        self.stdout.write("Hotels imported successfully!")
+
+    def finish_import(self, feed: Feed) -> None:
+        """
+        Remember the imported feed and compact the full-text index it updated.
+        """
+
+        save_feed_state(HOTEL_FEED, feed.headers, feed.final_digest())
+        optimize_index()
+
+    def import_delta(
+        self, reader, dry_run: bool, batch_size: int
+    ) -> Optional[ChangeSet]:
+        """
+        Apply only the inserts, updates and deletes needed to match the feed.
+        Returns None for a dry run, where nothing is written.
+        """
+
+        # Hotels whose city is missing are still in the feed, so keep them
+        missing = set()
+
+        def on_row(outcome, row, city_name):
+            if outcome == MISSING_CITY:
+                missing.add(row[1].strip())
+            self.write_row(outcome, row, city_name)
+
+        importer = HotelBatchImporter(
+            batch_size=batch_size, on_row=on_row, on_reject=self.write_reject
+        )
+        importer.load_cities()
+        snapshot = take_snapshot(
+            Hotel.objects.values_list("code", "name", "city_id")
+        )
+        changes = compute_changes(
+            snapshot,
+            (
+                (row.code, (row.name, row.city_code))
+                for row in importer.validate(reader)
+            ),
+            keep=missing,
+        )
+
+        if self.verbosity >= 2 and not self.summary:
+            for code, (name, city_code) in changes.inserts.items():
+                self.stdout.write(f"+ {code} - {name} ({city_code})")
+            for code, (name, city_code) in changes.updates.items():
+                self.stdout.write(f"~ {code} - {name} ({city_code})")
+            for code in changes.deletes:
+                self.stdout.write(f"- {code}")
+        self.stdout.write(f"Hotel delta: {changes.summary()}")
+
+        if dry_run:
+            self.stdout.write("Dry run: no changes were applied.")
+            return None
+
+        with transaction.atomic():
+            # Deleted without their signals, whose cache invalidation and
+            # count updates are made up for below, for all hotels at once
+            apply_changes(
+                Hotel, changes, ("name", "city_id"), batch_size, raw_delete=True
+            )
+            # The snapshot does not tell which updates move a hotel to another
+            # city, so the hotel counts are recomputed in one statement instead
+            City.objects.recount_hotels()
+        # The bulk writes send no signals
+        bump_catalog_version()
+        bump_hotel_counts_version()
+        if self.summary:
+            self.write_stats(
+                {
+                    ADDED: len(changes.inserts),
+                    UPDATED: len(changes.updates),
+                    "deleted": len(changes.deletes),
+                    UNCHANGED: changes.unchanged,
+                    MALFORMED: importer.report.malformed,
+                    MISSING_CITY: importer.report.missing_city,
+                }
             )
+        self.stdout.write("Hotels imported successfully!")
+        return changes
 
-            if created:
-                self.stdout.write(
-                    f"Added hotel: {hotel_name} ({hotel_code}) in {city.name}"
-                )
-            else:
-                self.stdout.write(
-                    f"Hotel already exists: {hotel_name} ({hotel_code}) in {city.name}"
-                )
+    def import_staging(self, reader, batch_size: int) -> StagingReport:
+        """
+        Load the feed into the staging table and swap it into the hotel table.
+        """
 
+        report = import_staged(reader, batch_size, on_reject=self.on_staging_reject)
+        if self.summary:
+            self.write_stats(
+                {
+                    ADDED: report.added,
+                    UPDATED: report.updated,
+                    "deleted": report.deleted,
+                    UNCHANGED: report.unchanged,
+                    MALFORMED: report.malformed,
+                    MISSING_CITY: report.missing_city,
+                },
+                f"{'staged':<13} {report.staged} in {report.load_seconds:.3f}s",
+                f"{'swapped':<13} in {report.swap_seconds:.3f}s",
+            )
+        else:
+            self.stdout.write(f"Staging import: {report.summary()}")
         self.stdout.write("Hotels imported successfully!")
+        return report
+
+    def on_staging_reject(self, reason: str, row: list, line: int) -> None:
+        """
+        Quarantine and report a row rejected by a staging import.
+        """
+
+        self.write_reject(reason, row, line)
+        self.write_row(reason, row, None)
+
+    def write_row(self, outcome, row, city_name):
+        """
+        Report the outcome of a single feed row, unless in summary mode.
+        """
+
+        if self.summary:
+            return
+        if outcome == MALFORMED:
+            self.stderr.write(f"Skipping malformed row: {row}")
+            return
+
+        city_code, hotel_code, hotel_name = map(str.strip, row)
+        if outcome == MISSING_CITY:
+            self.stderr.write(
+                f"City with code {city_code} not found. Skipping hotel: {hotel_code} - {hotel_name}"
+            )
+        elif outcome == ADDED:
+            self.stdout.write(
+                f"Added hotel: {hotel_name} ({hotel_code}) in {city_name}"
+            )
+        elif outcome == UPDATED:
+            self.stdout.write(
+                f"Updated hotel: {hotel_name} ({hotel_code}) in {city_name}"
+            )
+        else:
+            self.stdout.write(
+                f"Hotel already exists: {hotel_name} ({hotel_code}) in {city_name}"
+            )
+
+    def write_report(self, prefix: str, report: ImportReport):
+        """
+        Report the totals, throughput and query count of an import.
+        """
+
+        self.stdout.write(f"{prefix}{report.summary()}")
+
+    def write_batch(self, stats: BatchStats):
+        """
+        Report the throughput and query count of a committed batch.
+        """
+
+        if self.summary:
+            return
+        self.stdout.write(
+            f"Batch {stats.number}: {stats.rows} rows in {stats.seconds:.3f}s "
+            f"({stats.rows_per_second:.0f} rows/s, {stats.queries} queries)"
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from hotels.fulltext import has_fts, rebuild_index
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command rebuilding the full-text hotel search
+    index from the hotel and city tables in bulk.
+    """
+
+    help = "Rebuilds the full-text hotel search index"
+
+    def handle(self, *args, **kwargs) -> None:
+        if not has_fts():
+            self.stdout.write(
+                "The database has no full-text index, hotels are searched with LIKE."
+            )
+            return
+        indexed = rebuild_index()
+        self.stdout.write(f"Indexed {indexed} hotels for full-text search.")
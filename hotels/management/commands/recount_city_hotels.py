@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from hotels.caching import bump_hotel_counts_version
+from hotels.models import City
+
+
+class Command(BaseCommand):
+    """
+    Custom Django management command recomputing the hotel count of every city
+    from the hotel table in one aggregate statement, repairing counts that
+    drifted, e.g. after hotels were written with raw SQL.
+    """
+
+    help = "Recomputes the number of hotels of every city"
+
+    def handle(self, *args, **kwargs) -> None:
+        recounted = City.objects.recount_hotels()
+        # The city index shows the counts
+        bump_hotel_counts_version()
+        self.stdout.write(f"Recounted the hotels of {recounted} cities.")
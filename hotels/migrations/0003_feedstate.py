@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hotels", "0002_alter_hotel_code"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeedState",
+            fields=[
+                (
+                    "name",
+                    models.CharField(
+                        max_length=50, primary_key=True, serialize=False
+                    ),
+                ),
+                ("etag", models.CharField(blank=True, max_length=255)),
+                (
+                    "last_modified",
+                    models.CharField(blank=True, max_length=64),
+                ),
+                ("digest", models.CharField(blank=True, max_length=64)),
+                ("imported_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-17 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hotels", "0003_feedstate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="feedstate",
+            name="checkpoint_row",
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="feedstate",
+            name="checkpoint_version",
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.4 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hotels", "0004_feedstate_checkpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HotelStaging",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("line", models.PositiveBigIntegerField()),
+                ("code", models.CharField(max_length=10, unique=True)),
+                ("name", models.CharField(max_length=200)),
+                ("city_code", models.CharField(max_length=10)),
+                ("missing_city", models.BooleanField(default=False)),
+            ],
+        ),
+    ]
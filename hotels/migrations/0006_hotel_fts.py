@@ -0,0 +1,79 @@
+# Generated by Django 5.1.4 on 2026-10-17 11:40
+
+from django.db import migrations
+
+# Full-text index of the hotel names and city names, kept in sync by triggers.
+# FTS5 is specific to SQLite, other databases search with LIKE instead.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE hotels_hotel_fts USING fts5(
+        name, city_name, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER hotels_hotel_fts_insert AFTER INSERT ON hotels_hotel BEGIN
+        INSERT INTO hotels_hotel_fts (rowid, name, city_name)
+        VALUES (
+            new.id,
+            new.name,
+            (SELECT name FROM hotels_city WHERE code = new.city_id)
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER hotels_hotel_fts_update
+    AFTER UPDATE OF name, city_id ON hotels_hotel BEGIN
+        UPDATE hotels_hotel_fts
+        SET
+            name = new.name,
+            city_name = (SELECT name FROM hotels_city WHERE code = new.city_id)
+        WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER hotels_hotel_fts_delete AFTER DELETE ON hotels_hotel BEGIN
+        DELETE FROM hotels_hotel_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER hotels_city_fts_update AFTER UPDATE OF name ON hotels_city BEGIN
+        UPDATE hotels_hotel_fts SET city_name = new.name
+        WHERE rowid IN (SELECT id FROM hotels_hotel WHERE city_id = new.code);
+    END
+    """,
+    """
+    INSERT INTO hotels_hotel_fts (rowid, name, city_name)
+    SELECT hotels_hotel.id, hotels_hotel.name, hotels_city.name
+    FROM hotels_hotel
+    INNER JOIN hotels_city ON hotels_city.code = hotels_hotel.city_id
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS hotels_city_fts_update",
+    "DROP TRIGGER IF EXISTS hotels_hotel_fts_delete",
+    "DROP TRIGGER IF EXISTS hotels_hotel_fts_update",
+    "DROP TRIGGER IF EXISTS hotels_hotel_fts_insert",
+    "DROP TABLE IF EXISTS hotels_hotel_fts",
+]
+
+
+def run_sql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hotels", "0005_hotelstaging"),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sql(CREATE_SQL), run_sql(DROP_SQL)),
+    ]
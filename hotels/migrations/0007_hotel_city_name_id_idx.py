@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hotels", "0006_hotel_fts"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="hotel",
+            index=models.Index(
+                fields=["city", "name", "id"], name="hotel_city_name_id_idx"
+            ),
+        ),
+    ]
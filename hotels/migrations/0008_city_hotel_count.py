@@ -0,0 +1,55 @@
+# Generated by Django 5.1.4 on 2026-10-17 15:20
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+fts = import_module("hotels.migrations.0006_hotel_fts")
+
+# SQLite adds the column by remaking the city table, which fails while the
+# full-text triggers reference it, so they are dropped and created again
+CREATE_TRIGGERS_SQL = [
+    statement
+    for statement in fts.CREATE_SQL
+    if statement.lstrip().startswith("CREATE TRIGGER")
+]
+DROP_TRIGGERS_SQL = [
+    statement for statement in fts.DROP_SQL if "DROP TRIGGER" in statement
+]
+
+
+def count_hotels(apps, schema_editor):
+    City = apps.get_model("hotels", "City")
+    Hotel = apps.get_model("hotels", "Hotel")
+    hotel_totals = (
+        Hotel.objects.filter(city=OuterRef("code"))
+        .order_by()
+        .values("city")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    City.objects.update(hotel_count=Coalesce(Subquery(hotel_totals), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hotels", "0007_hotel_city_name_id_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fts.run_sql(DROP_TRIGGERS_SQL), fts.run_sql(CREATE_TRIGGERS_SQL)
+        ),
+        migrations.AddField(
+            model_name="city",
+            name="hotel_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            fts.run_sql(CREATE_TRIGGERS_SQL), fts.run_sql(DROP_TRIGGERS_SQL)
+        ),
+        migrations.RunPython(count_hotels, migrations.RunPython.noop),
+    ]
@@ -3,9 +3,54 @@
 # Models define the structure of the database and any relationships between data entities.
 from __future__ import annotations
 
+from collections import Counter, defaultdict
+from typing import Iterable, Mapping
+
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from hotels.caching import bump_city_versions, bump_hotel_counts_version
+
+
+class CityQuerySet(models.QuerySet):
+    """
+    QuerySet for the City model, maintaining the denormalized hotel counts.
+    """
+
+    def adjust_hotel_counts(self, deltas: Mapping[str, int]) -> None:
+        """
+        Add to the hotel count of every city the delta given for its code,
+        with one atomic increment per distinct delta. Counts that drifted
+        below the number of hotels deleted stop at zero.
+        """
+
+        by_delta = defaultdict(list)
+        for code, delta in deltas.items():
+            if delta and code is not None:
+                by_delta[delta].append(code)
+        for delta, codes in by_delta.items():
+            count = F("hotel_count") + delta
+            self.filter(code__in=codes).update(
+                hotel_count=Greatest(count, 0) if delta < 0 else count
+            )
+
+    def recount_hotels(self) -> int:
+        """
+        Recompute the hotel counts of the cities from the hotel table with one
+        aggregate statement, returning the number of cities updated.
+        """
+
+        hotel_totals = (
+            Hotel.objects.filter(city=OuterRef("code"))
+            .order_by()
+            .values("city")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        return self.update(hotel_count=Coalesce(Subquery(hotel_totals), 0))
 
 
 class City(models.Model):
@@ -19,10 +64,28 @@ class City(models.Model):
     code = models.CharField(max_length=10, unique=True, primary_key=True)
     # The name of the city.
     name = models.CharField(max_length=100)
+    # The number of hotels in the city, kept up to date by the hotel writes.
+    hotel_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = CityQuerySet.as_manager()
 
     class Meta:
         verbose_name_plural = "Cities"
 
+    def save(self, *args, **kwargs) -> None:
+        """
+        Save the city without writing back its hotel count, which may be stale
+        since the hotel writes update it in the database only.
+        """
+
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "hotel_count"
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self) -> str:
         """
         String representation of the City object, returning its name.
@@ -32,6 +95,122 @@ class City(models.Model):
         return self.name
 
 
+class HotelQuerySet(models.QuerySet):
+    """
+    QuerySet for the Hotel model, adding bulk writes that check the cities of
+    all hotels with a single query.
+    """
+
+    def delete(self) -> tuple[int, dict[str, int]]:
+        """
+        Delete the hotels with one DELETE, without loading them or sending
+        their signals. The hotel counts of their cities are decreased with one
+        update per distinct delta, and the cached responses of the cities are
+        dropped once the deletion is committed.
+        """
+
+        if self._fields is not None or self.query.is_sliced:
+            # Let the default implementation refuse these
+            return super().delete()
+        with transaction.atomic(using=self.db, savepoint=False):
+            deltas = {
+                code: -total
+                for code, total in self.order_by()
+                .values_list("city")
+                .annotate(total=Count("id"))
+            }
+            deleted = self._raw_delete(self.db)
+            City.objects.using(self.db).adjust_hotel_counts(deltas)
+
+        def bump() -> None:
+            bump_city_versions(*deltas)
+            if deleted:
+                bump_hotel_counts_version()
+
+        transaction.on_commit(bump, using=self.db)
+        return deleted, {self.model._meta.label: deleted}
+
+    def check_cities(self, hotels: Iterable[Hotel]) -> None:
+        """
+        Ensure every hotel is linked to an existing city, looking up all the
+        distinct city codes in one query. Raises a ValidationError listing
+        every offending hotel with its position in `hotels`.
+        """
+
+        hotels = list(hotels)
+        codes = {hotel.city_id for hotel in hotels if hotel.city_id is not None}
+        existing = set(
+            City.objects.filter(code__in=codes).values_list("code", flat=True)
+        )
+
+        errors = [
+            ValidationError(
+                "Row %(row)s: city with code %(city)s does not exist.",
+                code="missing_city",
+                params={"row": row, "city": hotel.city_id},
+            )
+            for row, hotel in enumerate(hotels, start=1)
+            if hotel.city_id not in existing
+        ]
+        if errors:
+            raise ValidationError(errors)
+
+    def bulk_create_checked(
+        self, hotels: Iterable[Hotel], **kwargs
+    ) -> list[Hotel]:
+        """
+        Bulk create the hotels once all their cities are known to exist.
+        Accepts the keyword arguments of `bulk_create`.
+        """
+
+        hotels = list(hotels)
+        self.check_cities(hotels)
+        if kwargs.get("update_conflicts") or kwargs.get("ignore_conflicts"):
+            # Existing hotels may be skipped or moved, count their cities again
+            cities = {hotel.city_id for hotel in hotels} | set(
+                self.filter(
+                    code__in=[hotel.code for hotel in hotels]
+                ).values_list("city_id", flat=True)
+            )
+            created = self.bulk_create(hotels, **kwargs)
+            City.objects.filter(code__in=cities).recount_hotels()
+            return created
+        created = self.bulk_create(hotels, **kwargs)
+        City.objects.adjust_hotel_counts(
+            Counter(hotel.city_id for hotel in hotels)
+        )
+        return created
+
+    def bulk_update_checked(
+        self, hotels: Iterable[Hotel], fields: Iterable[str], **kwargs
+    ) -> int:
+        """
+        Bulk update the given fields of the hotels, checking their cities first
+        when the city is one of the updated fields.
+        """
+
+        hotels = list(hotels)
+        fields = list(fields)
+        if "city" not in fields and "city_id" not in fields:
+            return self.bulk_update(hotels, fields, **kwargs)
+
+        self.check_cities(hotels)
+        previous = dict(
+            self.filter(pk__in=[hotel.pk for hotel in hotels]).values_list(
+                "pk", "city_id"
+            )
+        )
+        updated = self.bulk_update(hotels, fields, **kwargs)
+        deltas = Counter()
+        for hotel in hotels:
+            if previous.get(hotel.pk, hotel.city_id) != hotel.city_id:
+                deltas[previous[hotel.pk]] -= 1
+                deltas[hotel.city_id] += 1
+            hotel.loaded_city_id = hotel.city_id
+        City.objects.adjust_hotel_counts(deltas)
+        return updated
+
+
 class Hotel(models.Model):
     """
     Represents a hotel located in a specific city.
@@ -48,19 +227,60 @@ class Hotel(models.Model):
         "City", on_delete=models.CASCADE, related_name="hotels"
     )
 
-    def save(self, *args, **kwargs) -> None:
+    objects = HotelQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Serves the keyset pagination of the hotels of a city
+            models.Index(
+                fields=["city", "name", "id"], name="hotel_city_name_id_idx"
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values) -> Hotel:
+        """
+        Remember the city a hotel was loaded with, to tell when it moves.
+        """
+
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_city_id = instance.__dict__.get("city_id")
+        return instance
+
+    def save(self, *args, check_city: bool = True, **kwargs) -> None:
         """
         Custom save method to ensure the hotel is linked to an existing city.
+        Pass `check_city=False` when the city is already known to exist.
         """
 
-        # Check if the city exists
-        if not City.objects.filter(code=self.city_id).exists():
+        if check_city and not self.has_known_city():
             raise ValidationError(
                 f"City with code {self.city_id} does not exist."
             )
+        if self.pk is not None and not hasattr(self, "loaded_city_id"):
+            # The saved row may exist with another city, whose count changes
+            self.loaded_city_id = (
+                Hotel.objects.filter(pk=self.pk)
+                .values_list("city_id", flat=True)
+                .first()
+            )
         # Call the parent save method to save the hotel object.
         super().save(*args, **kwargs)
 
+    def has_known_city(self) -> bool:
+        """
+        Tell whether the hotel is linked to an existing city. A city loaded
+        from the database and assigned to the hotel is trusted without a query.
+        """
+
+        if self.city_id is None:
+            return False
+        if Hotel.city.is_cached(self):
+            city = self.city
+            if not city._state.adding and city.pk == self.city_id:
+                return True
+        return City.objects.filter(code=self.city_id).exists()
+
     def __str__(self) -> str:
         """
         String representation of the Hotel object, returning its name.
@@ -126,3 +346,59 @@ class User(AbstractUser):
         """
 
         return self.username
+
+
+class FeedState(models.Model):
+    """
+    Remembers the HTTP validators and the content digest of the last successful
+    import of a CSV feed, so that later runs can skip feeds that did not change.
+    Also holds the checkpoint of an unfinished import, so that it can be resumed.
+    """
+
+    # The name of the feed (e.g. 'cities' or 'hotels').
+    name = models.CharField(max_length=50, primary_key=True)
+    # The ETag header returned with the last imported feed.
+    etag = models.CharField(max_length=255, blank=True)
+    # The Last-Modified header returned with the last imported feed.
+    last_modified = models.CharField(max_length=64, blank=True)
+    # The SHA-256 digest of the last imported feed content.
+    digest = models.CharField(max_length=64, blank=True)
+    # When the feed was last imported successfully.
+    imported_at = models.DateTimeField(auto_now=True)
+    # The version (content digest or strong ETag) of an interrupted import.
+    checkpoint_version = models.CharField(max_length=255, blank=True)
+    # The number of feed rows committed by the interrupted import.
+    checkpoint_row = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        """
+        String representation of the FeedState object, returning the feed name.
+        """
+
+        return self.name
+
+
+class HotelStaging(models.Model):
+    """
+    Holds the rows of a hotel feed loaded by a staging import. The rows are
+    validated here and then swapped into the Hotel table in one short
+    transaction, so readers never see a partly imported catalog.
+    """
+
+    # The number of the feed line the row was read from.
+    line = models.PositiveBigIntegerField()
+    # The unique code of the hotel.
+    code = models.CharField(max_length=10, unique=True)
+    # The name of the hotel.
+    name = models.CharField(max_length=200)
+    # The code of the hotel's city, not a foreign key as it may not exist.
+    city_code = models.CharField(max_length=10)
+    # Set by validation when no city has the row's city code.
+    missing_city = models.BooleanField(default=False)
+
+    def __str__(self) -> str:
+        """
+        String representation of the HotelStaging object, returning its code.
+        """
+
+        return self.code
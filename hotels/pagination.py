@@ -0,0 +1,123 @@
+# hotels/pagination.py
+# Keyset pagination of the hotel listings.
+# Pages are ordered by (name, id) and a page starts right after the last hotel
+# of the previous one, identified by an opaque cursor. With an index on
+# (city, name, id) every page is an index seek, however deep it is, unlike
+# OFFSET which reads and discards all the preceding rows.
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from typing import NamedTuple, Optional
+
+from django.db.models import Q, QuerySet
+
+from hotels.utils import HOTEL_PAGE_SIZE, MAX_HOTEL_PAGE_SIZE
+
+
+class KeysetPage(NamedTuple):
+    items: list
+    # The cursor of the next page, None on the last page
+    next_cursor: Optional[str]
+
+
+def encode_cursor(name: str, pk: int) -> str:
+    payload = json.dumps([name, pk], ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """
+    Return the (name, id) key encoded in a cursor.
+    Raises ValueError when the cursor was not produced by `encode_cursor`.
+    """
+
+    try:
+        name, pk = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(name, str) or not isinstance(pk, int):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return name, pk
+
+
+def page_size(value: Optional[str]) -> int:
+    """
+    Parse a requested page size, capped to MAX_HOTEL_PAGE_SIZE.
+    Raises ValueError when it is not a positive integer.
+    """
+
+    if not value:
+        return HOTEL_PAGE_SIZE
+    size = int(value)
+    if size < 1:
+        raise ValueError(f"Invalid page size: {value}")
+    return min(size, MAX_HOTEL_PAGE_SIZE)
+
+
+def paginate_by_name(
+    hotels: QuerySet,
+    cursor: Optional[str] = None,
+    size: int = HOTEL_PAGE_SIZE,
+    fields: Optional[tuple[str, ...]] = None,
+) -> KeysetPage:
+    """
+    Return the page of `hotels` following `cursor`, ordered by (name, id).
+    With `fields`, the items are tuples of those fields rather than models;
+    they must start with 'name' and 'id'. Raises ValueError for a bad cursor.
+    """
+
+    return keyset_page(
+        list(page_query(hotels, cursor, size, fields)), size, fields
+    )
+
+
+async def apaginate_by_name(
+    hotels: QuerySet,
+    cursor: Optional[str] = None,
+    size: int = HOTEL_PAGE_SIZE,
+    fields: Optional[tuple[str, ...]] = None,
+) -> KeysetPage:
+    """
+    Async version of `paginate_by_name`.
+    """
+
+    query = page_query(hotels, cursor, size, fields)
+    return keyset_page([item async for item in query], size, fields)
+
+
+def page_query(
+    hotels: QuerySet,
+    cursor: Optional[str],
+    size: int,
+    fields: Optional[tuple[str, ...]],
+) -> QuerySet:
+    hotels = hotels.order_by("name", "id")
+    if cursor:
+        name, pk = decode_cursor(cursor)
+        # The range on name seeks the index, the rest only skips equal names
+        hotels = hotels.filter(
+            Q(name__gt=name) | Q(id__gt=pk), name__gte=name
+        )
+    if fields is not None:
+        hotels = hotels.values_list(*fields)
+
+    # One extra row tells whether there is a next page
+    return hotels[: size + 1]
+
+
+def keyset_page(
+    items: list, size: int, fields: Optional[tuple[str, ...]]
+) -> KeysetPage:
+    next_cursor = None
+    if len(items) > size:
+        items = items[:size]
+        last = items[-1]
+        next_cursor = (
+            encode_cursor(last[0], last[1])
+            if fields is not None
+            else encode_cursor(last.name, last.id)
+        )
+    return KeysetPage(items, next_cursor)
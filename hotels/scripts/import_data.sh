@@ -1,11 +1,17 @@
 #!/bin/bash
 
-# Make sure to change the path to your actual .venv directory
-source /Users/lyolia/PycharmProjects/HotelsManager/.venv/bin/activate
+# Resolve the project location from the location of this script
+PROJECT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/../.." && pwd)"
 
-# Ensure the path is correct for your project location
-cd /Users/lyolia/PycharmProjects/HotelsManager/
+# Activate the project's .venv directory, if there is one
+if [ -f "$PROJECT_DIR/.venv/bin/activate" ]; then
+    source "$PROJECT_DIR/.venv/bin/activate"
+fi
 
-# Run the import commands
-python manage.py import_cities
-python manage.py import_hotels
+cd "$PROJECT_DIR"
+
+# Download and import the city and hotel feeds in a single run
+python manage.py import_all
+
+# Delete the expired sessions, so the session table does not grow unbounded
+python manage.py clear_expired_sessions
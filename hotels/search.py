@@ -0,0 +1,375 @@
+# hotels/search.py
+# In-process search indexes used by the views.
+# The city name index keeps the casefolded city names in a sorted array, so a
+# prefix lookup is a binary search instead of a case-insensitive LIKE scan. For
+# typo tolerant lookups it adds a trigram inverted index over the same names,
+# whose candidates are reranked by a bounded edit distance. The index is built
+# lazily on first use and rebuilt once the cities version, which the City
+# save/delete signals and the city importers bump in the shared cache, changes,
+# so changes made by another process (e.g. a cron import) are picked up too.
+# The hotel counts shown along with the names change more often, so once the
+# hotel counts version changes only the counts of the matches returned are
+# reloaded, with one small query, instead of rebuilding the index.
+# The async searches check the version with the async cache API, and only
+# leave the event loop to rebuild the index.
+
+from __future__ import annotations
+
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Awaitable, Callable, Hashable, Iterable, Optional
+
+from asgiref.sync import sync_to_async
+
+from hotels.caching import (
+    acities_version,
+    ahotel_counts_version,
+    cities_version,
+    hotel_counts_version,
+)
+from hotels.models import City
+from hotels.utils import (
+    AUTOCOMPLETE_LIMIT,
+    FUZZY_CANDIDATES,
+    FUZZY_COMMON_SHARE,
+    FUZZY_MAX_DISTANCE,
+)
+
+# An indexed (code, name, ...) entry
+Entry = tuple
+
+
+def trigrams(key: str) -> set[str]:
+    """
+    Return the trigrams of a casefolded name, padded at the start so that the
+    first letters weigh more. The end is not padded, since queries are prefixes.
+    """
+
+    padded = f"  {key}"
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+def prefix_distance(
+    query: str, key: str, bound: int = FUZZY_MAX_DISTANCE
+) -> Optional[int]:
+    """
+    Return the edit distance between `query` and the closest prefix of `key`,
+    or None as soon as it is known to exceed `bound`.
+    """
+
+    # Longer prefixes of `key` are more than `bound` edits away, and so are
+    # the cells of the distance matrix more than `bound` off its diagonal
+    key = key[: len(query) + bound]
+    width = len(key) + 1
+    outside = bound + 1
+    # Distances from the empty query to every prefix of `key`
+    previous = [column if column <= bound else outside for column in range(width)]
+    for row, char in enumerate(query, start=1):
+        current = [row if row <= bound else outside] + [outside] * (width - 1)
+        for column in range(max(1, row - bound), min(width, row + bound + 1)):
+            current[column] = min(
+                previous[column] + 1,
+                current[column - 1] + 1,
+                previous[column - 1] + (char != key[column - 1]),
+            )
+        if min(current) > bound:
+            return None
+        previous = current
+    distance = min(previous)
+    return distance if distance <= bound else None
+
+
+class NameIndex:
+    """
+    Sorted array of (code, name, ...) entries, keyed on their casefolded
+    name, answering prefix queries with bisect, and fuzzy queries with a
+    trigram inverted index.
+    Prefix matches are ranked by casefolded name, then code.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], Iterable[Entry]],
+        version: Optional[Callable[[], Hashable]] = None,
+        aversion: Optional[Callable[[], Awaitable[Hashable]]] = None,
+        load_values: Optional[Callable[[list[str]], Iterable[tuple]]] = None,
+        values_version: Optional[Callable[[], Hashable]] = None,
+        avalues_version: Optional[Callable[[], Awaitable[Hashable]]] = None,
+    ) -> None:
+        # `load` returns the (code, name, ...) entries to index, whose extra
+        # values are returned along with matches, `version` the current
+        # version of the indexed data and `aversion` its async counterpart
+        self.load = load
+        self.version = version or (lambda: None)
+        self.aversion = aversion or sync_to_async(self.version)
+        # `load_values` returns the (code, ...) extra values of the given
+        # codes, which change under `values_version` without changing the
+        # names, so only the matches returned are reloaded, not the index
+        self.load_values = load_values
+        self.values_version = values_version or (lambda: None)
+        self.avalues_version = avalues_version or sync_to_async(
+            self.values_version
+        )
+        # The sorted keys and their entries, swapped as one tuple
+        self.data: tuple[list[str], list[Entry]] = ([], [])
+        # The position of every code in `data`, to patch its values
+        self.positions: dict[str, int] = {}
+        # The values version of the entries patched since the build
+        self.values_versions: dict[str, Hashable] = {}
+        # The trigram posting lists of `data`, built on the first fuzzy search
+        self.postings: Optional[tuple] = None
+        self.built = False
+        self.built_version: Hashable = None
+        self.built_values_version: Hashable = None
+        self.lock = threading.Lock()
+
+    def invalidate(self) -> None:
+        """
+        Drop the index, it is rebuilt on the next search.
+        """
+
+        self.built = False
+
+    def build(self) -> None:
+        """
+        Load and sort the entries, replacing the current index at once.
+        """
+
+        # Read before loading, so changes made meanwhile cause another build
+        version = self.version()
+        values_version = self.values_version()
+        # Entries with the same name are ranked by code, their first value
+        rows = sorted((entry[1].casefold(), entry) for entry in self.load())
+        entries = [tuple(entry) for _, entry in rows]
+        self.positions = {
+            entry[0]: position for position, entry in enumerate(entries)
+        }
+        self.values_versions = {}
+        self.data = ([key for key, _ in rows], entries)
+        self.postings = None
+        self.built_version = version
+        self.built_values_version = values_version
+        self.built = True
+
+    def is_stale(self) -> bool:
+        return not self.built or self.version() != self.built_version
+
+    def ensure_built(self) -> None:
+        if self.is_stale():
+            with self.lock:
+                # Another thread may have rebuilt it while we waited
+                if self.is_stale():
+                    self.build()
+
+    async def aensure_built(self) -> None:
+        if not self.built or await self.aversion() != self.built_version:
+            # Loading the entries is a blocking database query
+            await sync_to_async(self.ensure_built)()
+
+    def stale_codes(self, matches: list[Entry], values_version) -> list[str]:
+        """
+        Return the codes of the matches whose values predate `values_version`.
+        """
+
+        if self.load_values is None:
+            return []
+        return [
+            entry[0]
+            for entry in matches
+            if self.values_versions.get(entry[0], self.built_values_version)
+            != values_version
+        ]
+
+    def patch_values(
+        self, matches: list[Entry], codes: list[str], values_version
+    ) -> list[Entry]:
+        """
+        Reload the values of the given codes, patch them into the index and
+        return the matches with their current values.
+        """
+
+        values = {code: tuple(rest) for code, *rest in self.load_values(codes)}
+        with self.lock:
+            entries = self.data[1]
+            for code, rest in values.items():
+                position = self.positions.get(code)
+                if position is not None:
+                    entries[position] = (*entries[position][:2], *rest)
+                    self.values_versions[code] = values_version
+        return [
+            (*entry[:2], *values[entry[0]]) if entry[0] in values else entry
+            for entry in matches
+        ]
+
+    def current_values(self, matches: list[Entry]) -> list[Entry]:
+        """
+        Return the matches with their values reloaded if they changed since
+        they were loaded.
+        """
+
+        if self.load_values is None or not matches:
+            return matches
+        # Read before loading, so changes made meanwhile cause another load
+        values_version = self.values_version()
+        codes = self.stale_codes(matches, values_version)
+        if not codes:
+            return matches
+        return self.patch_values(matches, codes, values_version)
+
+    async def acurrent_values(self, matches: list[Entry]) -> list[Entry]:
+        if self.load_values is None or not matches:
+            return matches
+        values_version = await self.avalues_version()
+        codes = self.stale_codes(matches, values_version)
+        if not codes:
+            return matches
+        return await sync_to_async(self.patch_values)(
+            matches, codes, values_version
+        )
+
+    def search(
+        self, prefix: str, limit: int = AUTOCOMPLETE_LIMIT
+    ) -> list[Entry]:
+        """
+        Return up to `limit` entries whose name starts with `prefix`,
+        ignoring case.
+        """
+
+        if not prefix:
+            return []
+        self.ensure_built()
+        return self.current_values(self.prefix_matches(prefix, limit))
+
+    async def asearch(
+        self, prefix: str, limit: int = AUTOCOMPLETE_LIMIT
+    ) -> list[Entry]:
+        if not prefix:
+            return []
+        await self.aensure_built()
+        return await self.acurrent_values(self.prefix_matches(prefix, limit))
+
+    def prefix_matches(self, prefix: str, limit: int) -> list[Entry]:
+        """
+        Search the index as currently built, see `search`.
+        """
+
+        keys, entries = self.data
+        key = prefix.casefold()
+        start = bisect_left(keys, key)
+        matches = []
+        for index in range(start, min(start + limit, len(keys))):
+            if not keys[index].startswith(key):
+                break
+            matches.append(entries[index])
+        return matches
+
+    def trigram_postings(
+        self,
+    ) -> tuple[list[str], list[Entry], dict[str, array]]:
+        """
+        Return the keys and entries of the index along with, for every
+        trigram, the positions of the keys containing it. The posting lists
+        are built on first use after every rebuild of the index, which is not
+        refreshed here.
+        """
+
+        postings = self.postings
+        if postings is None or postings[0] is not self.data[0]:
+            with self.lock:
+                keys, entries = self.data
+                grams = defaultdict(lambda: array("L"))
+                for position, key in enumerate(keys):
+                    for gram in trigrams(key):
+                        grams[gram].append(position)
+                postings = self.postings = (keys, entries, dict(grams))
+        return postings
+
+    def fuzzy_search(
+        self,
+        query: str,
+        limit: int = AUTOCOMPLETE_LIMIT,
+        max_distance: int = FUZZY_MAX_DISTANCE,
+    ) -> list[Entry]:
+        """
+        Return up to `limit` entries whose name starts with `query`
+        give or take `max_distance` typos, ranked by edit distance, then by
+        shared trigrams, then like prefix matches.
+        """
+
+        self.ensure_built()
+        return self.current_values(
+            self.fuzzy_matches(query, limit, max_distance)
+        )
+
+    async def afuzzy_search(
+        self,
+        query: str,
+        limit: int = AUTOCOMPLETE_LIMIT,
+        max_distance: int = FUZZY_MAX_DISTANCE,
+    ) -> list[Entry]:
+        await self.aensure_built()
+        return await self.acurrent_values(
+            self.fuzzy_matches(query, limit, max_distance)
+        )
+
+    def fuzzy_matches(
+        self, query: str, limit: int, max_distance: int
+    ) -> list[Entry]:
+        """
+        Search the index as currently built, see `fuzzy_search`.
+        """
+
+        key = query.casefold()
+        # Short queries tolerate fewer typos: one every three letters
+        max_distance = min(max_distance, len(key) // 3)
+        exact = self.prefix_matches(key, limit) if key else []
+        if len(exact) == limit or not max_distance:
+            # Exact prefix matches share every trigram and rank first
+            return exact
+        keys, entries, grams = self.trigram_postings()
+
+        # Trigrams found in a large share of the names carry little signal
+        # and are expensive to count, so only the rarest ones are counted
+        lists = sorted(
+            (grams[gram] for gram in trigrams(key) if gram in grams), key=len
+        )
+        # Short posting lists are cheap to count however common they are
+        common = max(len(keys) * FUZZY_COMMON_SHARE, 1000)
+        counted = [positions for positions in lists if len(positions) <= common]
+        counted = counted or lists[:1]
+        # A typo changes at most 3 trigrams of the query
+        required = max(1, len(counted) - 3 * max_distance)
+        overlaps = Counter()
+        for positions in counted:
+            overlaps.update(positions)
+
+        candidates = heapq.nlargest(
+            FUZZY_CANDIDATES, overlaps.items(), key=itemgetter(1)
+        )
+        ranked = []
+        for position, overlap in candidates:
+            if overlap < required:
+                break
+            distance = prefix_distance(key, keys[position], max_distance)
+            if distance is not None:
+                ranked.append((distance, -overlap, position))
+        ranked.sort()
+        return [entries[position] for _, _, position in ranked[:limit]]
+
+
+# The index of the city names used by the autocomplete view, along with the
+# hotel counts shown in the suggestions, which are reloaded on their own.
+city_index = NameIndex(
+    lambda: City.objects.values_list("code", "name", "hotel_count").iterator(),
+    version=cities_version,
+    aversion=acities_version,
+    load_values=lambda codes: City.objects.filter(
+        code__in=codes
+    ).values_list("code", "hotel_count"),
+    values_version=hotel_counts_version,
+    avalues_version=ahotel_counts_version,
+)
@@ -0,0 +1,131 @@
+# hotels/serialization.py
+# JSON encoding of the responses of the hotels app.
+# Views read plain tuples with values_list instead of model instances, and the
+# rows are encoded here as arrays of objects without building a dict per row:
+# every string is escaped by the C accelerated encoder of the json module and
+# spliced into a per-field template. When orjson is installed it is used
+# instead, and any other encoder returning bytes can be plugged in with
+# set_encoder().
+
+from __future__ import annotations
+
+import json
+from json.encoder import encode_basestring
+from typing import Any, Callable, Iterable, Optional, Sequence
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+
+Encoder = Callable[[Any], bytes]
+
+
+def stdlib_dumps(data: Any) -> bytes:
+    """
+    Encode `data` with the json module, compactly and as UTF-8.
+    """
+
+    return json.dumps(
+        data, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+try:
+    import orjson
+except ImportError:  # Optional, the json module is used instead
+    orjson = None
+
+default_encoder: Encoder = orjson.dumps if orjson is not None else stdlib_dumps
+_encoder: Encoder = default_encoder
+
+
+def get_encoder() -> Encoder:
+    return _encoder
+
+
+def set_encoder(encoder: Optional[Encoder]) -> Encoder:
+    """
+    Encode the responses with `encoder`, or with the default encoder when
+    None, returning the previous one.
+    """
+
+    global _encoder
+    previous = _encoder
+    _encoder = encoder or default_encoder
+    return previous
+
+
+def dumps(data: Any) -> bytes:
+    """
+    Encode `data` as JSON with the current encoder.
+    """
+
+    return _encoder(data)
+
+
+def encode_value(value: Any) -> str:
+    # Strings take the faster encode_basestring path in encode_items
+    return stdlib_dumps(value).decode("utf-8")
+
+
+def encode_items(rows: Iterable[Sequence], fields: Sequence[str]) -> bytes:
+    """
+    Encode value tuples as the comma-separated JSON objects mapping `fields`
+    to the values, without the enclosing brackets.
+    """
+
+    if _encoder is not stdlib_dumps:
+        return _encoder([dict(zip(fields, row)) for row in rows])[1:-1]
+
+    # '{"name":' and ',"code":' around the values, then '}'
+    prefixes = [
+        ("{" if index == 0 else ",") + encode_basestring(field) + ":"
+        for index, field in enumerate(fields)
+    ]
+    parts = []
+    append = parts.append
+    for row in rows:
+        for prefix, value in zip(prefixes, row):
+            append(prefix)
+            append(
+                encode_basestring(value)
+                if type(value) is str
+                else encode_value(value)
+            )
+        append("},")
+    if parts:
+        parts[-1] = "}"
+    return "".join(parts).encode("utf-8")
+
+
+def encode_rows(rows: Iterable[Sequence], fields: Sequence[str]) -> bytes:
+    """
+    Encode value tuples as a JSON array of objects mapping `fields` to the
+    values.
+    """
+
+    return b"[" + encode_items(rows, fields) + b"]"
+
+
+def encode_object(members: dict[str, bytes]) -> bytes:
+    """
+    Encode a JSON object from already encoded member values.
+    """
+
+    return (
+        b"{"
+        + b",".join(
+            encode_basestring(name).encode("utf-8") + b":" + value
+            for name, value in members.items()
+        )
+        + b"}"
+    )
+
+
+def json_response(body: Any, status: int = 200) -> HttpResponse:
+    """
+    Return a JSON response, encoding `body` unless it is already bytes.
+    """
+
+    if not isinstance(body, bytes):
+        body = dumps(body)
+    return HttpResponse(body, content_type="application/json", status=status)
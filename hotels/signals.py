@@ -0,0 +1,119 @@
+# hotels/signals.py
+# Signal receivers bumping the versions of the cached data derived from the
+# database, so the in-process indexes and caches are rebuilt.
+# The versions are bumped once the change is committed: bumped earlier, a
+# concurrent request could read the rows as they were before the change and
+# cache them under the new version, where they would stay until the next one.
+
+from collections import Counter
+
+from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from hotels.auth import remember_identity
+from hotels.caching import (
+    bump_cities_version,
+    bump_city_versions,
+    bump_hotel_counts_version,
+    bump_user_version,
+)
+from hotels.models import City, Hotel, User
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def invalidate_city(sender, instance: City, **kwargs) -> None:
+    """
+    Drop the city index and the cached hotel list of a saved or deleted city.
+    """
+
+    code = instance.code
+
+    def bump() -> None:
+        bump_cities_version()
+        bump_city_versions(code)
+
+    transaction.on_commit(bump)
+
+
+@receiver(post_save, sender=Hotel)
+@receiver(post_delete, sender=Hotel)
+def invalidate_hotel_cities(sender, instance: Hotel, **kwargs) -> None:
+    """
+    Drop the cached hotel lists of the city of a changed hotel, and of the
+    city it was moved from, and update the hotel counts of those cities.
+    Queryset deletes send no signals, HotelQuerySet.delete does both at once.
+    """
+
+    if deleted_with_city(kwargs.get("origin")):
+        # invalidate_city drops the cached lists of the deleted city once
+        return
+    loaded_city_id = getattr(instance, "loaded_city_id", None)
+    codes = {instance.city_id, loaded_city_id} - {None}
+    transaction.on_commit(lambda: bump_city_versions(*codes))
+    deltas = hotel_count_deltas(instance, **kwargs)
+    # Renames leave the counts, and so the city index, unchanged
+    if any(deltas.values()):
+        City.objects.adjust_hotel_counts(deltas)
+        transaction.on_commit(bump_hotel_counts_version)
+    if writes_city(kwargs.get("update_fields")):
+        instance.loaded_city_id = instance.city_id
+
+
+def deleted_with_city(origin) -> bool:
+    # The origin of a deletion is the instance or queryset deleted
+    if isinstance(origin, QuerySet):
+        return origin.model is City
+    return isinstance(origin, City)
+
+
+def writes_city(update_fields) -> bool:
+    # A save limited to other fields leaves the city of the row unchanged
+    if update_fields is None:
+        return True
+    return bool({"city", "city_id"} & set(update_fields))
+
+
+def hotel_count_deltas(
+    instance: Hotel, created=None, update_fields=None, **kwargs
+) -> Counter:
+    """
+    Return the changes in the hotel counts of the cities caused by saving
+    (when `created` is given) or deleting a hotel.
+    """
+
+    loaded_city_id = getattr(instance, "loaded_city_id", None)
+    deltas = Counter()
+    if created is None:
+        # Deleted from the city it was last saved in
+        deltas[loaded_city_id or instance.city_id] -= 1
+    elif created:
+        deltas[instance.city_id] += 1
+    elif writes_city(update_fields):
+        if loaded_city_id is not None and loaded_city_id != instance.city_id:
+            deltas[loaded_city_id] -= 1
+            deltas[instance.city_id] += 1
+    return deltas
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user(sender, instance: User, update_fields=None, **kwargs) -> None:
+    """
+    Drop the identity remembered by the sessions of a changed user.
+    """
+
+    # Logging in only records the time of the login
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    user_id = instance.pk
+    transaction.on_commit(lambda: bump_user_version(user_id))
+
+
+@receiver(user_logged_in)
+def remember_logged_in_identity(sender, request, user: User, **kwargs) -> None:
+    if request is not None:
+        remember_identity(request, user)
@@ -0,0 +1,14 @@
+# hotels/tests/__init__.py
+# Caches used by the tests instead of the file caches shared by the processes
+# of the host, so that test runs neither read nor write them.
+
+TEST_CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "hotelsmanager-tests",
+    },
+    "sessions": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "hotelsmanager-tests-sessions",
+    },
+}
@@ -1,14 +1,28 @@
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import tempfile
 from io import StringIO
 from unittest.mock import patch, Mock
 
 import requests
 from django.core.management import call_command
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from requests import RequestException
 
-from hotels.models import City, Hotel
+from hotels.importers import HotelBatchImporter
+from hotels.importers.delta import ChangeSet, apply_changes
+from hotels.importers.parallel import partition_rows
+from hotels.importers.staging import stage_rows, swap_staging, validate_staging
+from hotels.models import City, FeedState, Hotel, HotelStaging, User
+from hotels.tests import TEST_CACHES
+from hotels.utils import CITY_CSV_URL, HOTEL_CSV_URL
 
 
+@override_settings(CACHES=TEST_CACHES)
 class ImportCommandTests(TestCase):
     def setUp(self):
         # Setup mock data for testing
@@ -20,7 +34,7 @@ class ImportCommandTests(TestCase):
         City.objects.all().delete()
         Hotel.objects.all().delete()
 
-    def create_mock_response(self, text, status_code=200):
+    def create_mock_response(self, text, status_code=200, headers=None):
         """
         Helper function to create a mock response object.
         """
@@ -28,9 +42,19 @@ class ImportCommandTests(TestCase):
             spec=requests.Response)  # Create a mock response object with the same spec as requests.Response
         mock_response.status_code = status_code
         mock_response.text = text
+        mock_response.headers = headers or {}
         mock_response.raise_for_status = Mock()  # Ensure raise_for_status is mockable without side effects
         return mock_response
 
+    def create_streaming_response(self, chunks, status_code=200):
+        """
+        Helper function to create a mock response streaming the given byte chunks.
+        """
+        mock_response = self.create_mock_response("", status_code=status_code)
+        mock_response.encoding = "utf-8"
+        mock_response.iter_content = Mock(return_value=iter(chunks))
+        return mock_response
+
     @patch("requests.get")
     def test_import_cities_success(self, mock_get):
         """
@@ -222,3 +246,621 @@ class ImportCommandTests(TestCase):
         # Ensure no hotels were imported
         self.assertIn("Error fetching hotel data: Connection error", err.getvalue())
 
+
+    @patch("requests.get")
+    def test_import_hotels_in_batches(self, mock_get):
+        """
+        Test that hotels are written in batches of the configured size.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        csv_data = "\n".join(f"CCA;CCA{i:02};Hotel{i:02}" for i in range(5))
+        mock_get.return_value = self.create_mock_response(csv_data)
+
+        out = StringIO()
+        call_command("import_hotels", "--batch-size", "2", stdout=out)
+
+        self.assertEqual(Hotel.objects.count(), 5)
+        self.assertIn("Batch 1: 2 rows", out.getvalue())
+        self.assertIn("Batch 3: 1 rows", out.getvalue())
+        self.assertNotIn("Batch 4", out.getvalue())
+
+    @patch("requests.get")
+    def test_import_hotels_updates_existing(self, mock_get):
+        """
+        Test that the upsert updates renamed hotels and leaves unchanged ones alone.
+        """
+        city = City.objects.create(code="CCA", name="CityA")
+        Hotel.objects.create(code="CCA01", name="Old name", city=city)
+        Hotel.objects.create(code="CCA02", name="Hotel02", city=city)
+        mock_get.return_value = self.create_mock_response(self.hotel_data)
+
+        out = StringIO()
+        call_command("import_hotels", stdout=out)
+
+        self.assertEqual(Hotel.objects.get(code="CCA01").name, "Hotel01")
+        self.assertIn("Updated hotel: Hotel01 (CCA01) in CityA", out.getvalue())
+        self.assertIn("Hotel already exists: Hotel02 (CCA02) in CityA", out.getvalue())
+        self.assertIn("1 updated, 1 unchanged", out.getvalue())
+
+    def test_import_hotels_query_count_independent_of_rows(self):
+        """
+        Test that a batch costs a constant number of queries regardless of its size.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        small = HotelBatchImporter().run(
+            [["CCA", f"S{i:03}", f"Hotel{i:03}"] for i in range(10)]
+        )
+        large = HotelBatchImporter().run(
+            [["CCA", f"L{i:03}", f"Hotel{i:03}"] for i in range(200)]
+        )
+
+        self.assertEqual(Hotel.objects.count(), 210)
+        self.assertEqual(len(large.batches), 1)
+        self.assertEqual(large.batches[0].queries, small.batches[0].queries)
+
+    @patch("requests.get")
+    def test_import_cities_streaming(self, mock_get):
+        """
+        Test that cities are imported from a body streamed in arbitrary chunks.
+        """
+        # Chunks split rows and a multi-byte character at arbitrary points
+        data = "CCA;CityA\nCCB;Düsseldorf\n".encode()
+        split = data.index("ü".encode()) + 1
+        mock_get.return_value = self.create_streaming_response(
+            [data[:5], data[5:split], data[split:]]
+        )
+
+        out = StringIO()
+        call_command("import_cities", "--stream", stdout=out)
+
+        self.assertTrue(mock_get.call_args.kwargs["stream"])
+        self.assertEqual(City.objects.count(), 2)
+        self.assertTrue(City.objects.filter(code="CCB", name="Düsseldorf").exists())
+        self.assertIn("Peak memory", out.getvalue())
+
+    @patch("requests.get")
+    def test_import_hotels_streaming(self, mock_get):
+        """
+        Test that hotels are imported from a streamed body without a trailing newline.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        mock_get.return_value = self.create_streaming_response(
+            [b"CCA;CCA01;Hot", b"el01\nCCA;CCA02;Hotel02"]
+        )
+
+        out = StringIO()
+        call_command("import_hotels", "--stream", stdout=out)
+
+        self.assertEqual(Hotel.objects.count(), 2)
+        self.assertIn("Added hotel: Hotel01 (CCA01) in CityA", out.getvalue())
+        self.assertIn("Added hotel: Hotel02 (CCA02) in CityA", out.getvalue())
+        mock_get.return_value.close.assert_called_once()
+
+    @patch("requests.get")
+    def test_import_sends_stored_validators(self, mock_get):
+        """
+        Test that the validators of the last import are sent and a 304 skips the import.
+        """
+        mock_get.return_value = self.create_mock_response(
+            self.city_data,
+            headers={"ETag": '"v1"', "Last-Modified": "Mon, 05 Oct 2026 02:00:00 GMT"},
+        )
+        call_command("import_cities", stdout=StringIO())
+        self.assertEqual(FeedState.objects.get(name="cities").etag, '"v1"')
+
+        mock_get.return_value = self.create_mock_response("", status_code=304)
+        out = StringIO()
+        with patch.object(City.objects, "get_or_create") as get_or_create:
+            call_command("import_cities", stdout=out)
+
+        get_or_create.assert_not_called()
+        self.assertEqual(
+            mock_get.call_args.kwargs["headers"],
+            {
+                "If-None-Match": '"v1"',
+                "If-Modified-Since": "Mon, 05 Oct 2026 02:00:00 GMT",
+            },
+        )
+        self.assertIn("not modified since the last import", out.getvalue())
+
+    @patch("requests.get")
+    def test_import_skips_unchanged_content(self, mock_get):
+        """
+        Test that a feed whose digest matches the last import is not processed again.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        mock_get.return_value = self.create_mock_response(self.hotel_data)
+        call_command("import_hotels", stdout=StringIO())
+        Hotel.objects.all().delete()
+
+        out = StringIO()
+        call_command("import_hotels", stdout=out)
+        self.assertEqual(Hotel.objects.count(), 0)
+        self.assertIn("Hotel data unchanged since the last import", out.getvalue())
+
+        # --force ignores the remembered state
+        call_command("import_hotels", "--force", stdout=StringIO())
+        self.assertEqual(mock_get.call_args.kwargs["headers"], {})
+        self.assertEqual(Hotel.objects.count(), 2)
+
+    @patch("requests.get")
+    def test_import_cities_resets_hotel_feed_state(self, mock_get):
+        """
+        Test that new cities make the next hotel import run even if its feed is unchanged.
+        """
+        FeedState.objects.create(name="hotels", digest="abc")
+        mock_get.return_value = self.create_mock_response(self.city_data)
+
+        call_command("import_cities", stdout=StringIO())
+
+        self.assertFalse(FeedState.objects.filter(name="hotels").exists())
+
+    @patch("requests.get")
+    def test_import_cities_delta(self, mock_get):
+        """
+        Test that delta mode inserts, updates and deletes cities to match the feed.
+        """
+        City.objects.create(code="CCA", name="Old CityA")
+        City.objects.create(code="CCC", name="CityC")
+        mock_get.return_value = self.create_mock_response(self.city_data)
+
+        out = StringIO()
+        call_command("import_cities", "--delta", stdout=out)
+
+        self.assertEqual(
+            list(City.objects.order_by("code").values_list("code", "name")),
+            [("CCA", "CityA"), ("CCB", "CityB")],
+        )
+        self.assertIn(
+            "City delta: 1 to insert, 1 to update, 1 to delete, 0 unchanged",
+            out.getvalue(),
+        )
+
+    def test_import_cities_delta_keeps_cities_with_hotels(self):
+        """
+        Test that delta mode keeps cities with hotels unless told otherwise,
+        and reports what deleting them deletes in cascade.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        City.objects.create(code="CCC", name="CityC")
+        City.objects.create(code="CCD", name="CityD")
+        Hotel.objects.create(code="CCC01", name="Hotel", city_id="CCC")
+        User.objects.create_user(
+            username="manager", email="manager@example.com", password="manager123", city_id="CCC"
+        )
+        feed = self.write_feed(self.city_data)
+
+        out, err = StringIO(), StringIO()
+        call_command("import_cities", "--source", feed, "--dry-run", stdout=out, stderr=err)
+        self.assertIn("Keeping 1 cities missing from the feed that still have 1 hotels", err.getvalue())
+        self.assertIn("1 to insert, 0 to update, 1 to delete", out.getvalue())
+
+        call_command("import_cities", "--source", feed, "--delta", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(
+            list(City.objects.order_by("code").values_list("code", flat=True)),
+            ["CCA", "CCB", "CCC"],
+        )
+
+        out = StringIO()
+        call_command(
+            "import_cities", "--source", feed, "--delta", "--force",
+            "--delete-cities-with-hotels", stdout=out,
+        )
+        self.assertIn(
+            "Deleting 1 cities also deletes 1 hotels and unsets the city of 1 users.",
+            out.getvalue(),
+        )
+        self.assertFalse(Hotel.objects.exists())
+        self.assertIsNone(User.objects.get(username="manager").city_id)
+
+    @patch("requests.get")
+    def test_import_hotels_delta_dry_run(self, mock_get):
+        """
+        Test that a dry run prints the change set without writing anything.
+        """
+        city = City.objects.create(code="CCA", name="CityA")
+        Hotel.objects.create(code="CCA01", name="Hotel01", city=city)
+        Hotel.objects.create(code="CCA09", name="Gone", city=city)
+        mock_get.return_value = self.create_mock_response(self.hotel_data)
+
+        out = StringIO()
+        call_command("import_hotels", "--dry-run", "--verbosity", "2", stdout=out)
+
+        self.assertEqual(Hotel.objects.count(), 2)
+        self.assertFalse(FeedState.objects.filter(name="hotels").exists())
+        self.assertIn("+ CCA02 - Hotel02 (CCA)", out.getvalue())
+        self.assertIn("- CCA09", out.getvalue())
+        self.assertIn(
+            "Hotel delta: 1 to insert, 0 to update, 1 to delete, 1 unchanged",
+            out.getvalue(),
+        )
+
+    @patch("requests.get")
+    def test_import_hotels_delta_keeps_rejected_and_empty_feeds(self, mock_get):
+        """
+        Test that delta mode never deletes hotels still listed in the feed or on an empty feed.
+        """
+        city = City.objects.create(code="CCA", name="CityA")
+        Hotel.objects.create(code="CCA01", name="Hotel01", city=city)
+        Hotel.objects.create(code="XXX01", name="Orphan", city=city)
+        mock_get.return_value = self.create_mock_response(
+            "CCA;CCA01;Hotel01\nXXX;XXX01;Orphan"
+        )
+        call_command("import_hotels", "--delta", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Hotel.objects.count(), 2)
+
+        mock_get.return_value = self.create_mock_response("")
+        call_command(
+            "import_hotels", "--delta", stdout=StringIO(), stderr=StringIO()
+        )
+        self.assertEqual(Hotel.objects.count(), 2)
+
+    def test_partition_rows_keeps_cities_together(self):
+        """
+        Test that partitioning groups every city into one balanced partition.
+        """
+        rows = (
+            [["CCA", f"A{i}", "Hotel"] for i in range(4)]
+            + [["CCB", f"B{i}", "Hotel"] for i in range(2)]
+            + [["CCC", f"C{i}", "Hotel"] for i in range(2)]
+        )
+
+        partitions = partition_rows(rows, 2)
+
+        self.assertEqual(
+            sorted(sorted({row[0] for row in partition}) for partition in partitions),
+            [["CCA"], ["CCB", "CCC"]],
+        )
+
+    @patch("hotels.importers.parallel.ProcessPoolExecutor")
+    @patch("requests.get")
+    def test_import_hotels_with_workers(self, mock_get, mock_pool):
+        """
+        Test that --workers imports every partition and merges the reports.
+        """
+
+        class InlineExecutor:
+            # Runs the partitions in this process, where the test database lives
+            def __init__(self, max_workers, initializer, initargs):
+                initializer(*initargs)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                return False
+
+            def map(self, function, *iterables):
+                return map(function, *iterables)
+
+        mock_pool.side_effect = InlineExecutor
+        City.objects.create(code="CCA", name="CityA")
+        City.objects.create(code="CCB", name="CityB")
+        mock_get.return_value = self.create_mock_response(
+            "CCA;CCA01;Hotel01\nCCB;CCB01;Hotel02\nCCX;CCX01;Hotel03\nbroken"
+        )
+
+        out = StringIO()
+        call_command("import_hotels", "--workers", "3", stdout=out)
+
+        self.assertEqual(mock_pool.call_args.kwargs["max_workers"], 3)
+        self.assertEqual(Hotel.objects.count(), 2)
+        self.assertIn("Partition 1: ", out.getvalue())
+        self.assertIn(
+            "2 added, 0 updated, 0 unchanged, 1 malformed, 1 missing city",
+            out.getvalue(),
+        )
+
+    @patch("requests.get")
+    def test_import_all(self, mock_get):
+        """
+        Test that import_all imports both feeds and reports every phase.
+        """
+        responses = {
+            CITY_CSV_URL: self.create_mock_response(self.city_data),
+            HOTEL_CSV_URL: self.create_mock_response(self.hotel_data + "\nCCX;CCX01;Hotel03"),
+        }
+        mock_get.side_effect = lambda url, **kwargs: responses[url]
+
+        out = StringIO()
+        call_command("import_all", stdout=out)
+
+        self.assertEqual(City.objects.count(), 2)
+        self.assertEqual(Hotel.objects.filter(city_id="CCA").count(), 2)
+        self.assertIn("Cities: 2 added, 0 already existing, 0 malformed", out.getvalue())
+        self.assertIn("2 added, 0 updated, 0 unchanged, 0 malformed, 1 missing city", out.getvalue())
+        for phase in ("download", "parse", "validate", "write", "total"):
+            self.assertIn(f"  {phase}", out.getvalue())
+        self.assertEqual(FeedState.objects.count(), 2)
+
+    @patch("requests.get")
+    def test_import_all_refetches_hotels_for_new_cities(self, mock_get):
+        """
+        Test that unchanged hotels are fetched again when new cities were added.
+        """
+        responses = {
+            CITY_CSV_URL: self.create_mock_response(self.city_data),
+            HOTEL_CSV_URL: self.create_mock_response("", status_code=304),
+        }
+        mock_get.side_effect = lambda url, **kwargs: (
+            responses[url]
+            if url == CITY_CSV_URL or kwargs["headers"]
+            else self.create_mock_response(self.hotel_data)
+        )
+        FeedState.objects.create(name="hotels", etag='"v1"')
+
+        out = StringIO()
+        err = StringIO()
+        call_command("import_all", stdout=out, stderr=err)
+
+        self.assertEqual(Hotel.objects.count(), 2)
+        self.assertEqual(err.getvalue(), "")
+
+    @patch("requests.get")
+    def test_import_all_download_error(self, mock_get):
+        """
+        Test that a failed download is reported and the other feed still imported.
+        """
+        mock_get.side_effect = lambda url, **kwargs: (
+            self.create_mock_response(self.city_data)
+            if url == CITY_CSV_URL
+            else self.create_mock_response("", status_code=500)
+        )
+
+        err = StringIO()
+        call_command("import_all", stdout=StringIO(), stderr=err)
+
+        self.assertEqual(City.objects.count(), 2)
+        self.assertIn("Failed to fetch hotels data. HTTP Status Code: 500", err.getvalue())
+
+    @patch("requests.get")
+    def test_import_hotels_resume_from_checkpoint(self, mock_get):
+        """
+        Test that an interrupted import resumes after its last committed batch.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        csv_data = "\n".join(f"CCA;CCA{i:02};Hotel{i:02}" for i in range(5))
+        mock_get.return_value = self.create_mock_response(csv_data)
+
+        write_batch = HotelBatchImporter.write_batch
+
+        def crash_on_second_batch(importer, number, batch):
+            if number == 2:
+                raise RuntimeError("Killed")
+            return write_batch(importer, number, batch)
+
+        with patch.object(
+            HotelBatchImporter, "write_batch", autospec=True, side_effect=crash_on_second_batch
+        ):
+            with self.assertRaises(RuntimeError):
+                call_command("import_hotels", "--batch-size", "2", stdout=StringIO())
+        self.assertEqual(Hotel.objects.count(), 2)
+        self.assertEqual(FeedState.objects.get(name="hotels").checkpoint_row, 2)
+
+        out = StringIO()
+        call_command("import_hotels", "--batch-size", "2", "--resume", stdout=out)
+
+        self.assertIn("Resuming from row 2.", out.getvalue())
+        self.assertIn("3 added, 0 updated, 0 unchanged", out.getvalue())
+        self.assertEqual(Hotel.objects.count(), 5)
+        state = FeedState.objects.get(name="hotels")
+        self.assertEqual((state.checkpoint_version, state.checkpoint_row), ("", 0))
+
+    @patch("requests.get")
+    def test_import_hotels_resume_ignores_other_feed_version(self, mock_get):
+        """
+        Test that a checkpoint of a different feed version is not resumed from.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        FeedState.objects.create(name="hotels", checkpoint_version="other", checkpoint_row=1)
+        mock_get.return_value = self.create_mock_response(self.hotel_data)
+
+        out = StringIO()
+        call_command("import_hotels", "--resume", stdout=out)
+
+        self.assertIn("Starting from the first row", out.getvalue())
+        self.assertEqual(Hotel.objects.count(), 2)
+
+    def write_feed(self, data, opener=open):
+        """
+        Helper function writing feed data to a temporary file, returning its path.
+        """
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "feed.csv")
+        with opener(path, "wb") as file:
+            file.write(data.encode())
+        return path
+
+    @patch("requests.get")
+    def test_import_from_local_files(self, mock_get):
+        """
+        Test importing plain and compressed local files without any download.
+        """
+        call_command("import_cities", "--source", self.write_feed(self.city_data), stdout=StringIO())
+        for opener in (gzip.open, bz2.open, lzma.open):
+            Hotel.objects.all().delete()
+            path = self.write_feed(self.hotel_data, opener)
+            call_command("import_hotels", "--source", path, "--force", stdout=StringIO())
+            self.assertEqual(
+                sorted(Hotel.objects.values_list("code", flat=True)), ["CCA01", "CCA02"]
+            )
+
+        mock_get.assert_not_called()
+        self.assertEqual(City.objects.count(), 2)
+        self.assertEqual(FeedState.objects.get(name="cities").etag, "")
+
+    def test_import_local_file_unchanged(self):
+        """
+        Test that a memory-mapped local file is fingerprinted before parsing.
+        """
+        path = self.write_feed(self.city_data)
+        call_command("import_cities", "--source", path, stdout=StringIO())
+
+        out = StringIO()
+        call_command("import_cities", "--source", path, stdout=out)
+        self.assertIn("City data unchanged since the last import", out.getvalue())
+
+    def test_import_from_stdin(self):
+        """
+        Test reading a gzip compressed feed from stdin.
+        """
+        stdin = Mock(buffer=io.BufferedReader(io.BytesIO(gzip.compress(self.city_data.encode()))))
+        with patch("sys.stdin", stdin):
+            call_command("import_cities", "--source", "-", stdout=StringIO())
+
+        self.assertEqual(City.objects.count(), 2)
+
+    def test_import_missing_local_file(self):
+        """
+        Test that an unreadable local file is reported.
+        """
+        err = StringIO()
+        call_command("import_hotels", "--source", "/nonexistent/feed.csv", stderr=err)
+        self.assertIn("Error reading hotel data", err.getvalue())
+
+    def test_import_hotels_summary_with_rejects(self):
+        """
+        Test that summary mode prints only the stats block and that rejected
+        rows are quarantined as JSON lines with their reason code.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        feed = self.write_feed("CCA;CCA01;Hotel01\nCCX;CCX01;HotelX\nbroken\nCCA;CCA02;Hotel02")
+        rejects = os.path.join(os.path.dirname(feed), "rejects.jsonl")
+
+        out = StringIO()
+        err = StringIO()
+        call_command(
+            "import_hotels", "--source", feed, "--summary", "--rejects", rejects,
+            stdout=out, stderr=err,
+        )
+
+        self.assertNotIn("Added hotel", out.getvalue())
+        self.assertNotIn("Batch 1", out.getvalue())
+        self.assertEqual(err.getvalue(), "")
+        self.assertIn("Hotel import summary:", out.getvalue())
+        self.assertIn("  added         2", out.getvalue())
+        self.assertIn("  missing city  1", out.getvalue())
+        self.assertIn("  rejects       2 written to", out.getvalue())
+        with open(rejects, encoding="utf-8") as file:
+            self.assertEqual(
+                [json.loads(line) for line in file],
+                [
+                    {"line": 2, "reason": "missing_city", "row": ["CCX", "CCX01", "HotelX"]},
+                    {"line": 3, "reason": "malformed", "row": ["broken"]},
+                ],
+            )
+
+    def test_import_cities_csv_rejects(self):
+        """
+        Test writing malformed city rows to a CSV reject file.
+        """
+        feed = self.write_feed("CCA;CityA\nCCB\nCCC;CityC")
+        rejects = os.path.join(os.path.dirname(feed), "rejects.csv")
+
+        out = StringIO()
+        call_command(
+            "import_cities", "--source", feed, "--summary", "--rejects", rejects,
+            stdout=out, stderr=StringIO(),
+        )
+
+        self.assertIn("  added         2", out.getvalue())
+        self.assertIn("  malformed     1", out.getvalue())
+        with open(rejects, encoding="utf-8") as file:
+            self.assertEqual(file.read().splitlines(), ["line;reason;row", "2;malformed;CCB"])
+
+    def test_import_hotels_staging(self):
+        """
+        Test that a staging import swaps the validated catalog into the hotel
+        table, keeping the ids of existing hotels.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        City.objects.create(code="CCB", name="CityB")
+        kept = Hotel.objects.create(code="CCA01", name="Old name", city_id="CCA")
+        Hotel.objects.create(code="CCA09", name="Gone", city_id="CCA")
+        Hotel.objects.create(code="CCX01", name="Kept", city_id="CCB")
+        feed = self.write_feed(
+            "CCA;CCA01;Hotel01\nCCB;CCB01;HotelB\nCCX;CCX01;HotelX\nbroken\nCCB;CCB01;HotelB2"
+        )
+
+        out = StringIO()
+        call_command("import_hotels", "--source", feed, "--staging", stdout=out, stderr=StringIO())
+
+        self.assertIn("3 rows staged", out.getvalue())
+        self.assertIn("1 added, 1 updated, 1 deleted, 0 unchanged", out.getvalue())
+        self.assertEqual(
+            dict(Hotel.objects.values_list("code", "name")),
+            {"CCA01": "Hotel01", "CCB01": "HotelB2", "CCX01": "Kept"},
+        )
+        self.assertEqual(Hotel.objects.get(code="CCA01").pk, kept.pk)
+        self.assertFalse(HotelStaging.objects.exists())
+
+    def test_staging_swap_is_a_single_short_transaction(self):
+        """
+        Test that the hotel table is written only by the few statements of the swap.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        rows = [["CCA", f"H{number:04d}", f"Hotel {number}"] for number in range(500)]
+        report = stage_rows(rows, batch_size=100)
+        validate_staging(report=report)
+        self.assertEqual(Hotel.objects.count(), 0)
+
+        with self.assertNumQueries(7):
+            swap_staging(report)
+
+        self.assertEqual(Hotel.objects.count(), 500)
+        self.assertEqual(report.added, 500)
+
+    def test_imports_keep_hotel_counts(self):
+        """
+        Test that every import mode keeps the hotel counts of the cities exact,
+        and that the repair command recounts them.
+        """
+        def counts():
+            return dict(City.objects.values_list("code", "hotel_count"))
+
+        City.objects.create(code="CCA", name="CityA")
+        City.objects.create(code="CCB", name="CityB")
+        Hotel.objects.create(code="CCA01", name="Hotel01", city_id="CCB")
+        Hotel.objects.create(code="CCB09", name="Gone", city_id="CCB")
+
+        # The batched upsert moves CCA01 and adds CCA02
+        call_command("import_hotels", "--source", self.write_feed(self.hotel_data), stdout=StringIO())
+        self.assertEqual(counts(), {"CCA": 2, "CCB": 1})
+
+        feed = self.write_feed("CCB;CCA01;Hotel01\nCCB;CCB01;HotelB")
+        call_command("import_hotels", "--source", feed, "--delta", stdout=StringIO())
+        self.assertEqual(counts(), {"CCA": 0, "CCB": 2})
+
+        feed = self.write_feed("CCA;CCA01;Hotel01\nCCA;CCA03;Hotel03\nCCB;CCB02;HotelB")
+        call_command("import_hotels", "--source", feed, "--staging", stdout=StringIO())
+        self.assertEqual(counts(), {"CCA": 2, "CCB": 1})
+
+        City.objects.update(hotel_count=0)
+        out = StringIO()
+        call_command("recount_city_hotels", stdout=out)
+        self.assertEqual(counts(), {"CCA": 2, "CCB": 1})
+        self.assertIn("Recounted the hotels of 2 cities.", out.getvalue())
+
+    def test_bulk_deletes_skip_the_per_hotel_signals(self):
+        """
+        Test that delta deletes and city deletes do not update the counts and
+        cached lists hotel by hotel.
+        """
+        City.objects.create(code="CCA", name="CityA")
+        City.objects.create(code="CCB", name="CityB")
+        Hotel.objects.bulk_create_checked(
+            [Hotel(code=f"A{number:03d}", name="A", city_id="CCA") for number in range(200)]
+            + [Hotel(code=f"B{number:03d}", name="B", city_id="CCB") for number in range(200)]
+        )
+
+        changes = ChangeSet(deletes=[f"A{number:03d}" for number in range(200)])
+        with self.assertNumQueries(3):
+            apply_changes(Hotel, changes, ("name", "city_id"), raw_delete=True)
+        self.assertFalse(Hotel.objects.filter(city_id="CCA").exists())
+
+        # The city, its hotels, the managers it is unset from and the deletes,
+        # without a count update per hotel
+        with self.assertNumQueries(6):
+            City.objects.get(code="CCB").delete()
+        self.assertFalse(Hotel.objects.exists())
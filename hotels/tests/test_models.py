@@ -1,10 +1,13 @@
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+from hotels.caching import city_response_keys
 from hotels.models import City, Hotel, User
+from hotels.tests import TEST_CACHES
 
 
+@override_settings(CACHES=TEST_CACHES)
 class CityModelTest(TestCase):
     """
     Tests for the City model.
@@ -67,6 +70,7 @@ class CityModelTest(TestCase):
         self.assertEqual(City.objects.count(), 100)
 
 
+@override_settings(CACHES=TEST_CACHES)
 class HotelModelTest(TestCase):
     """
     Tests for the Hotel model. These tests ensure the correct functionality of the Hotel model, including validation,
@@ -135,7 +139,155 @@ class HotelModelTest(TestCase):
                 code="H005", name="Duplicate Hotel", city=self.city
             )
 
+    def test_save_with_loaded_city_skips_city_query(self):
+        """
+        Test that saving a hotel linked to a loaded city runs only the insert
+        and the count update, while a bare city code is still checked.
+        """
+
+        with self.assertNumQueries(2):
+            Hotel.objects.create(code="H007", name="Canal Hotel", city=self.city)
+        with self.assertNumQueries(3):
+            Hotel.objects.create(code="H008", name="Dam Hotel", city_id="AMS")
+        with self.assertNumQueries(2):
+            Hotel(code="H009", name="Trusted", city_id="AMS").save(check_city=False)
+
+    def test_bulk_create_checked(self):
+        """
+        Test that bulk creation checks all cities in one query and reports
+        every hotel with an unknown city.
+        """
+
+        City.objects.create(code="RTM", name="Rotterdam")
+        hotels = [
+            Hotel(code="B1", name="One", city_id="AMS"),
+            Hotel(code="B2", name="Two", city_id="XXX"),
+            Hotel(code="B3", name="Three", city_id="RTM"),
+            Hotel(code="B4", name="Four", city_id="YYY"),
+        ]
+
+        with self.assertNumQueries(1):
+            with self.assertRaises(ValidationError) as raised:
+                Hotel.objects.bulk_create_checked(hotels)
+        self.assertEqual(
+            raised.exception.messages,
+            [
+                "Row 2: city with code XXX does not exist.",
+                "Row 4: city with code YYY does not exist.",
+            ],
+        )
+        self.assertFalse(Hotel.objects.exists())
+
+        with self.assertNumQueries(3):
+            Hotel.objects.bulk_create_checked([hotels[0], hotels[2]])
+        self.assertEqual(Hotel.objects.count(), 2)
+
+    def test_bulk_update_checked(self):
+        """
+        Test that bulk updates only check the cities when the city changes.
+        """
+
+        hotel = Hotel.objects.create(code="B5", name="Five", city=self.city)
+        hotel.name = "Renamed"
+        with self.assertNumQueries(1):
+            Hotel.objects.bulk_update_checked([hotel], ["name"])
+
+        hotel.city_id = "XXX"
+        with self.assertRaises(ValidationError):
+            Hotel.objects.bulk_update_checked([hotel], ["city"])
+        self.assertEqual(Hotel.objects.get(code="B5").city_id, "AMS")
+
+    def test_hotel_counts(self):
+        """
+        Test that the hotel counts of the cities follow every hotel write,
+        and that recounting them repairs any drift.
+        """
+
+        def counts():
+            return dict(City.objects.values_list("code", "hotel_count"))
+
+        rotterdam = City.objects.create(code="RTM", name="Rotterdam")
+        hotel = Hotel.objects.create(code="C1", name="One", city=self.city)
+        Hotel.objects.bulk_create_checked(
+            [
+                Hotel(code="C2", name="Two", city_id="AMS"),
+                Hotel(code="C3", name="Three", city_id="RTM"),
+            ]
+        )
+        self.assertEqual(counts(), {"AMS": 2, "RTM": 1})
+
+        # Moving a hotel, even one that was not loaded, moves its count
+        Hotel(pk=hotel.pk, code="C1", name="One", city=rotterdam).save()
+        hotel = Hotel.objects.get(code="C2")
+        hotel.city = rotterdam
+        hotel.save(update_fields=["name"])
+        self.assertEqual(counts(), {"AMS": 1, "RTM": 2})
+        hotel.save()
+        self.assertEqual(counts(), {"AMS": 0, "RTM": 3})
+        hotel.city = self.city
+        Hotel.objects.bulk_update_checked([hotel], ["city"])
+        self.assertEqual(counts(), {"AMS": 1, "RTM": 2})
+        hotel.city = rotterdam
+        Hotel.objects.bulk_update_checked([hotel], ["city"])
+        self.assertEqual(counts(), {"AMS": 0, "RTM": 3})
+
+        # A stale city instance does not write back its count
+        rotterdam.name = "Rotterdam Centraal"
+        rotterdam.save()
+        Hotel.objects.filter(city=rotterdam).first().delete()
+        self.assertEqual(counts(), {"AMS": 0, "RTM": 2})
+
+        City.objects.update(hotel_count=5)
+        self.assertEqual(City.objects.recount_hotels(), 2)
+        self.assertEqual(counts(), {"AMS": 0, "RTM": 2})
+
+    def test_delete_with_drifted_count(self):
+        """
+        Test that hotels added without maintaining the counts can still be
+        deleted, one by one or in bulk, leaving the counts at zero.
+        """
+
+        Hotel.objects.bulk_create(
+            [Hotel(code=f"D{number}", name="Drifted", city=self.city) for number in range(3)]
+        )
+        Hotel.objects.get(code="D0").delete()
+        self.assertEqual(City.objects.get(code="AMS").hotel_count, 0)
+        Hotel.objects.all().delete()
+        self.assertEqual(City.objects.get(code="AMS").hotel_count, 0)
+
+    def test_queryset_delete_adjusts_counts_at_once(self):
+        """
+        Test that deleting hotels through a queryset, as the admin does,
+        updates the counts once per distinct delta instead of once per hotel,
+        and drops the cached responses of their cities once.
+        """
+
+        City.objects.create(code="RTM", name="Rotterdam")
+        City.objects.create(code="UTC", name="Utrecht")
+        Hotel.objects.bulk_create_checked(
+            [Hotel(code=f"A{number:03d}", name="A", city_id="AMS") for number in range(100)]
+            + [Hotel(code=f"R{number:03d}", name="R", city_id="RTM") for number in range(50)]
+            + [Hotel(code="U001", name="U", city_id="UTC")]
+        )
+        before = city_response_keys(["AMS", "RTM", "UTC"])
+
+        # The counts per city, the delete and one update per distinct delta
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertNumQueries(4):
+                deleted = Hotel.objects.exclude(city_id="UTC").delete()
+        self.assertEqual(deleted, (150, {"hotels.Hotel": 150}))
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(
+            dict(City.objects.values_list("code", "hotel_count")),
+            {"AMS": 0, "RTM": 0, "UTC": 1},
+        )
+        after = city_response_keys(["AMS", "RTM", "UTC"])
+        self.assertNotEqual(after[0], before[0])
+        self.assertNotEqual(after[1], before[1])
+        self.assertEqual(after[2], before[2])
+
 
+@override_settings(CACHES=TEST_CACHES)
 class UserModelTest(TestCase):
     """
     Tests for the User model. These tests ensure the correct functionality of the User model, including user
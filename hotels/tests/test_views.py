@@ -1,12 +1,57 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
-from django.urls import reverse
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.urls import include, path, reverse
+from django.utils import timezone
+from hotels.async_views import (
+    acity_autocomplete,
+    acity_hotels_view,
+    aget_hotels_by_city,
+)
+from hotels.caching import (
+    CITY_VERSIONS_KEY,
+    ResponseCache,
+    bump_city_versions,
+    city_response_keys,
+    hotel_responses,
+)
+from hotels.importers import HotelBatchImporter
 from hotels.models import City, Hotel
+from hotels.pagination import encode_cursor
+from hotels.search import city_index
+from hotels.serialization import (
+    default_encoder,
+    encode_object,
+    encode_rows,
+    set_encoder,
+    stdlib_dumps,
+)
+from hotels.tests import TEST_CACHES
+from hotels.utils import AUTOCOMPLETE_LIMIT, HOTEL_PAGE_SIZE, SEARCH_MAX_PAGE, SEARCH_PAGE_SIZE
 
 User = get_user_model()
 
+# The public read views served by their async versions, as with HOTELS_ASYNC_VIEWS, next
+# to the project URLs
+urlpatterns = [
+    path("async/", acity_hotels_view),
+    path("async/autocomplete/", acity_autocomplete),
+    path("async/<str:city_code>/", aget_hotels_by_city),
+    path("", include("HotelManager.urls")),
+]
+
 
-class HotelsViewsTest(TestCase):
+# The writes are committed, as the cached data is only invalidated on commit
+@override_settings(CACHES=TEST_CACHES)
+class HotelsViewsTest(TransactionTestCase):
     def setUp(self):
         # Create test user
         self.manager_user = User.objects.create_user(
@@ -34,14 +79,92 @@ class HotelsViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertIn(self.hotel, response.context["hotels"])
 
+    def test_home_page_cache(self):
+        """Test that warm home pages run no query and follow the writes."""
+        url = reverse("home")
+        response = self.client.get(url, {"city": "AMS"})
+        self.assertIn(self.city, response.context["cities"])
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"city": "AMS"})
+            self.assertIn(self.city, response.context["cities"])
+        self.assertContains(response, "Test Hotel (Code: H001)")
+        self.assertIn(self.hotel, response.context["hotels"])
+
+        Hotel.objects.create(name="Canal Hotel", code="H002", city=self.city)
+        self.assertContains(self.client.get(url, {"city": "AMS"}), "Canal Hotel")
+        HotelBatchImporter().run([["AMS", "H002", "Dam Hotel"]])
+        self.assertContains(self.client.get(url, {"city": "AMS"}), "Dam Hotel")
+        self.city.name = "Mokum"
+        self.city.save()
+        response = self.client.get(url, {"city": "AMS"})
+        self.assertContains(response, "Hotels in Mokum")
+        self.assertEqual(response.context["cities"][0].name, "Mokum")
+
+        # Unknown cities are cached until they are created
+        self.assertNotContains(self.client.get(url, {"city": "RTM"}), "Hotels in")
+        City.objects.create(name="Rotterdam", code="RTM")
+        self.assertContains(self.client.get(url, {"city": "RTM"}), "No hotels found")
+
     def test_city_autocomplete(self):
         """Test city_autocomplete view for suggestions."""
         response = self.client.get(reverse("city_autocomplete"), {"q": "Amst"})
         self.assertEqual(response.status_code, 200)
         self.assertJSONEqual(
             response.content.decode(),
-            [{"id": "AMS", "name": "Amsterdam"}],
+            [{"id": "AMS", "name": "Amsterdam", "hotels": 1}],
+        )
+
+    def test_city_autocomplete_index(self):
+        """Test that autocomplete is ranked, capped and kept in sync without queries."""
+        City.objects.bulk_create(
+            [City(code=f"AM{number:02d}", name=f"Ämsel {number:02d}") for number in range(20)]
+            + [City(code="AMR", name="amersfoort")]
+        )
+        city_index.invalidate()
+        self.client.get(reverse("city_autocomplete"), {"q": "a"})
+
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("city_autocomplete"), {"q": "A"})
+        self.assertEqual(
+            [city["name"] for city in response.json()],
+            ["amersfoort", "Amsterdam"],
+        )
+        response = self.client.get(reverse("city_autocomplete"), {"q": "äMSEL"})
+        self.assertEqual(len(response.json()), AUTOCOMPLETE_LIMIT)
+        self.assertEqual(response.json()[0], {"id": "AM00", "name": "Ämsel 00", "hotels": 0})
+
+        # Saving and deleting a city drops the index
+        City.objects.create(code="AMA", name="Amstelveen")
+        self.city.delete()
+        response = self.client.get(reverse("city_autocomplete"), {"q": "amst"})
+        self.assertEqual(response.json(), [{"id": "AMA", "name": "Amstelveen", "hotels": 0}])
+
+    def test_city_autocomplete_fuzzy(self):
+        """Test that fuzzy autocomplete tolerates typos and ranks by edit distance."""
+        City.objects.bulk_create(
+            [
+                City(code="AMF", name="Amersfoort"),
+                City(code="ASS", name="Assen"),
+                City(code="RTM", name="Rotterdam"),
+            ]
         )
+        city_index.invalidate()
+
+        def suggest(query):
+            response = self.client.get(
+                reverse("city_autocomplete"), {"q": query, "mode": "fuzzy"}
+            )
+            return [city["id"] for city in response.json()]
+
+        self.assertEqual(suggest("Amstedram"), ["AMS"])
+        self.assertEqual(suggest("rotetrdam"), ["RTM"])
+        self.assertEqual(suggest("amsr"), ["AMS", "AMF"])
+        # Exact matches first, then by the number of shared trigrams
+        self.assertEqual(suggest("Ams"), ["AMS", "AMF", "ASS"])
+        self.assertEqual(suggest("qqqqqq"), [])
+        # Exact prefix matches only without the fuzzy mode
+        response = self.client.get(reverse("city_autocomplete"), {"q": "Amstedram"})
+        self.assertEqual(response.json(), [])
 
     def test_signup(self):
         """Test signup view."""
@@ -75,6 +198,62 @@ class HotelsViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context["selected_city"], self.city)
 
+    @override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.cached_db"
+    )
+    def test_manager_identity_queries(self):
+        """Test that manager pages load the user and their city at once."""
+        self.client.login(username="manager", password="manager123")
+        url = reverse("manager_hotels")
+        # The user with their city and the page of hotels, the session is cached
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.context["selected_city"].name, "Amsterdam")
+
+        # Other roles are redirected from the session, without loading the user
+        admin = User.objects.create_superuser("admin", "admin@gmail.com", "admin123")
+        self.client.login(username="admin", password="admin123")
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.url, reverse("home"))
+
+        # A changed user is loaded again
+        admin.is_superuser = False
+        admin.city = self.city
+        admin.save()
+        self.assertEqual(self.client.get(url).status_code, 200)
+        admin.role = "guest"
+        admin.save()
+        self.assertEqual(self.client.get(url).url, reverse("home"))
+
+    def test_sessions_of_the_default_backend(self):
+        """Test that sessions logged in through ModelBackend stay logged in."""
+        manager = User.objects.get(username="manager")
+        self.client.force_login(manager, backend="django.contrib.auth.backends.ModelBackend")
+        response = self.client.get(reverse("manager_hotels"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["user"], manager)
+
+    @override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+    def test_clear_expired_sessions(self):
+        """Test that expired sessions are deleted in batches."""
+        now = timezone.now()
+        Session.objects.bulk_create(
+            Session(
+                session_key=f"key{number}",
+                session_data="",
+                expire_date=now + timedelta(days=1 if number < 2 else -1),
+            )
+            for number in range(7)
+        )
+        out = StringIO()
+        call_command("clear_expired_sessions", batch_size=2, stdout=out)
+        self.assertIn("Deleted 5 expired sessions.", out.getvalue())
+        self.assertEqual(
+            sorted(Session.objects.values_list("session_key", flat=True)),
+            ["key0", "key1"],
+        )
+
     def test_add_hotel_as_manager(self):
         """Test adding a hotel as a manager."""
         self.client.login(username="manager", password="manager123")
@@ -108,6 +287,18 @@ class HotelsViewsTest(TestCase):
         self.hotel.refresh_from_db()
         self.assertEqual(self.hotel.name, "Updated Hotel")
 
+    @override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.cached_db"
+    )
+    def test_edit_hotel_queries(self):
+        """Test that an edit does not check that the hotel's city exists."""
+        self.client.login(username="manager", password="manager123")
+        url = reverse("hotel_edit", args=[self.hotel.id])
+        # The user, the hotel, the uniqueness of its code and the update
+        with self.assertNumQueries(4):
+            response = self.client.post(url, {"name": "Renamed", "code": "H001"})
+        self.assertEqual(response.status_code, 302)
+
     def test_logout(self):
         """Test logout view."""
         self.client.login(username="manager", password="manager123")
@@ -121,10 +312,379 @@ class HotelsViewsTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertJSONEqual(
             response.content.decode(),
-            {'hotels':[{"name": self.hotel.name, "code": self.hotel.code}]},
+            {"hotels": [{"name": self.hotel.name, "code": self.hotel.code}], "next": None},
         )
 
         # Test invalid city code
         response = self.client.get(reverse("get_hotels_by_city", args=["XXX"]))
         self.assertEqual(response.status_code, 404)
         self.assertJSONEqual(response.content.decode(), {"error": "City not found"})
+
+    def test_get_hotels_by_city_cache(self):
+        """Test that city responses are cached until a hotel of the city changes."""
+        hotel_responses.clear()
+        url = reverse("get_hotels_by_city", args=["AMS"])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.json(), {"hotels": [{"name": "Test Hotel", "code": "H001"}], "next": None})
+
+        # A manager adding a hotel drops the cached response
+        self.client.login(username="manager", password="manager123")
+        self.client.post(reverse("manager_hotels"), {"name": "New Hotel", "code": "NH01"})
+        self.assertEqual(len(self.client.get(url).json()["hotels"]), 2)
+
+        # Moving a hotel drops the responses of both cities
+        rotterdam = City.objects.create(name="Rotterdam", code="RTM")
+        rotterdam_url = reverse("get_hotels_by_city", args=["RTM"])
+        self.assertEqual(self.client.get(rotterdam_url).json()["hotels"], [])
+        hotel = Hotel.objects.get(code="H001")
+        hotel.city = rotterdam
+        hotel.save()
+        self.assertEqual(self.client.get(url).json(), {"hotels": [{"name": "New Hotel", "code": "NH01"}], "next": None})
+        self.assertEqual(len(self.client.get(rotterdam_url).json()["hotels"]), 1)
+
+        # Bulk imports bump the versions of the cities they write to
+        HotelBatchImporter().run([["RTM", "NH01", "Moved Hotel"]])
+        self.assertEqual(self.client.get(url).json()["hotels"], [])
+        self.assertEqual(len(self.client.get(rotterdam_url).json()["hotels"]), 2)
+
+        # Deleting a city drops its response too
+        rotterdam.delete()
+        self.assertEqual(self.client.get(rotterdam_url).status_code, 404)
+
+    def test_versions_bumped_on_commit(self):
+        """Test that writes invalidate the cached responses once committed."""
+        url = reverse("get_hotels_by_city", args=["AMS"])
+        etag = self.client.get(url)["ETag"]
+        with transaction.atomic():
+            Hotel.objects.create(name="Canal Hotel", code="H002", city=self.city)
+            # Other requests still see the old rows, under the old version
+            self.assertEqual(self.client.get(url)["ETag"], etag)
+        self.assertNotEqual(self.client.get(url)["ETag"], etag)
+        self.assertEqual(len(self.client.get(url).json()["hotels"]), 2)
+
+    def test_unknown_city_writes_no_version(self):
+        """Test that requests for unknown cities do not add to the shared cache."""
+        for code in ("ZZ1", "ZZ2"):
+            response = self.client.get(reverse("get_hotels_by_city", args=[code]))
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn(code, cache.get(CITY_VERSIONS_KEY)[1])
+
+        # Creating the city still drops the cached 404
+        City.objects.create(code="ZZ1", name="Zed")
+        response = self.client.get(reverse("get_hotels_by_city", args=["ZZ1"]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_city_versions_bumped_in_one_write(self):
+        """Test that bumping many cities writes one key, reset past the limit."""
+        before = dict((code, key) for code, *key in city_response_keys(["AMS", "RTM", "UTC"]))
+        with mock.patch.object(cache, "set", wraps=cache.set) as cache_set:
+            bump_city_versions("AMS", "RTM")
+        cache_set.assert_called_once()
+        after = dict((code, key) for code, *key in city_response_keys(["AMS", "RTM", "UTC"]))
+        self.assertNotEqual(after["AMS"], before["AMS"])
+        self.assertNotEqual(after["RTM"], before["RTM"])
+        self.assertEqual(after["UTC"], before["UTC"])
+
+        # Past the limit the catalog version changes and the map starts over
+        with mock.patch("hotels.caching.CITY_VERSIONS_LIMIT", 2):
+            bump_city_versions("UTC")
+        catalog, cities = cache.get(CITY_VERSIONS_KEY)
+        self.assertNotEqual(catalog, before["UTC"][0])
+        self.assertEqual(cities, {})
+
+    def test_json_endpoints_conditional_get(self):
+        """Test strong ETags, 304 responses without queries and Cache-Control."""
+        for url, params in (
+            (reverse("get_hotels_by_city", args=["AMS"]), {}),
+            (reverse("city_autocomplete"), {"q": "Ams"}),
+        ):
+            response = self.client.get(url, params)
+            etag = response["ETag"]
+            self.assertFalse(etag.startswith("W/"))
+            self.assertIn("public", response["Cache-Control"])
+            self.assertIn("no-cache", response["Cache-Control"])
+
+            with self.assertNumQueries(0):
+                response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response["ETag"], etag)
+
+        # Both versions change with the city, so a stale copy is sent again
+        url = reverse("get_hotels_by_city", args=["AMS"])
+        etag = self.client.get(url)["ETag"]
+        self.city.name = "Mokum"
+        self.city.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse("city_autocomplete"), {"q": "Mok"})
+        self.assertEqual(response.json(), [{"id": "AMS", "name": "Mokum", "hotels": 1}])
+
+    @override_settings(ROOT_URLCONF=__name__)
+    async def test_async_views(self):
+        """Test that the async views answer like the sync ones."""
+        await Hotel.objects.acreate(name="Canal Hotel", code="H002", city=self.city)
+        for url, sync_url, params in (
+            ("/async/AMS/", "/hotels/AMS/", {"limit": 1}),
+            ("/async/XXX/", "/hotels/XXX/", {}),
+            ("/async/AMS/", "/hotels/AMS/", {"cursor": "x"}),
+            ("/async/autocomplete/", "/hotels/autocomplete/", {"q": "am"}),
+            ("/async/autocomplete/", "/hotels/autocomplete/", {"q": "Amsterdma", "mode": "fuzzy"}),
+        ):
+            response = await self.async_client.get(url, params)
+            expected = await self.async_client.get(sync_url, params)
+            self.assertEqual(response.status_code, expected.status_code)
+            self.assertEqual(response.json(), expected.json())
+            self.assertEqual(response.get("ETag"), expected.get("ETag"))
+
+        etag = response["ETag"]
+        response = await self.async_client.get(url, params, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+
+        cursor = encode_cursor("Canal Hotel", 0)
+        response = await self.async_client.get("/async/", {"city": "AMS", "cursor": cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([hotel.code for hotel in response.context["hotels"]], ["H002", "H001"])
+        self.assertIn(self.city, response.context["cities"])
+        self.assertContains(response, "Login")
+
+    def test_response_cache_eviction(self):
+        """Test that the response cache evicts the least recently used bodies."""
+        responses = ResponseCache(max_bytes=10)
+        responses.put("a", b"aaaa")
+        responses.put("b", b"bbbb")
+        responses.get("a")
+        responses.put("c", b"cccc")
+        self.assertIsNone(responses.get("b"))
+        self.assertEqual(responses.get("a"), b"aaaa")
+        self.assertEqual(responses.size, 8)
+        responses.put("d", b"d" * 11)
+        self.assertIsNone(responses.get("d"))
+
+    def test_serialization_encoders_agree(self):
+        """Test that the fast path and the default encoder encode rows alike."""
+        rows = [("Hôtel \"Ü\"\n", "H1"), ("Test Hotel", None), ("Inn", 3)]
+        expected = {
+            "hotels": [
+                {"name": "Hôtel \"Ü\"\n", "code": "H1"},
+                {"name": "Test Hotel", "code": None},
+                {"name": "Inn", "code": 3},
+            ]
+        }
+        for encoder in (stdlib_dumps, default_encoder):
+            previous = set_encoder(encoder)
+            try:
+                body = encode_object(
+                    {"hotels": encode_rows(rows, ("name", "code"))}
+                )
+                self.assertEqual(json.loads(body), expected)
+                self.assertEqual(encode_rows([], ("name",)), b"[]")
+            finally:
+                set_encoder(previous)
+
+    def test_hotel_listings_keyset_pagination(self):
+        """Test that the JSON endpoint and both HTML views page by (name, id)."""
+        Hotel.objects.bulk_create(
+            [Hotel(name=f"Hotel {number % 60:02d}", code=f"K{number:03d}", city=self.city) for number in range(120)]
+        )
+        expected = list(Hotel.objects.filter(city=self.city).order_by("name", "id").values_list("code", flat=True))
+
+        url = reverse("get_hotels_by_city", args=["AMS"])
+        codes, cursor = [], None
+        while True:
+            data = self.client.get(url, {"limit": 7, **({"cursor": cursor} if cursor else {})}).json()
+            self.assertLessEqual(len(data["hotels"]), 7)
+            codes += [hotel["code"] for hotel in data["hotels"]]
+            cursor = data["next"]
+            if cursor is None:
+                break
+        self.assertEqual(codes, expected)
+
+        # Deep pages run the same single query as the first page
+        with self.assertNumQueries(2):
+            self.client.get(url, {"limit": 3, "cursor": encode_cursor("Hotel 59", 0)})
+        self.assertEqual(self.client.get(url, {"cursor": "bogus"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"limit": 0}).status_code, 400)
+
+        response = self.client.get(reverse("home"), {"city": "AMS"})
+        self.assertEqual(len(response.context["hotels"]), HOTEL_PAGE_SIZE)
+        response = self.client.get(reverse("home"), {"city": "AMS", "cursor": response.context["next_cursor"]})
+        self.assertEqual(
+            [hotel.code for hotel in response.context["hotels"]], expected[HOTEL_PAGE_SIZE : 2 * HOTEL_PAGE_SIZE]
+        )
+
+        self.client.login(username="manager", password="manager123")
+        response = self.client.get(reverse("manager_hotels"))
+        self.assertContains(response, "Next page")
+        self.assertEqual([hotel.code for hotel in response.context["hotels"]], expected[:HOTEL_PAGE_SIZE])
+
+    def test_get_hotels_by_cities(self):
+        """Test the batch lookup of the hotels of several cities."""
+        rotterdam = City.objects.create(name="Rotterdam", code="RTM")
+        City.objects.create(name="Utrecht", code="UTC")
+        Hotel.objects.create(name="Harbour Inn", code="R002", city=rotterdam)
+        Hotel.objects.create(name="Euromast", code="R001", city=rotterdam)
+        url = reverse("get_hotels_by_cities")
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {"cities": "RTM,XXX, AMS,UTC,RTM"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "cities": [
+                    {
+                        "code": "RTM",
+                        "name": "Rotterdam",
+                        "hotels": [
+                            {"name": "Euromast", "code": "R001"},
+                            {"name": "Harbour Inn", "code": "R002"},
+                        ],
+                    },
+                    {"code": "XXX", "error": "City not found"},
+                    {
+                        "code": "AMS",
+                        "name": "Amsterdam",
+                        "hotels": [{"name": "Test Hotel", "code": "H001"}],
+                    },
+                    {"code": "UTC", "name": "Utrecht", "hotels": []},
+                ]
+            },
+        )
+        self.assertEqual(self.client.get(url).json(), {"cities": []})
+        codes = ",".join(f"C{number}" for number in range(51))
+        self.assertEqual(self.client.get(url, {"cities": codes}).status_code, 400)
+
+    def test_stream_hotels_by_city(self):
+        """Test streaming the full hotel list of a city as JSON."""
+        Hotel.objects.bulk_create(
+            [Hotel(name=f'Hotel "{number:04d}"', code=f"S{number:04d}", city=self.city) for number in range(2500)]
+        )
+
+        response = self.client.get(reverse("stream_hotels_by_city", args=["AMS"]))
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/json")
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(data["hotels"]), 2501)
+        self.assertIsNone(data["next"])
+        self.assertEqual(data["hotels"][0], {"name": 'Hotel "0000"', "code": "S0000"})
+        self.assertEqual(data["hotels"][-1], {"name": "Test Hotel", "code": "H001"})
+
+        response = self.client.get(reverse("stream_hotels_by_city", args=["XXX"]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_hotel_search(self):
+        """Test the ranked, paginated full-text hotel search."""
+        rotterdam = City.objects.create(name="Rotterdam", code="RTM")
+        Hotel.objects.bulk_create(
+            [
+                Hotel(name="Amsterdam Harbour Hotel", code="R01", city=rotterdam),
+                Hotel(name="Harbour Inn", code="A01", city=self.city),
+                Hotel(name="Café Amstel", code="A02", city=self.city),
+            ]
+        )
+
+        def search(query, page=1):
+            response = self.client.get(reverse("hotel_search"), {"q": query, "page": page})
+            self.assertEqual(response.status_code, 200)
+            return response.json()
+
+        # Hotel name matches rank before city name matches
+        result = search("amsterdam")
+        self.assertEqual([hotel["code"] for hotel in result["hotels"]][0], "R01")
+        self.assertEqual(
+            {hotel["code"] for hotel in result["hotels"]}, {"R01", "H001", "A01", "A02"}
+        )
+        # Every word must match, as a prefix, and accents are ignored
+        self.assertEqual([hotel["code"] for hotel in search("harb rotter")["hotels"]], ["R01"])
+        self.assertEqual(search("cafe")["hotels"][0]["city"], {"code": "AMS", "name": "Amsterdam"})
+        # FTS5 syntax in the input is searched literally
+        self.assertEqual(search('"harbour" OR NEAR(')["hotels"], [])
+        self.assertEqual(search("")["hotels"], [])
+
+        Hotel.objects.bulk_create(
+            [Hotel(name=f"Canal Suites {number:02d}", code=f"C{number:02d}", city=self.city) for number in range(25)]
+        )
+        first, second = search("canal"), search("canal", page=2)
+        self.assertTrue(first["has_next"])
+        self.assertFalse(second["has_next"])
+        self.assertEqual(len(first["hotels"]), SEARCH_PAGE_SIZE)
+        self.assertEqual(
+            [hotel["code"] for hotel in first["hotels"] + second["hotels"]],
+            [f"C{number:02d}" for number in range(25)],
+        )
+
+        # Pages past the last allowed one are refused, however large
+        self.assertEqual(search("canal", page=SEARCH_MAX_PAGE)["hotels"], [])
+        for page in (SEARCH_MAX_PAGE + 1, 10**20):
+            response = self.client.get(reverse("hotel_search"), {"q": "canal", "page": page})
+            self.assertEqual(response.status_code, 400)
+
+    def test_hotel_search_stays_in_sync(self):
+        """Test that the full-text index follows hotel and city writes."""
+        def codes(query):
+            response = self.client.get(reverse("hotel_search"), {"q": query})
+            return [hotel["code"] for hotel in response.json()["hotels"]]
+
+        self.hotel.name = "Renamed Hotel"
+        self.hotel.save()
+        self.assertEqual(codes("renamed"), ["H001"])
+        self.city.name = "Mokum"
+        self.city.save()
+        self.assertEqual(codes("mokum"), ["H001"])
+        self.hotel.delete()
+        self.assertEqual(codes("renamed"), [])
+
+    def test_admin_hotel_search(self):
+        """Test that the hotel admin searches with the full-text index."""
+        admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin123"
+        )
+        self.client.force_login(admin)
+        Hotel.objects.create(name="Harbour Inn", code="H002", city=self.city)
+
+        response = self.client.get(reverse("admin:hotels_hotel_changelist"), {"q": "harb"})
+        self.assertEqual(
+            [hotel.code for hotel in response.context["cl"].result_list], ["H002"]
+        )
+        response = self.client.get(reverse("admin:hotels_hotel_changelist"), {"q": "amsterdam"})
+        self.assertEqual(response.context["cl"].result_count, 2)
+
+    @override_settings(
+        SESSION_ENGINE="django.contrib.sessions.backends.cached_db"
+    )
+    def test_city_hotel_counts(self):
+        """Test that the city admin and autocomplete show the stored hotel counts."""
+        admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin123"
+        )
+        self.client.force_login(admin)
+        url = reverse("admin:hotels_city_changelist")
+        self.client.get(url)
+        City.objects.bulk_create([City(code=f"C{number:02d}", name=f"City {number}") for number in range(20)])
+
+        # The user, the counts of the paginator and the page of cities, not one
+        # query per listed city
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertContains(response, '<td class="field-get_hotels_count">1</td>', html=True)
+
+        autocomplete = reverse("city_autocomplete")
+        etag = self.client.get(autocomplete, {"q": "amst"})["ETag"]
+        built = city_index.data
+        # Renaming a hotel leaves the suggestions as they were
+        self.hotel.name = "Renamed"
+        self.hotel.save()
+        with self.assertNumQueries(0):
+            response = self.client.get(autocomplete, {"q": "amst"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # A new hotel reloads the count of the matches only, not the index
+        Hotel.objects.create(name="Harbour Inn", code="H002", city=self.city)
+        with self.assertNumQueries(1):
+            response = self.client.get(autocomplete, {"q": "amst"})
+        self.assertEqual(response.json(), [{"id": "AMS", "name": "Amsterdam", "hotels": 2}])
+        self.assertIs(city_index.data, built)
+        with self.assertNumQueries(0):
+            self.client.get(autocomplete, {"q": "ams", "mode": "fuzzy"})
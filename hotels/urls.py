@@ -2,11 +2,20 @@
 # This file defines all the URL patterns for views related to hotels, including user authentication,
 # hotel management, and city-related hotel data.
 
+from django.conf import settings
 from django.urls import path
 
 from hotels.views import custom_login, logout_view, signup
 
-from . import views
+from . import async_views, views
+
+# The public read views are served by their async versions when opted in
+if settings.HOTELS_ASYNC_VIEWS:
+    city_autocomplete = async_views.acity_autocomplete
+    get_hotels_by_city = async_views.aget_hotels_by_city
+else:
+    city_autocomplete = views.city_autocomplete
+    get_hotels_by_city = views.get_hotels_by_city
 
 urlpatterns = [
     # URL for viewing the hotels in a city, restricted to manager roles
@@ -14,7 +23,7 @@ urlpatterns = [
         "manager_hotels/", views.city_hotels_view_manager, name="manager_hotels"
     ),
     # URL for handling the city autocomplete functionality (for city selection)
-    path("autocomplete/", views.city_autocomplete, name="city_autocomplete"),
+    path("autocomplete/", city_autocomplete, name="city_autocomplete"),
     # URL for the login page, using custom_login view for authentication
     path("login/", custom_login, name="login"),
     # URL for the signup page, where new users can register
@@ -29,8 +38,18 @@ urlpatterns = [
     path("<int:hotel_id>/edit/", views.edit_hotel, name="hotel_edit"),
     # URL for logging out the user, using the logout_view function
     path("logout/", logout_view, name="logout"),
+    # URL for searching hotels by hotel or city name
+    path("search/", views.hotel_search, name="hotel_search"),
+    # URL for getting the hotels of several cities at once
+    path("batch/", views.get_hotels_by_cities, name="get_hotels_by_cities"),
+    # URL for streaming all the hotels of a city
+    path(
+        "<str:city_code>/all/",
+        views.stream_hotels_by_city,
+        name="stream_hotels_by_city",
+    ),
     # URL for getting hotels by the city
     path(
-        "<str:city_code>/", views.get_hotels_by_city, name="get_hotels_by_city"
+        "<str:city_code>/", get_hotels_by_city, name="get_hotels_by_city"
     ),
 ]
@@ -9,3 +9,53 @@ USERNAME = "python-demo"
 
 # set the password
 PASSWORD = "*"
+
+# Names under which the state of each feed is remembered between imports
+CITY_FEED = "cities"
+
+HOTEL_FEED = "hotels"
+
+# Maximum number of suggestions returned by the city autocomplete
+AUTOCOMPLETE_LIMIT = 10
+
+# Maximum number of typos tolerated by the fuzzy city search
+FUZZY_MAX_DISTANCE = 2
+
+# Number of cities sharing the most trigrams with a fuzzy query that are
+# reranked by edit distance
+FUZZY_CANDIDATES = 50
+
+# Trigrams found in more than this share of the city names are not counted
+# by the fuzzy city search
+FUZZY_COMMON_SHARE = 0.02
+
+# Number of results per page of the hotel search
+SEARCH_PAGE_SIZE = 20
+
+# Deepest page of the hotel search, deeper offsets are refused
+SEARCH_MAX_PAGE = 500
+
+# Number of cities whose cached responses are invalidated one by one; past it
+# every cached response is invalidated at once
+CITY_VERSIONS_LIMIT = 1000
+
+# Maximum total size of the cached per-city hotel list responses
+CITY_RESPONSE_CACHE_BYTES = 32 * 1024 * 1024
+
+# Maximum total size of the cached city list and hotel list fragments of the
+# home page
+HOME_PAGE_CACHE_BYTES = 16 * 1024 * 1024
+
+# Number of hotels per page of the hotel listings, by default and at most
+HOTEL_PAGE_SIZE = 50
+
+MAX_HOTEL_PAGE_SIZE = 500
+
+# Number of hotels fetched from the database per chunk of a streamed dump
+HOTEL_STREAM_CHUNK_SIZE = 2000
+
+# Maximum number of cities looked up by one batch hotel request
+MAX_BATCH_CITIES = 50
+
+# Number of expired sessions deleted per statement by clear_expired_sessions
+SESSION_CLEANUP_BATCH_SIZE = 1000
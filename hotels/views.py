@@ -1,13 +1,57 @@
 # hotels/views.py
 
+import hashlib
+import pickle
+from typing import NamedTuple
+
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import AuthenticationForm
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.http import (
+    HttpRequest,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
-
+from django.template.loader import render_to_string
+from django.utils.functional import SimpleLazyObject
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+from .auth import remember_identity, session_identity
+from .caching import (
+    cities_version,
+    city_index_version,
+    city_response_key,
+    city_response_keys,
+    home_pages,
+    hotel_responses,
+)
 from .forms import CustomUserCreationForm, HotelForm
+from .importers.engine import batched
+from .fulltext import search_hotels
 from .models import City, Hotel, User
+from .pagination import (
+    KeysetPage,
+    decode_cursor,
+    page_size,
+    paginate_by_name,
+)
+from .search import city_index
+from .serialization import (
+    dumps,
+    encode_items,
+    encode_object,
+    encode_rows,
+    json_response,
+)
+from .utils import (
+    HOTEL_STREAM_CHUNK_SIZE,
+    MAX_BATCH_CITIES,
+    SEARCH_MAX_PAGE,
+)
 
 
 def is_manager(user: User) -> bool:
@@ -21,16 +65,40 @@ def is_manager(user: User) -> bool:
 def manager_required(function):
     """
     Decorator to ensure the user is a manager.
+    Users whose session remembers another role are redirected without being
+    loaded.
     """
 
     def wrapper(request, *args, **kwargs):
-        if not is_manager(request.user):
+        identity = session_identity(request)
+        if identity is not None:
+            manager = identity.is_manager
+        elif request.user.is_authenticated:
+            # The user changed since the login, or logged in before the
+            # identity was remembered
+            remember_identity(request, request.user)
+            manager = is_manager(request.user)
+        else:
+            manager = False
+        if not manager:
             return redirect("home")
         return function(request, *args, **kwargs)
 
     return wrapper
 
 
+def hotel_page(request: HttpRequest, hotels) -> KeysetPage:
+    """
+    Return the page of `hotels` requested by the `cursor` parameter.
+    An invalid cursor shows the first page.
+    """
+
+    try:
+        return paginate_by_name(hotels, request.GET.get("cursor"))
+    except ValueError:
+        return paginate_by_name(hotels)
+
+
 @manager_required
 @login_required
 def city_hotels_view_manager(request: HttpRequest) -> HttpResponse:
@@ -41,7 +109,7 @@ def city_hotels_view_manager(request: HttpRequest) -> HttpResponse:
     user = request.user
     if user.role == "manager":
         city = user.city
-        hotels = Hotel.objects.filter(city=city)
+        page = hotel_page(request, Hotel.objects.filter(city=city))
 
         if request.method == "POST":
             form = HotelForm(request.POST)
@@ -59,56 +127,147 @@ def city_hotels_view_manager(request: HttpRequest) -> HttpResponse:
             "manager_hotels.html",
             {
                 "selected_city": city,
-                "hotels": hotels,
+                "hotels": page.items,
+                "next_cursor": page.next_cursor,
                 "manager": user.username,
                 "form": form,
             },
         )
 
 
-def city_hotels_view(request: HttpRequest) -> HttpResponse:
+class HotelListFragment(NamedTuple):
     """
-    View for the user to see cities and the hotels in those cities.
+    The hotel list of the home page for a city and page, with its rendering.
+    """
+
+    selected_city: City | None
+    hotels: list | None
+    next_cursor: str | None
+    html: str
+
+
+def home_cities() -> list[City]:
+    """
+    Return all the cities, cached until the cities version changes.
+    """
+
+    key = ("cities", cities_version())
+    body = home_pages.get(key)
+    if body is not None:
+        return pickle.loads(body)
+    cities = list(City.objects.all())  # Fetch all cities from the database
+    home_pages.put(key, pickle.dumps(cities))
+    return cities
+
+
+def render_hotel_list(
+    selected_city: City | None, hotels: list | None, next_cursor: str | None
+) -> HotelListFragment:
+    return HotelListFragment(
+        selected_city,
+        hotels,
+        next_cursor,
+        render_to_string(
+            "hotel_list.html",
+            {
+                "selected_city": selected_city,
+                "hotels": hotels,
+                "next_cursor": next_cursor,
+            },
+        ),
+    )
+
+
+def hotel_list_fragment(
+    request: HttpRequest, city_code: str
+) -> HotelListFragment:
+    """
+    Return the hotel list of a city for the requested page, rendered once per
+    version of the city and of the catalog.
     """
 
-    cities = City.objects.all()  # Fetch all cities from the database
-    selected_city = None
+    key = ("hotels", *city_response_key(city_code), request.GET.get("cursor"))
+    body = home_pages.get(key)
+    if body is not None:
+        return pickle.loads(body)
+
+    selected_city = City.objects.filter(code=city_code).first()
     hotels = None
+    next_cursor = None
+    if selected_city:
+        # Get one page of the hotels in the selected city
+        hotels, next_cursor = hotel_page(
+            request, Hotel.objects.filter(city=selected_city)
+        )
+    fragment = render_hotel_list(selected_city, hotels, next_cursor)
+    home_pages.put(key, pickle.dumps(fragment))
+    return fragment
+
+
+def home_context(cities, fragment: HotelListFragment | None) -> dict:
+    if fragment is None:
+        fragment = HotelListFragment(None, None, None, "")
+    return {
+        "cities": cities,
+        "selected_city": fragment.selected_city,
+        "hotels": fragment.hotels,
+        "next_cursor": fragment.next_cursor,
+        "hotel_list": mark_safe(fragment.html),
+    }
+
+
+def city_hotels_view(request: HttpRequest) -> HttpResponse:
+    """
+    View for the user to see cities and the hotels in those cities.
+    The city list and the rendered hotel lists are cached until the cities or
+    hotels change, so a warm anonymous request runs no query.
+    """
 
+    # The template does not list the cities, only load them when used
+    cities = SimpleLazyObject(home_cities)
+    fragment = None
     if "city" in request.GET:
-        city_code = request.GET["city"]
-        selected_city = City.objects.filter(code=city_code).first()
-
-        if selected_city:
-            hotels = Hotel.objects.filter(
-                city=selected_city
-            )  # Get hotels in the selected city
-
-    return render(
-        request,
-        "home_page.html",
-        {"cities": cities, "selected_city": selected_city, "hotels": hotels},
+        fragment = hotel_list_fragment(request, request.GET["city"])
+    return render(request, "home_page.html", home_context(cities, fragment))
+
+
+def version_etag(*parts) -> str:
+    """
+    Derive a strong ETag from the versions and parameters a response depends on.
+    """
+
+    return hashlib.blake2b(
+        repr(parts).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+def autocomplete_etag(request: HttpRequest) -> str:
+    return version_etag(
+        city_index_version(),
+        request.GET.get("q", ""),
+        request.GET.get("mode"),
     )
 
 
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=autocomplete_etag)
 def city_autocomplete(request: HttpRequest) -> HttpResponse:
     """
     Provides city suggestions for the user as they type.
+    Answered from the in-process city index, without a database query.
+    With `mode=fuzzy`, names are matched despite a few typos.
     """
 
     query = request.GET.get(
         "q", ""
     )  # Get the query parameter from the GET request
-    # Filter cities starting with the query string
-    cities = (
-        City.objects.filter(name__istartswith=query)
-        if query
-        else City.objects.none()
-    )
-    suggestions = [
-        {"id": city.code, "name": city.name} for city in cities
-    ]  # Prepare city suggestions
-    return JsonResponse(suggestions, safe=False)
+    if request.GET.get("mode") == "fuzzy":
+        cities = city_index.fuzzy_search(query)
+    else:
+        # Cities whose name starts with the query string, ignoring case
+        cities = city_index.search(query)
+    # Prepare city suggestions from the (code, name, hotel_count) entries
+    return json_response(encode_rows(cities, ("id", "name", "hotels")))
 
 
 def signup(request: HttpRequest) -> HttpResponse:
@@ -158,7 +317,7 @@ def delete_hotel(request: HttpRequest, hotel_id: int) -> HttpResponse:
     Only managers of the hotel’s city can delete it.
     """
 
-    hotel = get_object_or_404(Hotel, id=hotel_id, city=request.user.city)
+    hotel = get_object_or_404(Hotel, id=hotel_id, city_id=request.user.city_id)
     hotel.delete()
     return redirect("manager_hotels")
 
@@ -170,12 +329,14 @@ def edit_hotel(request: HttpRequest, hotel_id: int) -> HttpResponse:
     View to edit the details of an existing hotel.
     """
 
-    hotel = get_object_or_404(Hotel, id=hotel_id, city=request.user.city)
+    hotel = get_object_or_404(Hotel, id=hotel_id, city_id=request.user.city_id)
 
     if request.method == "POST":
         form = HotelForm(request.POST, instance=hotel)
         if form.is_valid():
-            form.save()
+            hotel = form.save(commit=False)
+            # Just selected by the manager's city, which the form cannot change
+            hotel.save(check_city=False)
             return redirect(
                 "manager_hotels"
             )  # Redirect after successful update
@@ -194,17 +355,211 @@ def logout_view(request: HttpRequest) -> HttpResponse:
     return redirect("home")  # Redirect to the home page after logout
 
 
-def get_hotels_by_city(request, city_code) -> JsonResponse:
+def hotels_by_city_etag(request: HttpRequest, city_code: str) -> str:
+    return version_etag(
+        *city_response_key(city_code),
+        request.GET.get("cursor"),
+        request.GET.get("limit"),
+    )
+
+
+# The fields read for every hotel of the JSON hotel lists, keyed by (name, id)
+HOTEL_FIELDS = ("name", "id", "code")
+
+
+def hotel_list_params(request: HttpRequest) -> tuple[str | None, int]:
+    """
+    Return the cursor and page size requested for a JSON hotel list.
+    Raises ValueError when either is invalid.
+    """
+
+    cursor = request.GET.get("cursor")
+    size = page_size(request.GET.get("limit"))
+    if cursor:
+        decode_cursor(cursor)
+    return cursor, size
+
+
+def encode_hotel_page(page: KeysetPage) -> bytes:
+    """
+    Encode a page of HOTEL_FIELDS tuples along with the next page cursor.
+    """
+
+    return encode_object(
+        {
+            "hotels": encode_rows(
+                ((name, code) for name, _, code in page.items),
+                ("name", "code"),
+            ),
+            "next": dumps(page.next_cursor),
+        }
+    )
+
+
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=hotels_by_city_etag)
+def get_hotels_by_city(request, city_code) -> HttpResponse:
+    """
+    Returns one page of the hotels of a city as JSON, along with the cursor
+    of the next page. The serialized pages are cached per city version, so
+    repeated requests do not touch the database, and requests revalidating
+    the current version are answered with a 304.
+    """
+
+    try:
+        cursor, size = hotel_list_params(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    key = (*city_response_key(city_code), cursor, size)
+    body = hotel_responses.get(key)
+    if body is None:
+        try:
+            city = City.objects.get(code=city_code)
+        except City.DoesNotExist:
+            return JsonResponse({"error": "City not found"}, status=404)
+
+        page = paginate_by_name(
+            Hotel.objects.filter(city=city), cursor, size, fields=HOTEL_FIELDS
+        )
+        body = encode_hotel_page(page)
+        hotel_responses.put(key, body)
+
+    return json_response(body)
+
+
+def batch_city_codes(request: HttpRequest) -> list[str]:
+    """
+    Return the distinct city codes of the comma-separated `cities` parameter,
+    in request order. Raises ValueError when there are too many.
+    """
+
+    codes = dict.fromkeys(
+        code.strip()
+        for code in request.GET.get("cities", "").split(",")
+        if code.strip()
+    )
+    if len(codes) > MAX_BATCH_CITIES:
+        raise ValueError(f"At most {MAX_BATCH_CITIES} cities per request.")
+    return list(codes)
+
+
+def hotels_by_cities_etag(request: HttpRequest) -> str | None:
+    try:
+        codes = batch_city_codes(request)
+    except ValueError:
+        return None
+    return version_etag(*city_response_keys(codes))
+
+
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=hotels_by_cities_etag)
+def get_hotels_by_cities(request: HttpRequest) -> HttpResponse:
+    """
+    Returns all the hotels of several cities as JSON, grouped by city in the
+    order of the `cities` parameter. Cities and hotels are read with a single
+    query, and unknown city codes are reported inline instead of with a 404.
+    """
+
     try:
-        city = City.objects.get(code=city_code)
+        codes = batch_city_codes(request)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    # Cities without hotels come back once, with no hotel
+    cities = {}
+    for code, name, hotel_name, hotel_code in (
+        City.objects.filter(code__in=codes)
+        .order_by("code", "hotels__name", "hotels__id")
+        .values_list("code", "name", "hotels__name", "hotels__code")
+    ):
+        hotels = cities.setdefault(code, (name, []))[1]
+        if hotel_code is not None:
+            hotels.append((hotel_name, hotel_code))
+
+    results = []
+    for code in codes:
+        if code in cities:
+            name, hotels = cities[code]
+            results.append(
+                encode_object(
+                    {
+                        "code": dumps(code),
+                        "name": dumps(name),
+                        "hotels": encode_rows(hotels, ("name", "code")),
+                    }
+                )
+            )
+        else:
+            results.append(dumps({"code": code, "error": "City not found"}))
+    return json_response(
+        encode_object({"cities": b"[" + b",".join(results) + b"]"})
+    )
+
 
-        hotels = Hotel.objects.filter(city=city)
+def stream_hotels_etag(request: HttpRequest, city_code: str) -> str:
+    return version_etag(*city_response_key(city_code), "all")
 
-        hotel_data = [
-            {"name": hotel.name, "code": hotel.code} for hotel in hotels
-        ]
 
-        return JsonResponse({"hotels": hotel_data})
+@cache_control(public=True, no_cache=True)
+@condition(etag_func=stream_hotels_etag)
+def stream_hotels_by_city(request, city_code) -> HttpResponse:
+    """
+    Streams all the hotels of a city as JSON, in the format of
+    get_hotels_by_city with no next page. Hotels are read and encoded chunk by
+    chunk, so memory use does not grow with the number of hotels.
+    """
 
-    except City.DoesNotExist:
+    if not City.objects.filter(code=city_code).exists():
         return JsonResponse({"error": "City not found"}, status=404)
+
+    hotels = (
+        Hotel.objects.filter(city_id=city_code)
+        .order_by("name", "id")
+        .values_list("name", "code")
+        .iterator(chunk_size=HOTEL_STREAM_CHUNK_SIZE)
+    )
+
+    def stream():
+        yield b'{"hotels":['
+        separator = b""
+        for chunk in batched(hotels, HOTEL_STREAM_CHUNK_SIZE):
+            yield separator + encode_items(chunk, ("name", "code"))
+            separator = b","
+        yield b'],"next":null}'
+
+    return StreamingHttpResponse(stream(), content_type="application/json")
+
+
+def hotel_search(request: HttpRequest) -> HttpResponse:
+    """
+    Searches hotels by hotel and city name across all cities.
+    Returns one page of results, best matches first.
+    """
+
+    query = request.GET.get("q", "")
+    try:
+        page = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page = 1
+    if page > SEARCH_MAX_PAGE:
+        return JsonResponse(
+            {"error": f"page must be at most {SEARCH_MAX_PAGE}."}, status=400
+        )
+
+    matches, has_next = search_hotels(query, page)
+    return json_response(
+        {
+            "query": query,
+            "page": page,
+            "has_next": has_next,
+            "hotels": [
+                {
+                    "name": match.name,
+                    "code": match.code,
+                    "city": {"code": match.city_code, "name": match.city_name},
+                }
+                for match in matches
+            ],
+        }
+    )